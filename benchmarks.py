@@ -0,0 +1,868 @@
+#!/usr/bin/env python3
+"""
+Performance benchmarks for the todo store and servers
+
+Run with: python benchmarks.py <benchmark> [options]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from todo_store import TodoStore, TodoRecord, TextPool, serve_store, connect_store, list_todos, dumps_compact
+from todo_sqlite import SQLiteTodoStore
+from todo_wal import WriteAheadLog, FSYNC_POLICIES
+
+def percentiles(samples_ns):
+    """Summarise nanosecond samples as microsecond percentiles"""
+    ordered = sorted(samples_ns)
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] / 1000
+    return {
+        "mean_us": round(statistics.fmean(ordered) / 1000, 2),
+        "p50_us": round(pick(0.50), 2),
+        "p95_us": round(pick(0.95), 2),
+        "p99_us": round(pick(0.99), 2),
+    }
+
+def print_row(label, stats):
+    print(f"{label:<32} " + "  ".join(f"{key}={value}" for key, value in stats.items()))
+
+# ---- Cross-process shared store ----
+def _remote_peer(address, authkey, conn, iterations):
+    """Child side of bench_shared_store: one round per direction"""
+    remote = connect_store(address, authkey)
+    conn.send("ready")
+    # Parent writes, we read
+    samples = []
+    for _ in range(iterations):
+        todo_id, started = conn.recv()
+        remote.get(todo_id)
+        samples.append(time.perf_counter_ns() - started)
+        conn.send(None)
+    conn.send(samples)
+    # We write, parent reads
+    for i in range(iterations):
+        started = time.perf_counter_ns()
+        todo = remote.create(f"remote {i}")
+        conn.send((todo["id"], started))
+        conn.recv()
+    conn.close()
+
+def bench_shared_store(args):
+    """Read-after-write latency between two processes sharing one store.
+
+    Each sample runs from the start of a write on one side until a read of
+    the same todo on the other side returns, including the pipe message
+    used to tell the reader which ID to fetch.
+    """
+    store = TodoStore()
+    for i in range(args.size):
+        store.create(f"Seed {i}", "x" * 64)
+    server = serve_store(store)
+    ctx = multiprocessing.get_context("spawn")
+    parent_conn, child_conn = ctx.Pipe()
+    child = ctx.Process(target=_remote_peer, args=(server.address, server.authkey, child_conn, args.iterations))
+    child.start()
+    parent_conn.recv()
+
+    for i in range(args.iterations):
+        started = time.perf_counter_ns()
+        todo = store.create(f"local {i}")
+        parent_conn.send((todo["id"], started))
+        parent_conn.recv()
+    owner_to_remote = parent_conn.recv()
+
+    remote_to_owner = []
+    for _ in range(args.iterations):
+        todo_id, started = parent_conn.recv()
+        store.get(todo_id)
+        remote_to_owner.append(time.perf_counter_ns() - started)
+        parent_conn.send(None)
+
+    child.join()
+    server.stop_event.set()
+    print(f"Shared store read-after-write ({args.iterations} samples, {args.size} seeded todos)")
+    print_row("owner write -> remote read", percentiles(owner_to_remote))
+    print_row("remote write -> owner read", percentiles(remote_to_owner))
+
+# ---- Write-ahead log ----
+def bench_wal(args):
+    """Logged writes/sec under each fsync policy, plus startup replay time"""
+    base_dir = tempfile.mkdtemp(prefix="todo-wal-", dir=args.dir)
+    thread_counts = [int(n) for n in args.threads.split(",")]
+    print(f"WAL append throughput ({args.writes} writes per run, dir {base_dir})")
+    try:
+        for policy in FSYNC_POLICIES:
+            for threads in thread_counts:
+                wal_dir = os.path.join(base_dir, f"{policy}-{threads}")
+                wal = WriteAheadLog(wal_dir, fsync=policy, snapshot_every=args.writes * 2)
+                per_thread = args.writes // threads
+                def writer(offset):
+                    for i in range(per_thread):
+                        todo_id = offset + i
+                        wal.append({"op": "create", "todo": {"id": todo_id, "title": f"Task {todo_id}",
+                                                             "description": "x" * 64, "completed": False}})
+                workers = [threading.Thread(target=writer, args=(n * per_thread,)) for n in range(threads)]
+                started = time.perf_counter()
+                for worker in workers:
+                    worker.start()
+                for worker in workers:
+                    worker.join()
+                elapsed = time.perf_counter() - started
+                wal.close()
+                print(f"fsync={policy:<7} threads={threads:<3} {per_thread * threads / elapsed:>12,.0f} writes/sec")
+
+        # Startup replay: snapshot of args.size todos plus a 10% log tail
+        wal_dir = os.path.join(base_dir, "replay")
+        store = TodoStore(wal=WriteAheadLog(wal_dir, fsync="never", snapshot_every=args.size))
+        for i in range(args.size):
+            store.create(f"Task {i}", "x" * 64)
+        for i in range(1, args.size // 10 + 1):
+            store.update(i, completed=True)
+        store._wal.close()
+        started = time.perf_counter()
+        replayed = TodoStore(wal=WriteAheadLog(wal_dir, fsync="never"))
+        elapsed = time.perf_counter() - started
+        print(f"replay of {len(replayed):,} todos (snapshot + {args.size // 10:,} log records): {elapsed * 1000:.1f} ms")
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+# ---- Concurrent store access ----
+def _mixed_ops(store, n, ops):
+    """One worker's share of the concurrency mix: create, update, read, delete"""
+    for i in range(ops // 4):
+        todo_id = store.create(f"Worker {n} task {i}", "x" * 64)["id"]
+        store.update(todo_id, completed=True)
+        store.get(todo_id)
+        store.delete(todo_id)
+
+def bench_concurrency(args):
+    """Mixed store operations/sec by worker thread count, per backend.
+
+    Threads stand in for FastAPI's sync-route threadpool and the store
+    server's per-connection threads. The GIL caps in-memory throughput, so
+    the point is that it holds up under contention; with a WAL, writers
+    waiting on a group commit no longer hold the store lock.
+    """
+    base_dir = tempfile.mkdtemp(prefix="todo-concurrency-", dir=args.dir)
+    backends = {
+        "memory": lambda path: TodoStore(),
+        "memory+wal(batch)": lambda path: TodoStore(wal=WriteAheadLog(path, fsync="batch")),
+        "sqlite": lambda path: SQLiteTodoStore(os.path.join(path, "todos.db")),
+    }
+    print(f"Mixed create/update/get/delete, {args.ops} ops per run")
+    try:
+        for name, factory in backends.items():
+            for threads in [int(n) for n in args.threads.split(",")]:
+                path = os.path.join(base_dir, f"{name}-{threads}")
+                os.makedirs(path)
+                store = factory(path)
+                per_thread = args.ops // threads
+                with ThreadPoolExecutor(threads) as pool:
+                    started = time.perf_counter()
+                    list(pool.map(lambda n: _mixed_ops(store, n, per_thread), range(threads)))
+                    elapsed = time.perf_counter() - started
+                if getattr(store, "_wal", None) is not None:
+                    store._wal.close()
+                print(f"{name:<18} threads={threads:<3} {per_thread * threads / elapsed:>12,.0f} ops/sec")
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+def bench_shards(args):
+    """Store throughput and scatter-gather latency by shard process count.
+
+    Threads drive the concurrency mix through a ShardedTodoStore; with one
+    shard this is a single store process reached over IPC, the baseline.
+    Throughput can only grow with shards while there are free cores.
+    """
+    from todo_shards import start_shards
+    rows = [{"title": f"Task {i}", "description": "x" * 64, "completed": i % 3 == 0} for i in range(args.size)]
+    print(f"{args.ops} mixed ops from {args.threads} threads; list/search over {args.size:,} todos "
+          f"({os.cpu_count()} CPUs)")
+    for count in [int(n) for n in args.shards.split(",")]:
+        store = start_shards(count)
+        try:
+            store.create_many(rows)
+            per_thread = args.ops // args.threads
+            with ThreadPoolExecutor(args.threads) as pool:
+                started = time.perf_counter()
+                list(pool.map(lambda n: _mixed_ops(store, n, per_thread), range(args.threads)))
+                elapsed = time.perf_counter() - started
+            print(f"shards={count:<3} {per_thread * args.threads / elapsed:>12,.0f} ops/sec")
+            print_row("  page(100, completed=True)", percentiles(_time_ns(lambda: store.page(100, completed=True), 50)))
+            print_row("  search('task 123')", percentiles(_time_ns(lambda: store.search("task 123", 10), 50)))
+            print_row("  list()", percentiles(_time_ns(store.list, 3)))
+        finally:
+            store.close()
+
+# ---- Resource serialization cache ----
+def _time_ns(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter_ns()
+        func()
+        samples.append(time.perf_counter_ns() - started)
+    return samples
+
+def bench_resource_cache(args):
+    """Cost of reading the todos:// resources: cache miss vs cache hit.
+
+    "before" reproduces the old resource body (filter + indent=2 dumps on
+    every read); a miss is the first read after a mutation.
+    """
+    for size in [int(n) for n in args.sizes.split(",")]:
+        store = TodoStore()
+        for i in range(size):
+            store.create(f"Task {i}", "x" * 64, completed=i % 3 == 0)
+
+        before = _time_ns(lambda: json.dumps([t for t in store.list() if t["completed"]], indent=2), args.repeat)
+
+        def miss():
+            store.update(1, title="Task 0")
+            started = time.perf_counter_ns()
+            store.dumps(completed=True)
+            return time.perf_counter_ns() - started
+        misses = [miss() for _ in range(args.repeat)]
+        hits = _time_ns(lambda: store.dumps(completed=True), args.repeat * 100)
+        # The resource is text, so a read decodes the cached bytes
+        text_hits = _time_ns(lambda: store.dumps(completed=True).decode(), args.repeat * 100)
+
+        print(f"todos://completed at {size:,} todos")
+        print_row("  before (indent=2, no cache)", percentiles(before))
+        print_row("  cache miss (compact)", percentiles(misses))
+        print_row("  cache hit (bytes, REST)", percentiles(hits))
+        print_row("  cache hit + decode (MCP)", percentiles(text_hits))
+
+# ---- Full-text search ----
+def _random_text(rng, vocabulary, words):
+    # Zipf-ish word choice: a few common words and a long tail of rare ones
+    return " ".join(vocabulary[min(int(rng.paretovariate(1.0)) - 1, len(vocabulary) - 1)] for _ in range(words))
+
+def bench_search(args):
+    """search() latency vs the scan an agent does today (get_todos + filter).
+
+    Queries mix common, mid-frequency and rare words, so the number of
+    postings visited varies from thousands to a handful.
+    """
+    rng = random.Random(42)
+    vocabulary = [f"word{i}" for i in range(args.vocabulary)]
+    rows = [{"title": _random_text(rng, vocabulary, 4), "description": _random_text(rng, vocabulary, 12)}
+            for _ in range(args.size)]
+    queries = [" ".join(rng.sample(vocabulary[:200], 2)) for _ in range(args.repeat)]
+
+    def scan(store, query):
+        words = set(query.split())
+        return [todo for todo in store.list()
+                if words & set(todo["title"].split()) or words & set(todo["description"].split())][:10]
+
+    base_dir = tempfile.mkdtemp(prefix="todo-search-")
+    try:
+        stores = {"memory": TodoStore(), "sqlite": SQLiteTodoStore(os.path.join(base_dir, "todos.db"))}
+        print(f"Search over {args.size:,} todos, {args.repeat} two-word queries, top 10")
+        for name, store in stores.items():
+            started = time.perf_counter()
+            store.create_many(rows)
+            print(f"{name}: loaded and indexed in {(time.perf_counter() - started) * 1000:.0f} ms")
+            samples = iter(queries)
+            print_row("  scan + filter (before)", percentiles(_time_ns(lambda: scan(store, next(samples)),
+                                                                       max(1, args.repeat // 10))))
+            samples = iter(queries)
+            print_row("  search()", percentiles(_time_ns(lambda: store.search(next(samples), 10), args.repeat)))
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+# ---- Memory per todo ----
+def _measure_bytes(build):
+    """Bytes still allocated by build() once it returns (its result is kept alive)"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del kept
+    return allocated
+
+def bench_memory(args):
+    """Bytes per todo: the old dict-per-record layout vs TodoRecord.
+
+    Rows are decoded from JSON one at a time, like REST and MCP requests,
+    so repeated titles arrive as separate string objects unless pooled.
+    """
+    lines = [json.dumps({"title": f"Task {i % args.distinct_titles}", "description": "",
+                         "completed": i % 2 == 0}) for i in range(args.size)]
+
+    def dict_records():
+        records = {}
+        for todo_id, line in enumerate(lines, 1):
+            records[todo_id] = {"id": todo_id, **json.loads(line)}
+        return records
+
+    def slotted_records():
+        records, titles = {}, TextPool()
+        for todo_id, line in enumerate(lines, 1):
+            row = json.loads(line)
+            records[todo_id] = TodoRecord(todo_id, titles.share(row["title"]), row["description"], row["completed"])
+        return records, titles
+
+    def full_store():
+        store = TodoStore()
+        for start in range(0, len(lines), 10000):
+            store.create_many([json.loads(line) for line in lines[start:start + 10000]])
+        return store
+
+    print(f"Memory for {args.size:,} todos ({args.distinct_titles:,} distinct titles)")
+    for label, build in (("dict records (before)", dict_records), ("TodoRecord records", slotted_records),
+                         ("TodoStore incl. indexes", full_store)):
+        print(f"{label:<26} {_measure_bytes(build) / args.size:>8.1f} bytes/todo")
+
+# ---- Metrics instrumentation overhead ----
+def bench_metrics(args):
+    """Per-call cost of the metrics instrumentation.
+
+    Compares a no-op ASGI app and a no-op MCP tools/call handler with and
+    without the metrics wrappers, plus the bare observe() call from 1 and
+    8 threads.
+    """
+    from types import SimpleNamespace
+    from mcp import types
+    from todo_metrics import Metrics, MetricsMiddleware, instrument_mcp_server
+
+    registry = Metrics()
+    n = args.calls
+
+    def per_call_ns(run, calls):
+        started = time.perf_counter_ns()
+        run(calls)
+        return (time.perf_counter_ns() - started) / calls
+
+    def observe_loop(calls):
+        for _ in range(calls):
+            registry.observe("tool", "create_todo", 0.0004, False, 120)
+
+    def threaded_observe(calls):
+        workers = [threading.Thread(target=observe_loop, args=(calls // 8,)) for _ in range(8)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    # ASGI: a matched route answering with a small body
+    route = SimpleNamespace(path="/todos/{todo_id}")
+    async def endpoint(scope, receive, send):
+        scope["route"] = route
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"x" * 80})
+    async def ignore(message):
+        pass
+    middleware = MetricsMiddleware(endpoint, registry)
+
+    # MCP: the low-level handlers as FastMCP registers them
+    result = types.ServerResult(types.CallToolResult(content=[types.TextContent(type="text", text="x" * 80)]))
+    async def handler(request):
+        return result
+    server = SimpleNamespace(request_handlers={types.CallToolRequest: handler, types.ReadResourceRequest: handler})
+    instrument_mcp_server(server, registry)
+    request = types.CallToolRequest(method="tools/call", params=types.CallToolRequestParams(name="get_todo"))
+
+    def run_async(app_call):
+        async def loop(calls):
+            for _ in range(calls):
+                await app_call()
+        return lambda calls: asyncio.run(loop(calls))
+
+    scope = {"type": "http", "method": "GET"}
+    rows = [
+        ("observe(), 1 thread", per_call_ns(observe_loop, n)),
+        ("observe(), 8 threads", per_call_ns(threaded_observe, n)),
+        ("ASGI route, bare", per_call_ns(run_async(lambda: endpoint(dict(scope), None, ignore)), n)),
+        ("ASGI route, instrumented", per_call_ns(run_async(lambda: middleware(dict(scope), None, ignore)), n)),
+        ("tools/call, bare", per_call_ns(run_async(lambda: handler(request)), n)),
+        ("tools/call, instrumented",
+         per_call_ns(run_async(lambda: server.request_handlers[types.CallToolRequest](request)), n)),
+    ]
+    print(f"Metrics instrumentation cost ({n:,} calls each)")
+    for label, ns in rows:
+        print(f"{label:<28} {ns / 1000:>8.2f} us/call")
+
+# ---- GET /todos/ encoding ----
+def bench_rest_list(args):
+    """GET /todos/ before (dicts through jsonable_encoder) and after (cached bytes).
+
+    "before" reproduces the old route, which returned store.list() and let
+    FastAPI encode it. A cache miss is the first request after a write.
+    """
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    import main
+    import todo_store
+
+    old_app = FastAPI()
+    old_app.get("/todos/")(lambda: main.store.list())
+    old_client, new_client = TestClient(old_app), TestClient(main.app)
+    encoder = "orjson" if todo_store.orjson is not None else "json"
+    print(f"GET /todos/ through TestClient ({encoder} encoder)")
+    for size in [int(n) for n in args.sizes.split(",")]:
+        main.store.clear()
+        main.store.create_many([{"title": f"Task {i}", "description": "x" * 64} for i in range(size)])
+
+        def miss():
+            main.store.update(1, title="Task 0")
+            started = time.perf_counter_ns()
+            new_client.get("/todos/")
+            return time.perf_counter_ns() - started
+
+        print(f"{size:,} todos")
+        print_row("  before (jsonable_encoder)", percentiles(_time_ns(lambda: old_client.get("/todos/"), args.repeat)))
+        print_row("  after, cache miss", percentiles([miss() for _ in range(args.repeat)]))
+        print_row("  after, cache hit", percentiles(_time_ns(lambda: new_client.get("/todos/"), args.repeat)))
+    main.store.clear()
+
+# ---- Filtered listings ----
+def bench_filters(args):
+    """Server-side filters vs dumping everything and filtering on the client.
+
+    For each view reports latency and the bytes a client would receive.
+    "client" is today's get_todos() + filter; "server" is list_todos().
+    """
+    rows = [{"title": f"{('Buy', 'Call', 'Fix', 'Plan')[i % 4]} item {i}", "description": "x" * 40,
+             "completed": i % 3 == 0} for i in range(args.size)]
+    newest = args.size - 100
+    views = {
+        "title_prefix='Fix item 12'": ({"title_prefix": "Fix item 12"}, lambda todo: todo["title"].startswith("Fix item 12")),
+        "id_gte..id_lt (1,000 IDs)": ({"id_gte": newest - 1000, "id_lt": newest},
+                                      lambda todo: newest - 1000 <= todo["id"] < newest),
+        "order=desc, id_gte (newest 100)": ({"order": "desc", "id_gte": newest + 1}, lambda todo: todo["id"] > newest),
+        "completed=true": ({"completed": True}, lambda todo: todo["completed"]),
+    }
+    base_dir = tempfile.mkdtemp(prefix="todo-filters-")
+    try:
+        stores = {"memory": TodoStore(), "sqlite": SQLiteTodoStore(os.path.join(base_dir, "todos.db"))}
+        print(f"Filtered listings over {args.size:,} todos")
+        for name, store in stores.items():
+            store.create_many(rows)
+            # The first prefix query sorts the bulk load into the title index
+            list_todos(store, title_prefix="x")
+            print(f"{name}:")
+            for label, (filters, keep) in views.items():
+                result = list_todos(store, **filters)
+                print(f"  {label}: {len(result):,} todos, {len(dumps_compact(result)):,} bytes "
+                      f"(full list {len(store.dumps()):,})")
+                print_row("    client-side filter", percentiles(_time_ns(
+                    lambda: [todo for todo in store.list() if keep(todo)], args.repeat)))
+                print_row("    server-side filter", percentiles(_time_ns(lambda: list_todos(store, **filters), args.repeat)))
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+# ---- Field projection ----
+def bench_fields(args):
+    """Payload size and list-and-encode time by field projection.
+
+    "projected after" builds full dicts and then drops keys, as a client
+    or route filtering the output would; the fields= path asks the store
+    for the projection. The store's serialization cache is bypassed.
+    """
+    from todo_store import parse_fields, project
+    rows = [{"title": f"Task {i}", "description": "lorem ipsum " * (args.description // 12),
+             "completed": i % 3 == 0} for i in range(args.size)]
+    base_dir = tempfile.mkdtemp(prefix="todo-fields-")
+    try:
+        stores = {"memory": TodoStore(), "sqlite": SQLiteTodoStore(os.path.join(base_dir, "todos.db"))}
+        print(f"List + encode {args.size:,} todos with ~{args.description}-character descriptions")
+        for name, store in stores.items():
+            store.create_many(rows)
+            print(f"{name}:")
+            for label, fields in (("all fields", None), ("id,title,completed", "id,title,completed"),
+                                  ("id", "id")):
+                size = len(dumps_compact(store.list(fields=fields)))
+                print(f"  {label}: {size:,} bytes")
+                print_row("    fields=", percentiles(_time_ns(
+                    lambda: dumps_compact(store.list(fields=fields)), args.repeat)))
+                if fields is not None:
+                    projection = parse_fields(fields)
+                    print_row("    projected after", percentiles(_time_ns(
+                        lambda: dumps_compact([project(todo, projection) for todo in store.list()]), args.repeat)))
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+# ---- Stateless MCP across workers ----
+MCP_ACCEPT = "application/json, text/event-stream"
+
+async def _tool_calls(url, concurrency, duration, size, write_ratio, seed):
+    """Raw JSON-RPC tools/call POSTs from ``concurrency`` tasks for ``duration`` seconds"""
+    import httpx
+    rng = random.Random(seed)
+    samples, errors = [], 0
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async def worker(client):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            todo_id = rng.randint(1, size)
+            if rng.random() < write_ratio:
+                call = {"name": "update_todo", "arguments": {"todo_id": todo_id, "completed": rng.random() < 0.5}}
+            else:
+                call = {"name": "get_todo", "arguments": {"todo_id": todo_id}}
+            started = time.perf_counter_ns()
+            try:
+                response = await client.post(url, json={"jsonrpc": "2.0", "id": 1, "method": "tools/call",
+                                                        "params": call})
+                ok = response.status_code == 200 and not response.json()["result"].get("isError")
+            except Exception:
+                ok = False
+            samples.append(time.perf_counter_ns() - started)
+            errors += not ok
+
+    async with httpx.AsyncClient(headers={"Accept": MCP_ACCEPT}, limits=limits, timeout=30) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    return samples, errors
+
+def _tool_call_process(job):
+    return asyncio.run(_tool_calls(*job))
+
+def bench_mcp_workers(args):
+    """Tool-call throughput of stateless streamable HTTP by uvicorn worker count.
+
+    Workers share one SQLite store. Load comes from --client-processes
+    processes posting tools/call requests (80% get_todo, 20% update_todo
+    by default) without sessions, which stateless mode allows, so any
+    worker can take any request. Throughput can only scale up to the
+    machine's free cores, shared with the load generator.
+    """
+    import httpx
+    from load_test import free_port
+    print(f"Stateless MCP tool calls, {args.size:,} todos, {args.client_processes} client processes x "
+          f"{args.concurrency} concurrent, {args.duration:g}s per run ({os.cpu_count()} CPUs)")
+    for workers in [int(n) for n in args.workers.split(",")]:
+        base_dir = tempfile.mkdtemp(prefix="todo-workers-")
+        path = os.path.join(base_dir, "todos.db")
+        SQLiteTodoStore(path).create_many([{"title": f"Todo {i}"} for i in range(args.size)])
+        port = free_port()
+        url = f"http://127.0.0.1:{port}/mcp"
+        env = {**os.environ, "TODO_MCP_STATELESS": "1", "TODO_STORE_BACKEND": "sqlite", "TODO_SQLITE_PATH": path}
+        env.pop("TODO_STORE_ADDRESS", None)
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "--factory", "mcp_server:http_app", "--port", str(port),
+             "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+            env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+            # FastMCP logs every request at INFO
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            # Wait until every worker is likely up: the port answers, then a grace period
+            deadline = time.monotonic() + 30
+            while True:
+                try:
+                    httpx.post(url, headers={"Accept": MCP_ACCEPT},
+                               json={"jsonrpc": "2.0", "id": 0, "method": "tools/list"}).raise_for_status()
+                    break
+                except httpx.HTTPError:
+                    if time.monotonic() > deadline or server.poll() is not None:
+                        raise RuntimeError("MCP workers did not start")
+                    time.sleep(0.1)
+            time.sleep(workers * 0.5)
+            jobs = [(url, args.concurrency, args.duration, args.size, args.write_ratio, i)
+                    for i in range(args.client_processes)]
+            with multiprocessing.Pool(args.client_processes) as pool:
+                results = pool.map(_tool_call_process, jobs)
+            samples = [sample for result in results for sample in result[0]]
+            errors = sum(result[1] for result in results)
+            stats = percentiles(samples)
+            print(f"{workers:>3} worker(s): {len(samples) / args.duration:>9,.0f} calls/sec  errors={errors}  "
+                  f"p50_us={stats['p50_us']}  p99_us={stats['p99_us']}")
+        finally:
+            server.terminate()
+            server.wait()
+            shutil.rmtree(base_dir, ignore_errors=True)
+
+# ---- Startup time ----
+async def _first_success(probe, started, timeout):
+    """Seconds from ``started`` until ``probe()`` first completes without raising"""
+    while True:
+        try:
+            await probe()
+            return time.perf_counter() - started
+        except Exception:
+            if time.perf_counter() - started > timeout:
+                raise RuntimeError("no successful request before the timeout")
+            await asyncio.sleep(0.01)
+
+async def _startup_run(mode, timeout):
+    import httpx
+    from mcp import ClientSession
+    from mcp.client.sse import sse_client
+    from load_test import free_port
+    port, mcp_port = free_port(), free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    mcp_url = f"{base_url}/mcp/sse" if mode == "mounted" else f"http://127.0.0.1:{mcp_port}/sse"
+    env = {**os.environ, "TODO_MCP_MODE": mode, "TODO_MCP_TRANSPORT": "sse", "TODO_MCP_PORT": str(mcp_port)}
+    env.pop("TODO_STORE_ADDRESS", None)
+
+    async def rest_probe():
+        async with httpx.AsyncClient() as client:
+            (await client.get(f"{base_url}/todos/")).raise_for_status()
+
+    async def mcp_probe():
+        async with sse_client(mcp_url, timeout=1) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                if (await session.call_tool("get_stats", {})).isError:
+                    raise RuntimeError("get_stats failed")
+
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        return await asyncio.gather(_first_success(rest_probe, started, timeout),
+                                    _first_success(mcp_probe, started, timeout))
+    finally:
+        server.terminate()
+        await asyncio.to_thread(server.wait)
+
+def bench_startup(args):
+    """Time from launching `uvicorn main:app` to the first successful request.
+
+    Measured per MCP mode for GET /todos/ and for an MCP get_stats tool
+    call over SSE (connect, initialize, call), polling both from the
+    moment the process is started. In subprocess mode the lifespan waits
+    for the MCP child to accept connections before REST starts answering.
+    """
+    logging.getLogger("mcp").setLevel(logging.CRITICAL)
+    print(f"Time to first successful request, median of {args.runs} runs")
+    for mode in args.modes.split(","):
+        runs = [asyncio.run(_startup_run(mode, args.timeout)) for _ in range(args.runs)]
+        rest = statistics.median(run[0] for run in runs)
+        mcp = statistics.median(run[1] for run in runs)
+        print(f"{mode:<11} REST {rest * 1000:>8.0f} ms   MCP {mcp * 1000:>8.0f} ms")
+
+# ---- Persistent MCP client ----
+async def _client_calls(args, url):
+    from mcp_client import McpClient
+    n = args.calls
+    rows = []
+
+    async def per_session():
+        # What a script opening a connection per request pays
+        for i in range(n):
+            async with McpClient(url) as client:
+                await client.call_tool("get_stats")
+
+    async def sequential(client):
+        for i in range(n):
+            await client.call_tool("get_stats")
+
+    async def pipelined(client):
+        await client.call_many([("get_stats", None)] * n)
+
+    started = time.perf_counter()
+    await per_session()
+    rows.append(("session per call", time.perf_counter() - started))
+    async with McpClient(url) as client:
+        for label, run in (("one session, sequential", sequential), ("one session, pipelined", pipelined)):
+            started = time.perf_counter()
+            await run(client)
+            rows.append((label, time.perf_counter() - started))
+    for label, elapsed in rows:
+        print(f"{label:<26} {elapsed / n * 1000:>8.2f} ms/call  {n / elapsed:>9,.0f} calls/sec")
+
+def bench_mcp_client(args):
+    """get_stats calls through mcp_client.McpClient over the wire.
+
+    Compares opening a session per call, reusing one session call by call,
+    and pipelining all calls on one session. Starts `python mcp_server.py`
+    on a free port unless --url points at a running endpoint.
+    """
+    from load_test import free_port
+    logging.getLogger("mcp").setLevel(logging.WARNING)
+    server = None
+    url = args.url
+    if url is None:
+        port = free_port()
+        url = f"http://127.0.0.1:{port}/sse" if args.transport == "sse" else f"http://127.0.0.1:{port}/mcp"
+        env = {**os.environ, "TODO_MCP_PORT": str(port), "TODO_MCP_TRANSPORT": args.transport}
+        env.pop("TODO_STORE_ADDRESS", None)
+        server = subprocess.Popen([sys.executable, "mcp_server.py"], env=env,
+                                  cwd=os.path.dirname(os.path.abspath(__file__)),
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline or server.poll() is not None:
+                    raise RuntimeError("MCP server did not start")
+                time.sleep(0.05)
+    print(f"{args.calls} get_stats calls to {url}")
+    try:
+        asyncio.run(_client_calls(args, url))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+# ---- Batch MCP tools ----
+async def _run_batch_tools(args, session):
+    n = args.items
+    items = [{"title": f"Task {i}", "description": "x" * 64} for i in range(n)]
+
+    async def per_call():
+        ids = []
+        for item in items:
+            result = await session.call_tool("create_todo", item)
+            ids.append(result.structuredContent["result"]["id"])
+        for todo_id in ids:
+            await session.call_tool("complete_todo", {"todo_id": todo_id})
+
+    async def batched():
+        for start in range(0, n, args.batch_size):
+            chunk = items[start:start + args.batch_size]
+            result = await session.call_tool("create_todos", {"items": chunk})
+            ids = [item["id"] for item in result.structuredContent["result"]]
+            await session.call_tool("complete_todos", {"todo_ids": ids})
+
+    print(f"Create + complete {n} todos through an MCP client session")
+    for label, run in (("one call per todo", per_call), (f"batches of {args.batch_size}", batched)):
+        started = time.perf_counter()
+        await run()
+        elapsed = time.perf_counter() - started
+        print(f"{label:<24} {elapsed * 1000:>9.1f} ms  {2 * n / elapsed:>10,.0f} todo ops/sec")
+
+async def _batch_tools(args):
+    if args.url:
+        from mcp import ClientSession
+        from mcp.client.sse import sse_client
+        async with sse_client(args.url) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                await _run_batch_tools(args, session)
+    else:
+        from mcp.shared.memory import create_connected_server_and_client_session
+        from mcp_server import mcp_server
+        async with create_connected_server_and_client_session(mcp_server) as session:
+            await _run_batch_tools(args, session)
+
+def bench_batch_tools(args):
+    """Per-call vs batched tool throughput over a real MCP client session.
+
+    Uses an in-memory transport against mcp_server.py unless --url points
+    at a running SSE endpoint.
+    """
+    # The server logs every request at INFO
+    logging.getLogger("mcp").setLevel(logging.WARNING)
+    asyncio.run(_batch_tools(args))
+
+def main():
+    parser = argparse.ArgumentParser(description="Todo server benchmarks")
+    benchmarks = parser.add_subparsers(dest="benchmark", required=True)
+
+    shared = benchmarks.add_parser("shared-store", help="cross-process read-after-write latency")
+    shared.add_argument("--iterations", type=int, default=2000)
+    shared.add_argument("--size", type=int, default=10000, help="todos seeded before measuring")
+    shared.set_defaults(func=bench_shared_store)
+
+    wal = benchmarks.add_parser("wal", help="write-ahead log throughput per fsync policy")
+    wal.add_argument("--writes", type=int, default=20000)
+    wal.add_argument("--threads", default="1,8", help="comma-separated writer thread counts")
+    wal.add_argument("--size", type=int, default=100000, help="todos in the replay test")
+    wal.add_argument("--dir", default=None, help="directory on the disk to test (default: temp dir)")
+    wal.set_defaults(func=bench_wal)
+
+    concurrency = benchmarks.add_parser("concurrency", help="store throughput by thread count")
+    concurrency.add_argument("--ops", type=int, default=40000)
+    concurrency.add_argument("--threads", default="1,2,4,8,16", help="comma-separated worker thread counts")
+    concurrency.add_argument("--dir", default=None, help="directory for the WAL and database (default: temp dir)")
+    concurrency.set_defaults(func=bench_concurrency)
+
+    shards = benchmarks.add_parser("shards", help="throughput and merge latency by shard process count")
+    shards.add_argument("--shards", default="1,2,4")
+    shards.add_argument("--threads", type=int, default=8)
+    shards.add_argument("--ops", type=int, default=20000)
+    shards.add_argument("--size", type=int, default=100000)
+    shards.set_defaults(func=bench_shards)
+
+    cache = benchmarks.add_parser("resource-cache", help="todos:// resource cache hit vs miss")
+    cache.add_argument("--sizes", default="10000,100000")
+    cache.add_argument("--repeat", type=int, default=20)
+    cache.set_defaults(func=bench_resource_cache)
+
+    search = benchmarks.add_parser("search", help="indexed search vs scanning the full list")
+    search.add_argument("--size", type=int, default=100000)
+    search.add_argument("--vocabulary", type=int, default=20000, help="distinct words in generated todos")
+    search.add_argument("--repeat", type=int, default=200)
+    search.set_defaults(func=bench_search)
+
+    memory = benchmarks.add_parser("memory", help="bytes per todo, dict records vs TodoRecord")
+    memory.add_argument("--size", type=int, default=200000)
+    memory.add_argument("--distinct-titles", type=int, default=1000)
+    memory.set_defaults(func=bench_memory)
+
+    instrumentation = benchmarks.add_parser("metrics", help="overhead of the request metrics")
+    instrumentation.add_argument("--calls", type=int, default=200000)
+    instrumentation.set_defaults(func=bench_metrics)
+
+    rest_list = benchmarks.add_parser("rest-list", help="GET /todos/ before and after cached raw JSON")
+    rest_list.add_argument("--sizes", default="10000,100000")
+    rest_list.add_argument("--repeat", type=int, default=10)
+    rest_list.set_defaults(func=bench_rest_list)
+
+    filters = benchmarks.add_parser("filters", help="server-side filtered listings vs client-side filtering")
+    filters.add_argument("--size", type=int, default=100000)
+    filters.add_argument("--repeat", type=int, default=20)
+    filters.set_defaults(func=bench_filters)
+
+    projection = benchmarks.add_parser("fields", help="payload size and encode time by field projection")
+    projection.add_argument("--size", type=int, default=100000)
+    projection.add_argument("--description", type=int, default=500, help="characters per description")
+    projection.add_argument("--repeat", type=int, default=10)
+    projection.set_defaults(func=bench_fields)
+
+    workers = benchmarks.add_parser("mcp-workers", help="stateless MCP tool-call throughput by worker count")
+    workers.add_argument("--workers", default="1,2,4", help="comma-separated uvicorn worker counts")
+    workers.add_argument("--size", type=int, default=10000)
+    workers.add_argument("--client-processes", type=int, default=2)
+    workers.add_argument("--concurrency", type=int, default=16, help="concurrent requests per client process")
+    workers.add_argument("--duration", type=float, default=5)
+    workers.add_argument("--write-ratio", type=float, default=0.2)
+    workers.set_defaults(func=bench_mcp_workers)
+
+    startup = benchmarks.add_parser("startup", help="time to first successful REST and MCP request")
+    startup.add_argument("--modes", default="subprocess,mounted", help="comma-separated TODO_MCP_MODE values")
+    startup.add_argument("--runs", type=int, default=5)
+    startup.add_argument("--timeout", type=float, default=30)
+    startup.set_defaults(func=bench_startup)
+
+    client = benchmarks.add_parser("mcp-client", help="per-call sessions vs one persistent, pipelined session")
+    client.add_argument("--calls", type=int, default=200)
+    client.add_argument("--transport", choices=["sse", "streamable-http"], default="sse")
+    client.add_argument("--url", default=None, help="MCP endpoint of a running server")
+    client.set_defaults(func=bench_mcp_client)
+
+    batch = benchmarks.add_parser("batch-tools", help="batched vs per-call MCP tool throughput")
+    batch.add_argument("--items", type=int, default=500)
+    batch.add_argument("--batch-size", type=int, default=500)
+    batch.add_argument("--url", default=None, help="SSE endpoint, e.g. http://localhost:8000/sse")
+    batch.set_defaults(func=bench_batch_tools)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,52 @@
 #!/usr/bin/env python3
 """
 Interactive chat with MCP server
+
+Run with: python chat_with_mcp.py [--remote URL]
+
+Without --remote the chat calls the tool functions of mcp_server.py in
+this process. With --remote it talks to a running server over one
+persistent MCP session, e.g. --remote http://localhost:8001/sse
+(streamable HTTP for URLs not ending in /sse).
 """
+import argparse
 import json
-from mcp_server import (
-    get_todos, create_todo, get_todo, 
-    update_todo, delete_todo, complete_todo,
-    get_all_todos_resource, get_completed_todos_resource, get_pending_todos_resource
-)
+
+class RemoteTodos:
+    """The tool and resource functions the chat uses, as calls to a running MCP server"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def get_todos(self):
+        return self.client.call_tool("get_todos")
+
+    def create_todo(self, title, description=""):
+        return self.client.call_tool("create_todo", {"title": title, "description": description})
+
+    def get_todo(self, todo_id):
+        return self.client.call_tool("get_todo", {"todo_id": todo_id})
+
+    def complete_todo(self, todo_id):
+        return self.client.call_tool("complete_todo", {"todo_id": todo_id})
+
+    def delete_todo(self, todo_id):
+        return self.client.call_tool("delete_todo", {"todo_id": todo_id})
+
+    def get_stats(self):
+        return self.client.call_tool("get_stats")
+
+    def get_all_todos_resource(self):
+        return self.client.read_resource("todos://all")
+
+    def get_completed_todos_resource(self):
+        return self.client.read_resource("todos://completed")
+
+    def get_pending_todos_resource(self):
+        return self.client.read_resource("todos://pending")
+
+# mcp_server itself, or a RemoteTodos; set by main()
+api = None
 
 def show_help():
     """Show available commands"""
@@ -28,17 +67,18 @@ def show_help():
 
 def show_stats():
     """Show todo statistics"""
-    all_todos = get_todos()
-    completed = [t for t in all_todos if t['completed']]
-    pending = [t for t in all_todos if not t['completed']]
+    stats = api.get_stats()
+    rate = stats['completed'] / stats['total'] * 100 if stats['total'] > 0 else 0
     
     print(f"""
 📊 Todo Statistics:
 ==================
-📝 Total todos: {len(all_todos)}
-✅ Completed: {len(completed)}
-⏳ Pending: {len(pending)}
-📈 Completion rate: {len(completed)/len(all_todos)*100:.1f}% if len(all_todos) > 0 else 0
+📝 Total todos: {stats['total']}
+✅ Completed: {stats['completed']}
+⏳ Pending: {stats['pending']}
+📈 Completion rate: {rate:.1f}%
+➕ Created (current {stats['recent']['interval_seconds']}s interval): {stats['recent']['created'][0]}
+➖ Deleted (current {stats['recent']['interval_seconds']}s interval): {stats['recent']['deleted'][0]}
 """)
 
 def show_resources():
@@ -47,23 +87,23 @@ def show_resources():
     print("================")
     
     # All todos resource
-    all_resource = get_all_todos_resource()
+    all_resource = api.get_all_todos_resource()
     all_todos = json.loads(all_resource)
     print(f"📋 todos://all - {len(all_todos)} todos")
     
     # Completed todos resource
-    completed_resource = get_completed_todos_resource()
+    completed_resource = api.get_completed_todos_resource()
     completed_todos = json.loads(completed_resource)
     print(f"✅ todos://completed - {len(completed_todos)} completed")
     
     # Pending todos resource
-    pending_resource = get_pending_todos_resource()
+    pending_resource = api.get_pending_todos_resource()
     pending_todos = json.loads(pending_resource)
     print(f"⏳ todos://pending - {len(pending_todos)} pending")
 
 def list_todos():
     """List all todos"""
-    todos = get_todos()
+    todos = api.get_todos()
     if not todos:
         print("📝 No todos found. Create one with: create <title>")
         return
@@ -86,7 +126,7 @@ def create_todo_interactive():
     description = input("📄 Description (optional): ").strip()
     
     try:
-        todo = create_todo(title, description)
+        todo = api.create_todo(title, description)
         print(f"✅ Created: {todo['title']} (ID: {todo['id']})")
     except Exception as e:
         print(f"❌ Error creating todo: {e}")
@@ -95,7 +135,7 @@ def get_todo_interactive():
     """Interactive todo retrieval"""
     try:
         todo_id = int(input("🔍 Todo ID: ").strip())
-        todo = get_todo(todo_id)
+        todo = api.get_todo(todo_id)
         status = "✅" if todo['completed'] else "⏳"
         print(f"\n📄 Todo {todo['id']}:")
         print(f"   {status} {todo['title']}")
@@ -110,7 +150,7 @@ def complete_todo_interactive():
     """Interactive todo completion"""
     try:
         todo_id = int(input("✅ Complete todo ID: ").strip())
-        todo = complete_todo(todo_id)
+        todo = api.complete_todo(todo_id)
         print(f"✅ Completed: {todo['title']}")
     except ValueError:
         print("❌ Invalid ID. Please enter a number.")
@@ -121,7 +161,7 @@ def delete_todo_interactive():
     """Interactive todo deletion"""
     try:
         todo_id = int(input("❌ Delete todo ID: ").strip())
-        todo = delete_todo(todo_id)
+        todo = api.delete_todo(todo_id)
         print(f"🗑️  Deleted: {todo['title']}")
     except ValueError:
         print("❌ Invalid ID. Please enter a number.")
@@ -130,6 +170,32 @@ def delete_todo_interactive():
 
 def main():
     """Main chat loop"""
+    global api
+    parser = argparse.ArgumentParser(description="Interactive chat with the todo MCP server")
+    parser.add_argument("--remote", metavar="URL", help="MCP endpoint of a running server (SSE or streamable HTTP)")
+    args = parser.parse_args()
+    client = None
+    if args.remote:
+        from mcp_client import McpSyncClient
+        client = McpSyncClient(args.remote)
+        try:
+            client.connect()
+        except ConnectionError as e:
+            print(f"❌ Cannot reach {args.remote}: {e}")
+            client.close()
+            return
+        api = RemoteTodos(client)
+    else:
+        import mcp_server
+        api = mcp_server
+    try:
+        chat()
+    finally:
+        if client is not None:
+            client.close()
+
+def chat():
+    """Read and run commands until quit"""
     print("🤖 Welcome to MCP Todo Chat!")
     print("Type 'help' for commands or 'quit' to exit")
     print("=" * 40)
@@ -163,7 +229,7 @@ def main():
                 if len(parts) > 1:
                     title = parts[1]
                     try:
-                        todo = create_todo(title)
+                        todo = api.create_todo(title)
                         print(f"✅ Created: {todo['title']} (ID: {todo['id']})")
                     except Exception as e:
                         print(f"❌ Error: {e}")
@@ -171,7 +237,7 @@ def main():
                 # Handle inline retrieval
                 try:
                     todo_id = int(command.split()[1])
-                    todo = get_todo(todo_id)
+                    todo = api.get_todo(todo_id)
                     status = "✅" if todo['completed'] else "⏳"
                     print(f"📄 {todo['title']}: {todo['description']} ({status})")
                 except (ValueError, IndexError):
@@ -182,7 +248,7 @@ def main():
                 # Handle inline completion
                 try:
                     todo_id = int(command.split()[1])
-                    todo = complete_todo(todo_id)
+                    todo = api.complete_todo(todo_id)
                     print(f"✅ Completed: {todo['title']}")
                 except (ValueError, IndexError):
                     print("❌ Usage: complete <id>")
@@ -192,7 +258,7 @@ def main():
                 # Handle inline deletion
                 try:
                     todo_id = int(command.split()[1])
-                    todo = delete_todo(todo_id)
+                    todo = api.delete_todo(todo_id)
                     print(f"🗑️  Deleted: {todo['title']}")
                 except (ValueError, IndexError):
                     print("❌ Usage: delete <id>")
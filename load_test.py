@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Load test for the REST API and the MCP server
+
+Starts `uvicorn main:app` on loopback with MCP mounted in the same process,
+seeds it to each requested store size, then drives a weighted mix of
+list/get/create/update/delete through a pool of concurrent httpx clients
+and through concurrent MCP client sessions. Reports requests/sec and
+latency percentiles per operation and writes them as JSON so runs can be
+compared across commits.
+
+Run with: python load_test.py [options]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from contextlib import AsyncExitStack
+
+import httpx
+
+from benchmarks import percentiles
+
+OPERATIONS = ("list", "get", "create", "update", "delete")
+SEED_CHUNK = 10000
+
+
+class IdPool:
+    """IDs believed to exist, for picking get/update/delete targets"""
+
+    def __init__(self, ids):
+        self._ids = list(ids)
+
+    def add(self, todo_id):
+        self._ids.append(todo_id)
+
+    def pick(self, rng):
+        return rng.choice(self._ids) if self._ids else None
+
+    def take(self, rng):
+        # Swap-remove, so deletes don't pay for shifting the list
+        if not self._ids:
+            return None
+        index = rng.randrange(len(self._ids))
+        self._ids[index], self._ids[-1] = self._ids[-1], self._ids[index]
+        return self._ids.pop()
+
+
+def parse_mix(text):
+    """"list=10,get=50,..." -> ([operations], [weights])"""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation {name!r}, expected one of {', '.join(OPERATIONS)}")
+        mix[name] = float(weight)
+    return list(mix), list(mix.values())
+
+
+# ---- Server ----
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args, port):
+    env = {**os.environ, "TODO_MCP_MODE": "mounted", "TODO_MCP_TRANSPORT": args.transport}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+        # FastMCP logs every session at INFO
+        stdout=None if args.verbose else subprocess.DEVNULL, stderr=None if args.verbose else subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + args.startup_timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode} (rerun with --verbose)")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/").status_code == 200:
+                return server
+        except httpx.TransportError:
+            pass
+        time.sleep(0.05)
+    server.terminate()
+    raise RuntimeError(f"Server not ready after {args.startup_timeout}s")
+
+
+async def seed(client, size):
+    for start in range(0, size, SEED_CHUNK):
+        rows = [{"title": f"Seed {i}", "description": "x" * 64} for i in range(start, min(size, start + SEED_CHUNK))]
+        response = await client.post("/todos/bulk", json=rows)
+        response.raise_for_status()
+
+
+# ---- Operations ----
+# Each takes (client, pool, rng, n) and returns True on success
+async def rest_list(client, pool, rng, n):
+    return (await client.get("/todos/", params={"limit": 100})).is_success
+
+
+async def rest_get(client, pool, rng, n):
+    return (await client.get(f"/todos/{pool.pick(rng)}")).is_success
+
+
+async def rest_create(client, pool, rng, n):
+    response = await client.post("/todos/", json={"title": f"Load {n}", "description": "x" * 64})
+    if response.is_success:
+        pool.add(response.json()["id"])
+    return response.is_success
+
+
+async def rest_update(client, pool, rng, n):
+    todo_id = pool.pick(rng)
+    response = await client.put(f"/todos/{todo_id}", json={"id": todo_id, "title": f"Updated {n}",
+                                                           "description": "y" * 64, "completed": True})
+    return response.is_success
+
+
+async def rest_delete(client, pool, rng, n):
+    return (await client.delete(f"/todos/{pool.take(rng)}")).is_success
+
+
+async def mcp_list(session, pool, rng, n):
+    return not (await session.call_tool("get_todos", {"limit": 100})).isError
+
+
+async def mcp_get(session, pool, rng, n):
+    return not (await session.call_tool("get_todo", {"todo_id": pool.pick(rng)})).isError
+
+
+async def mcp_create(session, pool, rng, n):
+    result = await session.call_tool("create_todo", {"title": f"Load {n}", "description": "x" * 64})
+    if not result.isError:
+        pool.add(result.structuredContent["result"]["id"])
+    return not result.isError
+
+
+async def mcp_update(session, pool, rng, n):
+    result = await session.call_tool("update_todo", {"todo_id": pool.pick(rng), "title": f"Updated {n}",
+                                                     "completed": True})
+    return not result.isError
+
+
+async def mcp_delete(session, pool, rng, n):
+    return not (await session.call_tool("delete_todo", {"todo_id": pool.take(rng)})).isError
+
+
+REST_OPERATIONS = {"list": rest_list, "get": rest_get, "create": rest_create, "update": rest_update,
+                   "delete": rest_delete}
+MCP_OPERATIONS = {"list": mcp_list, "get": mcp_get, "create": mcp_create, "update": mcp_update,
+                  "delete": mcp_delete}
+
+
+# ---- Driver ----
+async def drive(targets, operations, mix, pool, duration, seed_value):
+    """Run one worker per target until ``duration`` elapses.
+
+    Returns {operation: (latency samples in ns, error count)} and the
+    elapsed wall time. Workers share the ID pool, so a get or update can
+    occasionally race a delete of the same ID and count as an error.
+    """
+    names, weights = mix
+    samples = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    deadline = time.perf_counter() + duration
+
+    async def worker(target, rng):
+        n = 0
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            n += 1
+            started = time.perf_counter_ns()
+            try:
+                ok = await operations[name](target, pool, rng, n)
+            except Exception:
+                ok = False
+            samples[name].append(time.perf_counter_ns() - started)
+            errors[name] += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(target, random.Random(seed_value + i)) for i, target in enumerate(targets)))
+    elapsed = time.perf_counter() - started
+    return {name: (samples[name], errors[name]) for name in names}, elapsed
+
+
+def summarize(interface, size, measured, elapsed):
+    rows = []
+    for name, (samples, errors) in measured.items():
+        if not samples:
+            continue
+        rows.append({"interface": interface, "store_size": size, "operation": name, "requests": len(samples),
+                     "errors": errors, "rps": round(len(samples) / elapsed, 1), **percentiles(samples)})
+    return rows
+
+
+async def mcp_sessions(args, base_url, count):
+    """Open ``count`` initialized MCP client sessions; returns (sessions, exit stack)"""
+    from mcp import ClientSession
+    stack = AsyncExitStack()
+    sessions = []
+    for _ in range(count):
+        if args.transport == "streamable-http":
+            from mcp.client.streamable_http import streamablehttp_client
+            read, write, _ = await stack.enter_async_context(streamablehttp_client(f"{base_url}/mcp/"))
+        else:
+            from mcp.client.sse import sse_client
+            read, write = await stack.enter_async_context(sse_client(f"{base_url}/mcp/sse"))
+        session = await stack.enter_async_context(ClientSession(read, write))
+        await session.initialize()
+        sessions.append(session)
+    return sessions, stack
+
+
+async def run_size(args, size):
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = await asyncio.to_thread(start_server, args, port)
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+            await seed(client, size)
+            pool = IdPool(range(1, size + 1))
+            rows = []
+            if args.concurrency:
+                measured, elapsed = await drive([client] * args.concurrency, REST_OPERATIONS, args.mix, pool,
+                                                args.duration, args.seed)
+                rows += summarize("rest", size, measured, elapsed)
+            if args.mcp_sessions:
+                sessions, stack = await mcp_sessions(args, base_url, args.mcp_sessions)
+                async with stack:
+                    measured, elapsed = await drive(sessions, MCP_OPERATIONS, args.mix, pool, args.duration,
+                                                    args.seed)
+                rows += summarize("mcp", size, measured, elapsed)
+            return rows
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_table(rows):
+    print(f"{'interface':<10}{'size':>9} {'operation':<10}{'requests':>9}{'errors':>8}{'rps':>10}"
+          f"{'p50_us':>11}{'p95_us':>11}{'p99_us':>11}")
+    for row in rows:
+        print(f"{row['interface']:<10}{row['store_size']:>9} {row['operation']:<10}{row['requests']:>9}"
+              f"{row['errors']:>8}{row['rps']:>10}{row['p50_us']:>11}{row['p95_us']:>11}{row['p99_us']:>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the todo REST API and MCP server")
+    parser.add_argument("--sizes", default="1000,100000", help="comma-separated store sizes to seed")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per interface and size")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent REST requests (0 to skip)")
+    parser.add_argument("--mcp-sessions", type=int, default=8, help="concurrent MCP sessions (0 to skip)")
+    parser.add_argument("--transport", choices=["sse", "streamable-http"], default="streamable-http")
+    parser.add_argument("--mix", type=parse_mix, default="list=10,get=50,create=15,update=15,delete=10",
+                        help="weighted operation mix")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the operation sequence")
+    parser.add_argument("--startup-timeout", type=float, default=30)
+    parser.add_argument("--output", default="load_test_results.json", help="JSON results file")
+    parser.add_argument("--verbose", action="store_true", help="show the server's output")
+    args = parser.parse_args()
+    # The MCP client logs every request at INFO
+    logging.getLogger("mcp").setLevel(logging.WARNING)
+
+    rows = []
+    for size in [int(n) for n in args.sizes.split(",")]:
+        rows += asyncio.run(run_size(args, size))
+    print_table(rows)
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "settings": {"duration": args.duration, "concurrency": args.concurrency, "mcp_sessions": args.mcp_sessions,
+                     "transport": args.transport, "mix": dict(zip(*args.mix))},
+        "results": rows,
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,25 @@
 # FastAPI Todo Server with MCP Integration
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import List, Dict, Any
-import subprocess
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from typing import List, Dict, Any, Optional, Tuple
+import os
+import sys
 import threading
 import time
 from contextlib import asynccontextmanager
 
-# Import shared data from MCP server
-from mcp_server import todos, next_id
+# Shared todo store (also used by the MCP server)
+from todo_store import (
+    store, TodoNotFoundError, PreconditionFailedError, serve_store, store_env, paginate, list_todos, search,
+    dumps_compact, dumps_bytes, MAX_PAGE_SIZE, DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT, todo_etag, list_etag,
+    parse_fields, project, version_tag, parse_version_tag
+)
+from todo_metrics import metrics, MetricsMiddleware, PROMETHEUS_CONTENT_TYPE
+from todo_changes import ChangeFeed
+from mcp_supervisor import McpSupervisor
 
 # ---- Todo Schema ----
 class Todo(BaseModel):
@@ -17,32 +28,149 @@ class Todo(BaseModel):
     description: str = ""
     completed: bool = False
 
+class RawJSONResponse(Response):
+    """Response whose body is already-encoded JSON.
+
+    Returning one skips FastAPI's jsonable_encoder walk and re-encoding,
+    so cached payloads from the store (bytes) go out as they are.
+    """
+    media_type = "application/json"
+
+# ---- Conditional Requests ----
+def parse_etags(header: Optional[str]) -> Optional[List[str]]:
+    """Entity tags listed in an If-Match / If-None-Match header.
+
+    Returns None when the header is absent or "*" (any current version).
+    """
+    if header is None or header.strip() == "*":
+        return None
+    return [tag.strip() for tag in header.split(",") if tag.strip()]
+
+def not_modified(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether If-None-Match lets a GET answer 304 for a resource at ``etag``"""
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so W/"x" matches "x"
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in parse_etags(if_none_match))
+
+def not_modified_response(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
+
+def parse_fields_or_400(fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    try:
+        return parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# ---- MCP Integration Settings ----
+# "subprocess": run mcp_server.py as a child process on its own port
+# "mounted": serve the MCP ASGI app from this process under MCP_MOUNT_PATH
+MCP_MODE = os.environ.get("TODO_MCP_MODE", "subprocess")
+# Transport of the mounted MCP app: "sse" or "streamable-http"
+MCP_TRANSPORT = os.environ.get("TODO_MCP_TRANSPORT", "sse")
+MCP_MOUNT_PATH = "/mcp"
+# Address of the MCP subprocess; the port must differ from the REST API's
+MCP_HOST = os.environ.get("TODO_MCP_HOST", "127.0.0.1")
+MCP_PORT = int(os.environ.get("TODO_MCP_PORT", "8001"))
+# Seconds startup waits for the MCP subprocess to accept connections
+MCP_STARTUP_TIMEOUT = float(os.environ.get("TODO_MCP_STARTUP_TIMEOUT", "10"))
+
+if MCP_MODE not in ("subprocess", "mounted"):
+    raise ValueError(f"Unknown TODO_MCP_MODE: {MCP_MODE}")
+if MCP_TRANSPORT not in ("sse", "streamable-http"):
+    raise ValueError(f"Unknown TODO_MCP_TRANSPORT: {MCP_TRANSPORT}")
+
+def create_mcp_app():
+    """Build the ASGI app of the MCP server for mounting under MCP_MOUNT_PATH"""
+    # Imported here so subprocess mode never loads FastMCP into this process
+    from mcp_server import mcp_server, hosted_app
+    if MCP_TRANSPORT == "streamable-http":
+        # Endpoint becomes MCP_MOUNT_PATH itself rather than /mcp/mcp
+        mcp_server.settings.streamable_http_path = "/"
+    # The SSE transport picks up the mount prefix from the ASGI root_path.
+    # Requests arrive under whatever Host this app is served as, so the
+    # MCP transports check it only when TODO_MCP_ALLOWED_HOSTS says to
+    return mcp_server, hosted_app(MCP_TRANSPORT)
+
 # ---- FastAPI App ----
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    if MCP_MODE == "mounted":
+        print(f"Serving MCP ({MCP_TRANSPORT}) in-process at {MCP_MOUNT_PATH}")
+        if MCP_TRANSPORT == "streamable-http":
+            # Mounted sub-apps don't get lifespan events, so run the
+            # streamable-HTTP session manager from ours
+            async with mounted_mcp_server.session_manager.run():
+                yield
+        else:
+            yield
+        return
+
     # Startup
+    # Serve our store over local IPC so the MCP subprocess attaches to it
+    # instead of starting with its own empty copy
+    store_server = serve_store(store)
+    print(f"Sharing todo store at {store_server.address}")
     print("Starting MCP server in background...")
-    # Start MCP server as a subprocess
-    mcp_process = subprocess.Popen([
-        "python", "mcp_server.py"
-    ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    print(f"MCP server started with PID: {mcp_process.pid}")
+    global mcp_supervisor
+    mcp_supervisor = McpSupervisor(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "mcp_server.py")],
+        env={**os.environ, **store_env(store_server), "TODO_MCP_HOST": MCP_HOST, "TODO_MCP_PORT": str(MCP_PORT)},
+        host=MCP_HOST, port=MCP_PORT, timeout=MCP_STARTUP_TIMEOUT
+    )
+    if await mcp_supervisor.start():
+        print(f"MCP server ready at {MCP_HOST}:{MCP_PORT} (PID {mcp_supervisor.pid})")
+    else:
+        # Keep serving REST; the supervisor restarts the child if it exits
+        print(f"MCP server not ready after {MCP_STARTUP_TIMEOUT:g}s (PID {mcp_supervisor.pid})")
     yield
     # Shutdown
     print("Shutting down MCP server...")
-    mcp_process.terminate()
-    mcp_process.wait()
+    await mcp_supervisor.stop()
+    store_server.stop_event.set()
+
+# Supervisor of the MCP subprocess while it runs (subprocess mode only)
+mcp_supervisor: Optional[McpSupervisor] = None
 
 app = FastAPI(
     title="Todo MCP Server", 
     description="A FastAPI app with MCP integration for todo management",
     lifespan=lifespan
 )
+# Counts and times every request to the routes below
+app.add_middleware(MetricsMiddleware)
+
+if MCP_MODE == "mounted":
+    mounted_mcp_server, mcp_app = create_mcp_app()
+    app.mount(MCP_MOUNT_PATH, mcp_app)
 
 # Regular FastAPI routes for direct API access
 @app.get("/todos/")
-def get_todos_api():
-    return todos
+def get_todos_api(limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None,
+                  completed: Optional[bool] = None, id_gte: Optional[int] = None, id_lt: Optional[int] = None,
+                  title_prefix: Optional[str] = None, order: str = Query("asc", pattern="^(asc|desc)$"),
+                  fields: Optional[str] = None, if_none_match: Optional[str] = Header(None)):
+    # fields=id,title,... returns only those keys of each todo ("id" always)
+    fields = parse_fields_or_400(fields)
+    # Read the version before the body: a write in between only makes the
+    # ETag older than the body, which costs the client a refetch, never a stale hit
+    etag = list_etag(store.epoch(), store.version())
+    if not_modified(if_none_match, etag):
+        return not_modified_response(etag)
+    filters = dict(completed=completed, id_gte=id_gte, id_lt=id_lt, title_prefix=title_prefix, order=order)
+    if limit is None and cursor is None:
+        # The plain list and the completed/pending views come straight from
+        # the store's per-version serialization cache
+        if id_gte is None and id_lt is None and not title_prefix and order == "asc":
+            return RawJSONResponse(store.dumps(completed, fields), headers={"ETag": etag})
+        return RawJSONResponse(dumps_bytes(list_todos(store, fields, **filters)), headers={"ETag": etag})
+    try:
+        return RawJSONResponse(dumps_bytes(paginate(store, limit, cursor, fields, **filters)),
+                               headers={"ETag": etag})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 class TodoCreate(BaseModel):
     title: str
@@ -51,54 +179,186 @@ class TodoCreate(BaseModel):
 
 @app.post("/todos/")
 def create_todo_api(todo: TodoCreate):
-    global next_id
-    todo_dict = {
-        "id": next_id,
-        "title": todo.title,
-        "description": todo.description,
-        "completed": todo.completed
-    }
-    todos.append(todo_dict)
-    next_id += 1
-    return todo_dict
+    return store.create(todo.title, todo.description, todo.completed)
+
+# ---- Bulk import / export ----
+# Rows per create_many call on import and per store page on export
+BULK_CHUNK_SIZE = 10000
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+todo_list_adapter = TypeAdapter(List[TodoCreate])
+
+def parse_bulk_rows(body: bytes, content_type: str) -> List[Dict[str, Any]]:
+    """Validate a bulk import body into create_many rows; a bad row is a 422.
+
+    Errors in an NDJSON body carry the (1-based) line number of the row.
+    """
+    if "ndjson" not in content_type and "jsonl" not in content_type:
+        try:
+            return [item.model_dump() for item in todo_list_adapter.validate_json(body)]
+        except ValidationError as e:
+            raise bulk_error(e.errors(include_url=False, include_context=False))
+    rows = []
+    for number, line in enumerate(body.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            rows.append(TodoCreate.model_validate_json(line).model_dump())
+        except ValidationError as e:
+            raise bulk_error([dict(error, line=number) for error in e.errors(include_url=False, include_context=False)])
+    return rows
+
+def bulk_error(errors: List[Dict[str, Any]]) -> HTTPException:
+    # jsonable_encoder: the input of a body or line that isn't JSON is bytes
+    return HTTPException(status_code=422, detail=jsonable_encoder(errors))
+
+def import_todos(body: bytes, content_type: str) -> int:
+    rows = parse_bulk_rows(body, content_type)
+    for start in range(0, len(rows), BULK_CHUNK_SIZE):
+        store.create_many(rows[start:start + BULK_CHUNK_SIZE])
+    return len(rows)
+
+@app.post("/todos/bulk")
+async def bulk_create_todos_api(request: Request):
+    """Create many todos from a JSON array or an NDJSON body (one todo per line).
+
+    Every row is validated before any is created, so a bad row rejects the
+    whole request.
+    """
+    body = await request.body()
+    # Parsing a large body takes seconds, so it runs on a worker thread
+    # along with the inserts rather than stalling the event loop
+    created = await run_in_threadpool(import_todos, body, request.headers.get("content-type", ""))
+    return {"created": created}
+
+def export_ndjson():
+    # Walks the store one page at a time, so memory use does not grow
+    # with the number of todos
+    after_id = None
+    while True:
+        todos, after_id = store.page(BULK_CHUNK_SIZE, after_id)
+        if todos:
+            yield b"".join(dumps_bytes(todo) + b"\n" for todo in todos)
+        if after_id is None:
+            return
+
+@app.get("/todos/export")
+def export_todos_api():
+    """Stream every todo as NDJSON, in ID order"""
+    return StreamingResponse(export_ndjson(), media_type=NDJSON_MEDIA_TYPE)
+
+@app.get("/todos/search")
+def search_todos_api(q: str, limit: int = Query(DEFAULT_SEARCH_LIMIT, ge=1, le=MAX_SEARCH_LIMIT)):
+    """Todos matching any word of ``q``, best match first"""
+    return search(store, q, limit)
+
+# Recent changes of the store, for GET /todos/changes
+change_feed = ChangeFeed(store)
+# Seconds between keep-alive comments on an idle change stream
+CHANGES_PING_SECONDS = 15
+
+@app.get("/todos/changes")
+async def todo_changes_api(since: Optional[str] = None, last_event_id: Optional[str] = Header(None)):
+    """Server-Sent Events stream of create/update/delete/clear events.
+
+    Each event's id is "<epoch>.<version>", the store version after it, so a
+    client resumes with ?since=<id> (EventSource does this itself via
+    Last-Event-ID). If that history is gone, is from another epoch (before
+    a restart), or the client can't keep up, the stream sends a "resync"
+    event and ends: reload GET /todos/ and reconnect with since=<its ETag>.
+    A bare ?since=<version> is taken to be of the current epoch.
+    """
+    epoch = version = None
+    try:
+        if since is not None:
+            epoch, version = parse_version_tag(since)
+        elif last_event_id is not None:
+            epoch, version = parse_version_tag(last_event_id)
+    except ValueError as e:
+        if since is not None:
+            raise HTTPException(status_code=400, detail=str(e))
+        # An id we never sent: start from now
+
+    async def events():
+        async for event in change_feed.stream(version, epoch):
+            yield {"id": version_tag(change_feed.epoch, event["version"]), "event": event["op"],
+                   "data": dumps_compact(event)}
+
+    # Imported on first use to keep it off the startup path
+    from sse_starlette.sse import EventSourceResponse
+    return EventSourceResponse(events(), ping=CHANGES_PING_SECONDS)
+
+@app.get("/todos/stats")
+def get_stats_api():
+    """Todo counts, read from counters the store keeps up to date"""
+    return store.stats()
 
 @app.get("/todos/{todo_id}")
-def get_todo_api(todo_id: int):
-    for todo in todos:
-        if todo["id"] == todo_id:
-            return todo
-    raise HTTPException(status_code=404, detail="Todo not found")
+def get_todo_api(todo_id: int, response: Response, fields: Optional[str] = None,
+                 if_none_match: Optional[str] = Header(None)):
+    fields = parse_fields_or_400(fields)
+    try:
+        todo = store.get(todo_id)
+    except TodoNotFoundError:
+        raise HTTPException(status_code=404, detail="Todo not found")
+    etag = todo_etag(todo)
+    if not_modified(if_none_match, etag):
+        return not_modified_response(etag)
+    response.headers["ETag"] = etag
+    # The ETag is the whole todo's, so it still works for If-Match on PUT/DELETE
+    return project(todo, fields)
 
 @app.put("/todos/{todo_id}")
-def update_todo_api(todo_id: int, updated_todo: Todo):
-    for i, todo in enumerate(todos):
-        if todo["id"] == todo_id:
-            todo["title"] = updated_todo.title
-            todo["description"] = updated_todo.description
-            todo["completed"] = updated_todo.completed
-            return todo
-    raise HTTPException(status_code=404, detail="Todo not found")
+def update_todo_api(todo_id: int, updated_todo: Todo, response: Response, if_match: Optional[str] = Header(None)):
+    try:
+        todo = store.update(
+            todo_id,
+            title=updated_todo.title,
+            description=updated_todo.description,
+            completed=updated_todo.completed,
+            if_match=parse_etags(if_match)
+        )
+    except TodoNotFoundError:
+        raise HTTPException(status_code=404, detail="Todo not found")
+    except PreconditionFailedError as e:
+        raise HTTPException(status_code=412, detail=str(e))
+    response.headers["ETag"] = todo_etag(todo)
+    return todo
 
 @app.delete("/todos/{todo_id}")
-def delete_todo_api(todo_id: int):
-    for i, todo in enumerate(todos):
-        if todo["id"] == todo_id:
-            return todos.pop(i)
-    raise HTTPException(status_code=404, detail="Todo not found")
+def delete_todo_api(todo_id: int, if_match: Optional[str] = Header(None)):
+    try:
+        return store.delete(todo_id, if_match=parse_etags(if_match))
+    except TodoNotFoundError:
+        raise HTTPException(status_code=404, detail="Todo not found")
+    except PreconditionFailedError as e:
+        raise HTTPException(status_code=412, detail=str(e))
+
+@app.get("/metrics")
+def metrics_api():
+    """Per-route (and, when mounted, per-tool) metrics in Prometheus text format"""
+    return Response(metrics.render_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+def mcp_process_info() -> str:
+    if mcp_supervisor is None:
+        return "Not running"
+    return (f"Separate process at {MCP_HOST}:{MCP_PORT}: {mcp_supervisor.status} "
+            f"(PID {mcp_supervisor.pid}, {mcp_supervisor.restarts} restarts)")
 
 @app.get("/")
 def root():
     return {
         "message": "Todo MCP Server",
-        "mcp_server": "Running on separate process",
+        "mcp_server": f"Mounted at {MCP_MOUNT_PATH} ({MCP_TRANSPORT})" if MCP_MODE == "mounted" else mcp_process_info(),
         "api_docs": "/docs",
         "todos_api": "/todos/",
         "mcp_tools": [
-            "get_todos", "create_todo", "get_todo", 
-            "update_todo", "delete_todo", "complete_todo"
+            "get_todos", "search_todos", "get_stats", "create_todo", "get_todo", 
+            "update_todo", "delete_todo", "complete_todo",
+            "create_todos", "update_todos", "delete_todos", "complete_todos"
         ],
         "mcp_resources": [
-            "todos://all", "todos://completed", "todos://pending"
+            "todos://all", "todos://completed", "todos://pending", "todos://stats", "todos://metrics",
+            "todos://all/{fields}", "todos://completed/{fields}", "todos://pending/{fields}"
         ]
     }
 
@@ -0,0 +1,305 @@
+# Async MCP client with a persistent session, for talking to a running server
+from contextlib import AsyncExitStack
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import asyncio
+import json
+import threading
+
+# Tools that are safe to send again when the connection drops mid-call:
+# a retried create_todo could create the todo twice
+RETRYABLE_TOOLS = frozenset({
+    "get_todos", "search_todos", "get_stats", "get_todo", "update_todo", "complete_todo", "update_todos",
+    "complete_todos",
+})
+# Requests one client keeps in flight at once; more wait for a free slot
+MAX_IN_FLIGHT = 64
+
+
+class McpConnectionError(ConnectionError):
+    """The server could not be reached, or the connection dropped during a call"""
+
+
+class McpToolError(Exception):
+    """A tool call the server answered with isError (e.g. todo not found)"""
+
+    def __init__(self, tool: str, message: str):
+        super().__init__(f"{tool}: {message}")
+        self.tool = tool
+
+
+def transport_of(url: str) -> str:
+    """"sse" for SSE endpoints (.../sse), else "streamable-http\""""
+    return "sse" if url.rstrip("/").endswith("/sse") else "streamable-http"
+
+
+def _connection_lost(error: BaseException) -> bool:
+    import anyio
+    import httpx
+    from mcp.shared.exceptions import McpError
+    from mcp.types import CONNECTION_CLOSED
+    if isinstance(error, McpError):
+        # Includes requests that timed out waiting for an answer
+        return error.error.code in (CONNECTION_CLOSED, httpx.codes.REQUEST_TIMEOUT)
+    return isinstance(error, (httpx.TransportError, anyio.ClosedResourceError, anyio.BrokenResourceError,
+                              anyio.EndOfStream, OSError))
+
+
+def _session_expired(error: BaseException) -> bool:
+    # Streamable HTTP: the server answered 404 for our session ID, e.g. after a restart
+    from mcp.shared.exceptions import McpError
+    return isinstance(error, McpError) and error.error.message == "Session terminated"
+
+
+def _unwrap(error: BaseException) -> BaseException:
+    # Transport failures arrive wrapped in single-member anyio exception groups
+    while isinstance(error, BaseExceptionGroup) and len(error.exceptions) == 1:
+        error = error.exceptions[0]
+    return error
+
+
+def _tool_value(result) -> Any:
+    # FastMCP wraps non-object return values as {"result": value}
+    if result.structuredContent is not None:
+        content = result.structuredContent
+        return content["result"] if list(content) == ["result"] else content
+    texts = [item.text for item in result.content if getattr(item, "text", None) is not None]
+    if len(texts) != 1:
+        return texts
+    try:
+        return json.loads(texts[0])
+    except ValueError:
+        return texts[0]
+
+
+class _Connection:
+    """One transport + initialized ClientSession, owned by a task of its own.
+
+    The transports are anyio task groups that must be exited by the task
+    that entered them, so the session lives in ``_run`` until ``close()``
+    or until the transport fails; requests from any task use ``session``.
+    """
+
+    def __init__(self):
+        self.session = None
+        self.closed = False
+        self._stop = asyncio.Event()
+        self._ready: Optional[asyncio.Future] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    async def open(cls, url: str, transport: str, timeout: float) -> "_Connection":
+        connection = cls()
+        loop = asyncio.get_running_loop()
+        connection._ready = loop.create_future()
+        connection._task = loop.create_task(connection._run(url, transport, timeout))
+        await connection._ready
+        return connection
+
+    async def _run(self, url: str, transport: str, timeout: float) -> None:
+        from mcp import ClientSession
+        try:
+            async with AsyncExitStack() as stack:
+                if transport == "sse":
+                    from mcp.client.sse import sse_client
+                    read, write = await stack.enter_async_context(sse_client(url, timeout=timeout))
+                else:
+                    import httpx
+                    from mcp.client.streamable_http import streamable_http_client
+                    from mcp.shared._httpx_utils import create_mcp_http_client
+                    # Streams stay open between events, so reads get the transports' usual 5 minutes
+                    http_client = await stack.enter_async_context(
+                        create_mcp_http_client(timeout=httpx.Timeout(timeout, read=300)))
+                    read, write, _ = await stack.enter_async_context(
+                        streamable_http_client(url, http_client=http_client))
+                session = await stack.enter_async_context(
+                    ClientSession(read, write, read_timeout_seconds=timedelta(seconds=timeout)))
+                await session.initialize()
+                self.session = session
+                self._ready.set_result(None)
+                await self._stop.wait()
+        except BaseException as error:
+            if not self._ready.done():
+                self._ready.set_exception(error if isinstance(error, Exception) else McpConnectionError(str(error)))
+            if not isinstance(error, Exception):
+                raise
+        finally:
+            self.closed = True
+
+    async def close(self) -> None:
+        self.closed = True
+        self._stop.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), 5)
+        except BaseException:
+            # A transport that failed or hangs on exit: the session is gone either way
+            self._task.cancel()
+
+
+class McpClient:
+    """Persistent MCP client session over SSE or streamable HTTP.
+
+    One session serves every call, so calls skip the connect/initialize
+    handshake, and concurrent calls (e.g. ``call_many`` or several tasks
+    awaiting ``call_tool``) are pipelined on it: each is sent as soon as a
+    slot among ``max_in_flight`` is free, and answers are matched by request
+    ID. When the connection drops, the next call reconnects, retrying up to
+    ``retries`` times with doubling delays. A call that was in flight is
+    sent again on the new session if its tool is in RETRYABLE_TOOLS (or it
+    reads) or the server reports the session unknown; otherwise it raises
+    McpConnectionError, since the server may have applied it.
+
+        async with McpClient("http://localhost:8001/sse") as client:
+            todo = await client.call_tool("create_todo", {"title": "Buy milk"})
+    """
+
+    def __init__(self, url: str, transport: Optional[str] = None, timeout: float = 30.0, retries: int = 3,
+                 backoff: float = 0.2, max_in_flight: int = MAX_IN_FLIGHT):
+        self.url = url
+        self.transport = transport or transport_of(url)
+        if self.transport not in ("sse", "streamable-http"):
+            raise ValueError(f"Unknown MCP transport: {self.transport}")
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.reconnects = 0
+        self._connection: Optional[_Connection] = None
+        self._connect_lock = asyncio.Lock()
+        self._slots = asyncio.Semaphore(max_in_flight)
+
+    async def __aenter__(self) -> "McpClient":
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def connect(self) -> None:
+        """Open the session now rather than on the first call"""
+        await self._current()
+
+    async def close(self) -> None:
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            await connection.close()
+
+    async def _current(self) -> _Connection:
+        connection = self._connection
+        if connection is not None and not connection.closed:
+            return connection
+        async with self._connect_lock:
+            # Another task may have reconnected while we waited
+            if self._connection is not None and not self._connection.closed:
+                return self._connection
+            if self._connection is not None:
+                self.reconnects += 1
+            delay = self.backoff
+            for attempt in range(self.retries + 1):
+                try:
+                    self._connection = await _Connection.open(self.url, self.transport, self.timeout)
+                    return self._connection
+                except Exception as error:
+                    if attempt == self.retries:
+                        raise McpConnectionError(f"Cannot connect to {self.url}: {_unwrap(error)!r}") from error
+                await asyncio.sleep(delay)
+                delay *= 2
+
+    async def _request(self, send, retry: bool):
+        async with self._slots:
+            attempt = 0
+            while True:
+                connection = await self._current()
+                try:
+                    return await send(connection.session)
+                except Exception as error:
+                    expired = _session_expired(error)
+                    if not expired and not _connection_lost(error):
+                        raise
+                    # Drop the broken session; the next attempt (or call) reconnects
+                    if self._connection is connection:
+                        await connection.close()
+                    attempt += 1
+                    # The server rejects requests on an expired session unseen, so those are always safe to resend
+                    if attempt > self.retries or not (retry or expired):
+                        raise McpConnectionError(f"Connection to {self.url} lost: {error!r}") from error
+
+    async def call_tool(self, name: str, arguments: Optional[Dict[str, Any]] = None) -> Any:
+        """Call a tool; returns its result value, raises McpToolError if it failed"""
+        result = await self._request(lambda session: session.call_tool(name, arguments or {}),
+                                     retry=name in RETRYABLE_TOOLS)
+        if result.isError:
+            raise McpToolError(name, " ".join(getattr(item, "text", "") for item in result.content))
+        return _tool_value(result)
+
+    async def call_many(self, calls: Sequence[Tuple[str, Optional[Dict[str, Any]]]],
+                        return_exceptions: bool = False) -> List[Any]:
+        """Run (tool name, arguments) calls concurrently on the session; results in order"""
+        return await asyncio.gather(*(self.call_tool(name, arguments) for name, arguments in calls),
+                                    return_exceptions=return_exceptions)
+
+    async def read_resource(self, uri: str) -> str:
+        """Text of a resource, e.g. the JSON of todos://all"""
+        from pydantic import AnyUrl
+        result = await self._request(lambda session: session.read_resource(AnyUrl(uri)), retry=True)
+        return "".join(getattr(item, "text", "") for item in result.contents)
+
+    async def list_tools(self) -> List[str]:
+        result = await self._request(lambda session: session.list_tools(), retry=True)
+        return [tool.name for tool in result.tools]
+
+
+class McpSyncClient:
+    """Blocking facade over McpClient for scripts.
+
+    Runs the client on an event loop in a background thread, so the session
+    stays open between calls, and several threads may call at once (their
+    calls are pipelined like concurrent tasks).
+    """
+
+    def __init__(self, url: str, **options):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="mcp-client", daemon=True)
+        self._thread.start()
+        self._client = self._run(self._create(url, options))
+
+    async def _create(self, url: str, options: Dict[str, Any]) -> McpClient:
+        # asyncio primitives bind to the loop they are first used on
+        return McpClient(url, **options)
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def __enter__(self) -> "McpSyncClient":
+        self.connect()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def reconnects(self) -> int:
+        return self._client.reconnects
+
+    def connect(self) -> None:
+        self._run(self._client.connect())
+
+    def call_tool(self, name: str, arguments: Optional[Dict[str, Any]] = None) -> Any:
+        return self._run(self._client.call_tool(name, arguments))
+
+    def call_many(self, calls: Sequence[Tuple[str, Optional[Dict[str, Any]]]],
+                  return_exceptions: bool = False) -> List[Any]:
+        return self._run(self._client.call_many(calls, return_exceptions))
+
+    def read_resource(self, uri: str) -> str:
+        return self._run(self._client.read_resource(uri))
+
+    def list_tools(self) -> List[str]:
+        return self._run(self._client.list_tools())
+
+    def close(self) -> None:
+        if self._loop.is_closed():
+            return
+        self._run(self._client.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
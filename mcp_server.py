@@ -1,95 +1,257 @@
 # MCP Todo Server
 from mcp.server.fastmcp import FastMCP
-from typing import List, Dict, Any
-import json
+from mcp.server.transport_security import TransportSecuritySettings
+from pydantic import BaseModel
+from typing import List, Dict, Any, Optional, Union
+import multiprocessing
+import os
+import warnings
 
 # In-memory storage (shared with FastAPI app)
-todos: List[Dict[str, Any]] = []
-next_id = 1
+from todo_store import store, store_is_shared, paginate, list_todos, search, batch_result, dumps_compact
+from mcp_subscriptions import ResourceSubscriptions
+from todo_metrics import metrics, instrument_mcp_server
 
 # ---- MCP Server Setup ----
+# Transport of `python mcp_server.py`: "sse" or "streamable-http"
+MCP_TRANSPORT = os.environ.get("TODO_MCP_TRANSPORT", "sse")
+# Stateless streamable HTTP: each JSON-RPC request is answered on its own
+# with a plain JSON body and no session is kept in the process, so any
+# worker can serve any request. Subscriptions need a session and are not
+# available in this mode.
+MCP_STATELESS = os.environ.get("TODO_MCP_STATELESS", "") == "1"
+# Address of `python mcp_server.py`; main.py moves it off the REST API's port
+MCP_HOST = os.environ.get("TODO_MCP_HOST", "127.0.0.1")
+MCP_PORT = int(os.environ.get("TODO_MCP_PORT", "8000"))
+# DNS-rebinding protection of the HTTP transports: comma-separated Host
+# header values to accept ("name:*" for any port), e.g.
+# "todos.example.com,todos.example.com:*". Origins default to those hosts
+# over http and https. Unset, the server run on localhost accepts only
+# localhost names, while the apps served by another server (mounted in
+# main.py, http_app()) accept any Host, as that server faces the clients
+MCP_ALLOWED_HOSTS = [host.strip() for host in os.environ.get("TODO_MCP_ALLOWED_HOSTS", "").split(",") if host.strip()]
+MCP_ALLOWED_ORIGINS = [origin.strip() for origin in os.environ.get("TODO_MCP_ALLOWED_ORIGINS", "").split(",")
+                       if origin.strip()]
+
+if MCP_TRANSPORT not in ("sse", "streamable-http"):
+    raise ValueError(f"Unknown TODO_MCP_TRANSPORT: {MCP_TRANSPORT}")
+
+def transport_security(hosted: bool = False) -> Optional[TransportSecuritySettings]:
+    """Host/Origin checks from TODO_MCP_ALLOWED_HOSTS/_ORIGINS; ``hosted`` for apps run by another server"""
+    if MCP_ALLOWED_HOSTS or MCP_ALLOWED_ORIGINS:
+        origins = MCP_ALLOWED_ORIGINS or [f"{scheme}://{host}" for host in MCP_ALLOWED_HOSTS
+                                          for scheme in ("http", "https")]
+        return TransportSecuritySettings(allowed_hosts=MCP_ALLOWED_HOSTS, allowed_origins=origins)
+    if hosted:
+        return TransportSecuritySettings(enable_dns_rebinding_protection=False)
+    # FastMCP's default: localhost names only when bound to localhost
+    return None
+
 mcp_server = FastMCP(
     name="todo-mcp-server",
-    instructions="A simple MCP server for managing todos with CRUD operations"
+    instructions="A simple MCP server for managing todos with CRUD operations",
+    host=MCP_HOST,
+    port=MCP_PORT,
+    stateless_http=MCP_STATELESS,
+    json_response=MCP_STATELESS,
+    transport_security=transport_security()
 )
 
 # ---- MCP Tools ----
 @mcp_server.tool()
-def get_todos() -> List[Dict[str, Any]]:
-    """Get all todos"""
-    return todos
+def get_todos(limit: Optional[int] = None, cursor: Optional[str] = None, completed: Optional[bool] = None,
+              id_gte: Optional[int] = None, id_lt: Optional[int] = None, title_prefix: Optional[str] = None,
+              order: str = "asc", fields: Optional[str] = None) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
+    """Get todos, optionally filtered, ordered by ID.
+
+    Filters: ``completed`` status, IDs in [``id_gte``, ``id_lt``), and
+    ``title_prefix`` (case-sensitive). ``order`` is "asc" (oldest first) or
+    "desc" (newest first). Without ``limit``/``cursor`` returns every
+    matching todo. With ``limit`` (1-1000) and/or a ``cursor`` returns one
+    page as {"todos": [...], "next_cursor": ...}; pass next_cursor back,
+    with the same filters, to get the following page (it is null on the
+    last page). ``fields`` (e.g. "id,title,completed") returns only those
+    fields of each todo; "id" is always included.
+    """
+    filters = dict(completed=completed, id_gte=id_gte, id_lt=id_lt, title_prefix=title_prefix, order=order)
+    if limit is None and cursor is None:
+        return list_todos(store, fields, **filters)
+    return paginate(store, limit, cursor, fields, **filters)
+
+@mcp_server.tool()
+def search_todos(query: str, limit: int = 10) -> List[Dict[str, Any]]:
+    """Search todo titles and descriptions.
+
+    Returns up to ``limit`` (1-100) todos containing any word of the query,
+    best match first.
+    """
+    return search(store, query, limit)
+
+@mcp_server.tool()
+def get_stats() -> Dict[str, Any]:
+    """Get todo counts: total, completed, pending, plus creates/deletes per recent interval"""
+    return store.stats()
 
 @mcp_server.tool()
 def create_todo(title: str, description: str = "") -> Dict[str, Any]:
     """Create a new todo"""
-    global next_id
-    todo = {
-        "id": next_id,
-        "title": title,
-        "description": description,
-        "completed": False
-    }
-    todos.append(todo)
-    next_id += 1
-    return todo
+    return store.create(title, description)
 
 @mcp_server.tool()
-def get_todo(todo_id: int) -> Dict[str, Any]:
-    """Get a specific todo by ID"""
-    for todo in todos:
-        if todo["id"] == todo_id:
-            return todo
-    raise ValueError(f"Todo with ID {todo_id} not found")
+def get_todo(todo_id: int, fields: Optional[str] = None) -> Dict[str, Any]:
+    """Get a specific todo by ID, optionally only some ``fields`` (e.g. "id,title")"""
+    return store.get(todo_id, fields)
 
 @mcp_server.tool()
 def update_todo(todo_id: int, title: str = None, description: str = None, completed: bool = None) -> Dict[str, Any]:
     """Update a todo by ID"""
-    for i, todo in enumerate(todos):
-        if todo["id"] == todo_id:
-            if title is not None:
-                todo["title"] = title
-            if description is not None:
-                todo["description"] = description
-            if completed is not None:
-                todo["completed"] = completed
-            return todo
-    raise ValueError(f"Todo with ID {todo_id} not found")
+    return store.update(todo_id, title=title, description=description, completed=completed)
 
 @mcp_server.tool()
 def delete_todo(todo_id: int) -> Dict[str, Any]:
     """Delete a todo by ID"""
-    for i, todo in enumerate(todos):
-        if todo["id"] == todo_id:
-            return todos.pop(i)
-    raise ValueError(f"Todo with ID {todo_id} not found")
+    return store.delete(todo_id)
 
 @mcp_server.tool()
 def complete_todo(todo_id: int) -> Dict[str, Any]:
     """Mark a todo as completed"""
-    for todo in todos:
-        if todo["id"] == todo_id:
-            todo["completed"] = True
-            return todo
-    raise ValueError(f"Todo with ID {todo_id} not found")
+    return store.update(todo_id, completed=True)
+
+# ---- Batch Tools ----
+# Each takes a whole list in one call, applies it under one store lock with
+# one version bump, and returns one {"id", "ok", "todo" | "error"} result per
+# item. With atomic=True any failing item leaves the store untouched.
+class TodoInput(BaseModel):
+    title: str
+    description: str = ""
+    completed: bool = False
+
+class TodoUpdate(BaseModel):
+    id: int
+    title: Optional[str] = None
+    description: Optional[str] = None
+    completed: Optional[bool] = None
+
+@mcp_server.tool()
+def create_todos(items: List[TodoInput]) -> List[Dict[str, Any]]:
+    """Create several todos in one call"""
+    return [batch_result(todo) for todo in store.create_many([item.model_dump() for item in items])]
+
+@mcp_server.tool()
+def update_todos(updates: List[TodoUpdate], atomic: bool = False) -> List[Dict[str, Any]]:
+    """Update several todos by ID in one call"""
+    return store.update_many([update.model_dump() for update in updates], atomic=atomic)
+
+@mcp_server.tool()
+def delete_todos(todo_ids: List[int], atomic: bool = False) -> List[Dict[str, Any]]:
+    """Delete several todos by ID in one call"""
+    return store.delete_many(todo_ids, atomic=atomic)
+
+@mcp_server.tool()
+def complete_todos(todo_ids: List[int], atomic: bool = False) -> List[Dict[str, Any]]:
+    """Mark several todos as completed in one call"""
+    return store.update_many([{"id": todo_id, "completed": True} for todo_id in todo_ids], atomic=atomic)
 
 # ---- MCP Resources ----
+# Text resources: the store caches the lists as the bytes REST sends, and
+# decoding those (ASCII or UTF-8) is a copy, far cheaper than encoding
 @mcp_server.resource("todos://all")
 def get_all_todos_resource() -> str:
     """Resource that returns all todos as JSON"""
-    return json.dumps(todos, indent=2)
+    return store.dumps().decode()
 
 @mcp_server.resource("todos://completed")
 def get_completed_todos_resource() -> str:
     """Resource that returns only completed todos as JSON"""
-    completed = [todo for todo in todos if todo["completed"]]
-    return json.dumps(completed, indent=2)
+    return store.dumps(completed=True).decode()
 
 @mcp_server.resource("todos://pending")
 def get_pending_todos_resource() -> str:
     """Resource that returns only pending todos as JSON"""
-    pending = [todo for todo in todos if not todo["completed"]]
-    return json.dumps(pending, indent=2)
+    return store.dumps(completed=False).decode()
+
+# Projections of the lists above, e.g. todos://pending/id,title; cached
+# per field set like the full views
+@mcp_server.resource("todos://all/{fields}")
+def get_all_todos_fields_resource(fields: str) -> str:
+    """Resource that returns all todos with only the given comma-separated fields"""
+    return store.dumps(fields=fields).decode()
+
+@mcp_server.resource("todos://completed/{fields}")
+def get_completed_todos_fields_resource(fields: str) -> str:
+    """Resource that returns completed todos with only the given comma-separated fields"""
+    return store.dumps(completed=True, fields=fields).decode()
+
+@mcp_server.resource("todos://pending/{fields}")
+def get_pending_todos_fields_resource(fields: str) -> str:
+    """Resource that returns pending todos with only the given comma-separated fields"""
+    return store.dumps(completed=False, fields=fields).decode()
+
+@mcp_server.resource("todos://stats")
+def get_stats_resource() -> str:
+    """Resource that returns todo counts as JSON"""
+    return dumps_compact(store.stats())
+
+@mcp_server.resource("todos://metrics")
+def get_metrics_resource() -> str:
+    """Resource that returns call counts, errors, payload sizes and latencies as JSON"""
+    return dumps_compact(metrics.snapshot())
+
+# ---- Resource Subscriptions ----
+# Clients subscribe to a todos:// URI and get notifications/resources/updated
+# when a tool or REST handler changes it, instead of re-reading it to poll
+subscriptions = ResourceSubscriptions(store)
+
+@mcp_server._mcp_server.subscribe_resource()
+async def subscribe_resource(uri) -> None:
+    subscriptions.subscribe(str(uri), mcp_server._mcp_server.request_context.session)
+
+@mcp_server._mcp_server.unsubscribe_resource()
+async def unsubscribe_resource(uri) -> None:
+    subscriptions.unsubscribe(str(uri), mcp_server._mcp_server.request_context.session)
+
+# The low-level server always advertises resources.subscribe=false; we
+# handle subscriptions, so say so during initialization. Stateless HTTP
+# keeps no session to notify, so there it stays false
+_get_capabilities = mcp_server._mcp_server.get_capabilities
+
+def _get_capabilities_with_subscribe(*args, **kwargs):
+    capabilities = _get_capabilities(*args, **kwargs)
+    if capabilities.resources is not None:
+        capabilities.resources.subscribe = True
+    return capabilities
+
+if not MCP_STATELESS:
+    mcp_server._mcp_server.get_capabilities = _get_capabilities_with_subscribe
+
+# ---- Metrics ----
+# Every tools/call and resources/read is counted and timed
+instrument_mcp_server(mcp_server._mcp_server)
+
+# ---- Transports ----
+def hosted_app(transport: str):
+    """ASGI app of ``transport`` for serving from another server (uvicorn, a FastAPI mount)"""
+    if multiprocessing.parent_process() is not None and not store_is_shared():
+        # uvicorn --workers N (or --reload) runs the app in spawned processes,
+        # each of which would open an empty store of its own
+        warnings.warn("MCP app running in a worker process with a process-private store; workers will not "
+                      "see each other's todos (use TODO_STORE_BACKEND=sqlite or serve_store)", RuntimeWarning)
+    mcp_server.settings.transport_security = transport_security(hosted=True)
+    if transport == "streamable-http":
+        return mcp_server.streamable_http_app()
+    return mcp_server.sse_app()
+
+def http_app():
+    """Streamable-HTTP ASGI app of the server, for running several workers:
+
+        TODO_MCP_STATELESS=1 TODO_STORE_BACKEND=sqlite \\
+            uvicorn --factory mcp_server:http_app --workers 4
+
+    Workers only share todos through a shared store (SQLite or serve_store);
+    with any other backend each worker warns at startup.
+    """
+    return hosted_app("streamable-http")
 
 if __name__ == "__main__":
     # Run the MCP server
-    mcp_server.run(transport="sse")
+    mcp_server.run(transport=MCP_TRANSPORT)
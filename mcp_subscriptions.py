@@ -0,0 +1,154 @@
+# Resource subscriptions and change notifications for the MCP server
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set
+import asyncio
+import logging
+import threading
+
+from mcp.server.session import ServerSession
+from pydantic import AnyUrl
+
+logger = logging.getLogger(__name__)
+
+ALL_URI = "todos://all"
+COMPLETED_URI = "todos://completed"
+PENDING_URI = "todos://pending"
+STATS_URI = "todos://stats"
+
+
+def view_of(uri: str) -> str:
+    """The view a resource URI shows: todos://all/id,title projects todos://all"""
+    scheme, separator, path = uri.partition("://")
+    return f"{scheme}://{path.split('/', 1)[0]}" if separator else uri
+
+
+def affected_uris(event: Dict[str, Any]) -> Set[str]:
+    """Resources whose content a store change event may have changed"""
+    if event["op"] == "clear":
+        return {ALL_URI, COMPLETED_URI, PENDING_URI, STATS_URI}
+    states = {event["todo"]["completed"]}
+    if event["op"] == "update":
+        # Without the previous record we can't tell whether it moved views
+        previous = event.get("previous")
+        states.add(previous["completed"] if previous else not event["todo"]["completed"])
+    uris = {ALL_URI}
+    if len(states) > 1 or event["op"] != "update":
+        # Counts only change when a todo comes, goes or changes status
+        uris.add(STATS_URI)
+    if True in states:
+        uris.add(COMPLETED_URI)
+    if False in states:
+        uris.add(PENDING_URI)
+    return uris
+
+
+class ResourceSubscriptions:
+    """Tracks which sessions subscribed to which todos:// resources and
+    pushes ``notifications/resources/updated`` to them when the store changes.
+
+    Changes are coalesced: the first change after a flush schedules one
+    notification per dirty URI ``delay`` seconds later, so a burst of
+    writes costs one notification per subscriber instead of one per write.
+
+    Stores that support change listeners report exactly which views
+    changed, from any thread; a changed view also notifies subscribers of
+    its field projections (todos://all/{fields} for todos://all). For stores in another process (the IPC proxy)
+    the version counter is polled every ``delay`` seconds while anyone is
+    subscribed, and a change marks every subscribed URI dirty.
+    """
+
+    def __init__(self, store, delay: float = 0.05):
+        self.store = store
+        self.delay = delay
+        self._subscribers: Dict[str, Set[ServerSession]] = {}
+        # View URI -> subscribed URIs showing it (itself and field
+        # projections); replaced, not mutated, as mutating threads read it
+        self._views: Dict[str, FrozenSet[str]] = {}
+        # Dirty URIs are collected from mutating threads; a flush is
+        # scheduled on the event loop only when the set goes from clean to dirty
+        self._dirty: Set[str] = set()
+        self._dirty_lock = threading.Lock()
+        self._flush_scheduled = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._poller: Optional[asyncio.Task] = None
+        self._listening = hasattr(store, "add_listener")
+        if self._listening:
+            store.add_listener(self._on_store_change)
+
+    def subscribe(self, uri: str, session: ServerSession) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._subscribers.setdefault(uri, set()).add(session)
+        self._index_views()
+        if not self._listening and self._poller is None:
+            self._poller = self._loop.create_task(self._poll_version())
+
+    def unsubscribe(self, uri: str, session: ServerSession) -> None:
+        sessions = self._subscribers.get(uri)
+        if sessions is not None:
+            sessions.discard(session)
+            if not sessions:
+                del self._subscribers[uri]
+                self._index_views()
+
+    def subscribers(self, uri: str) -> int:
+        return len(self._subscribers.get(uri, ()))
+
+    def _index_views(self) -> None:
+        views: Dict[str, Set[str]] = {}
+        for uri in list(self._subscribers):
+            views.setdefault(view_of(uri), set()).add(uri)
+        self._views = {view: frozenset(uris) for view, uris in views.items()}
+
+    # ---- Change detection ----
+    def _on_store_change(self, events: List[Dict[str, Any]]) -> None:
+        # Runs on whichever thread mutated the store
+        if not self._subscribers or self._loop is None:
+            return
+        uris = set()
+        for event in events:
+            uris |= affected_uris(event)
+        self._mark_dirty(uris)
+
+    async def _poll_version(self) -> None:
+        version = await asyncio.to_thread(self.store.version)
+        while self._subscribers:
+            await asyncio.sleep(self.delay)
+            current = await asyncio.to_thread(self.store.version)
+            if current != version:
+                version = current
+                self._mark_dirty(self._subscribers.keys())
+        self._poller = None
+
+    # ---- Notification ----
+    def _mark_dirty(self, uris: Iterable[str]) -> None:
+        views = self._views
+        with self._dirty_lock:
+            for uri in uris:
+                self._dirty.update(views.get(view_of(uri), ()))
+            if not self._dirty or self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+        try:
+            self._loop.call_soon_threadsafe(self._loop.call_later, self.delay, self._flush)
+        except RuntimeError:
+            # The loop that served these subscriptions has shut down
+            with self._dirty_lock:
+                self._subscribers.clear()
+                self._views = {}
+                self._dirty.clear()
+                self._flush_scheduled = False
+
+    def _flush(self) -> None:
+        with self._dirty_lock:
+            dirty, self._dirty = self._dirty, set()
+            self._flush_scheduled = False
+        for uri in dirty:
+            for session in list(self._subscribers.get(uri, ())):
+                self._loop.create_task(self._notify(uri, session))
+
+    async def _notify(self, uri: str, session: ServerSession) -> None:
+        try:
+            await session.send_resource_updated(AnyUrl(uri))
+        except Exception:
+            # The client went away; stop notifying it
+            logger.debug("Dropping subscription of closed session to %s", uri)
+            self.unsubscribe(uri, session)
@@ -0,0 +1,123 @@
+# Supervision of the MCP server subprocess started by main.py
+from typing import Dict, List, Optional
+import asyncio
+import subprocess
+import sys
+import threading
+import time
+
+# Restart delays after a crash: doubling from the first to the last
+RESTART_BACKOFF_INITIAL = 0.5
+RESTART_BACKOFF_MAX = 30.0
+# A child that stayed up this long resets the backoff
+RESTART_BACKOFF_RESET_AFTER = 60.0
+
+
+class McpSupervisor:
+    """Runs ``command`` as a child process and keeps it running.
+
+    ``start()`` launches the child and waits until it accepts TCP
+    connections on ``host:port`` (or ``timeout`` passes, or it exits).
+    Its stdout and stderr are merged and streamed line by line to our
+    stderr with a prefix, so a chatty child never blocks on a full pipe. If
+    it exits on its own it is restarted after a delay that doubles with
+    every crash in a row. ``status`` is one of "starting", "ready",
+    "restarting", "failed" (not ready within the timeout; still retried on
+    exit) and "stopped".
+    """
+
+    def __init__(self, command: List[str], env: Dict[str, str], host: str, port: int, timeout: float = 10.0,
+                 name: str = "mcp_server"):
+        self.command = command
+        self.env = env
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.name = name
+        self.status = "stopped"
+        self.restarts = 0
+        self.process: Optional[subprocess.Popen] = None
+        self._stopping = False
+        self._monitor: Optional[asyncio.Task] = None
+        self._output: Optional[threading.Thread] = None
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.process.pid if self.process is not None else None
+
+    async def start(self) -> bool:
+        """Launch the child and wait for readiness; True if it became ready"""
+        self._stopping = False
+        ready = await self._launch()
+        self._monitor = asyncio.get_running_loop().create_task(self._supervise())
+        return ready
+
+    async def stop(self, grace: float = 5.0) -> None:
+        """Terminate the child (kill it after ``grace`` seconds) and stop restarting it"""
+        self._stopping = True
+        if self._monitor is not None:
+            self._monitor.cancel()
+        process = self.process
+        if process is not None and process.poll() is None:
+            process.terminate()
+            try:
+                await asyncio.to_thread(process.wait, grace)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                await asyncio.to_thread(process.wait)
+        if self._output is not None:
+            # Let the last lines of output through
+            await asyncio.to_thread(self._output.join, grace)
+        self.status = "stopped"
+
+    async def _launch(self) -> bool:
+        self.status = "starting"
+        self.process = subprocess.Popen(self.command, env=self.env, stdout=subprocess.PIPE,
+                                        stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL)
+        self._output = threading.Thread(target=self._stream_output, args=(self.process,),
+                                        name=f"{self.name}-output", daemon=True)
+        self._output.start()
+        ready = await self._wait_ready(self.process)
+        if self.status == "starting":
+            self.status = "ready" if ready else "failed"
+        return ready
+
+    async def _wait_ready(self, process: subprocess.Popen) -> bool:
+        deadline = time.monotonic() + self.timeout
+        delay = 0.01
+        while time.monotonic() < deadline and process.poll() is None:
+            try:
+                _, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), 1.0)
+                writer.close()
+                return True
+            except (OSError, asyncio.TimeoutError):
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.2)
+        return False
+
+    async def _supervise(self) -> None:
+        backoff = RESTART_BACKOFF_INITIAL
+        while not self._stopping:
+            started = time.monotonic()
+            code = await asyncio.to_thread(self.process.wait)
+            if self._stopping:
+                return
+            if time.monotonic() - started >= RESTART_BACKOFF_RESET_AFTER:
+                backoff = RESTART_BACKOFF_INITIAL
+            self.status = "restarting"
+            self._log(f"exited with code {code}; restarting in {backoff:g}s")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, RESTART_BACKOFF_MAX)
+            if self._stopping:
+                return
+            self.restarts += 1
+            await self._launch()
+
+    def _stream_output(self, process: subprocess.Popen) -> None:
+        # Runs until the child closes its end of the pipe, i.e. exits
+        for line in iter(process.stdout.readline, b""):
+            self._log(line.decode(errors="replace").rstrip())
+        process.stdout.close()
+
+    def _log(self, message: str) -> None:
+        sys.stderr.write(f"[{self.name}] {message}\n")
@@ -5,7 +5,7 @@ Comprehensive test script to verify MCP server can access all tasks
 import json
 import requests
 import time
-from mcp_server import todos, next_id
+from mcp_server import get_todos
 
 def test_rest_api_access():
     """Test accessing all tasks via REST API"""
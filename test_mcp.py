@@ -3,7 +3,7 @@
 Test script to demonstrate MCP server functionality
 """
 import json
-from mcp_server import todos
+from mcp_server import store
 
 def test_todo_operations():
     """Test the todo operations directly"""
@@ -11,39 +11,26 @@ def test_todo_operations():
     
     # Test creating todos
     print("\n1. Creating todos...")
-    todo1 = {
-        "id": 1,
-        "title": "Learn MCP",
-        "description": "Study Model Context Protocol",
-        "completed": False
-    }
-    todos.append(todo1)
+    todo1 = store.create("Learn MCP", "Study Model Context Protocol")
     
-    todo2 = {
-        "id": 2,
-        "title": "Build API",
-        "description": "Create FastAPI integration",
-        "completed": False
-    }
-    todos.append(todo2)
+    todo2 = store.create("Build API", "Create FastAPI integration")
     
     print(f"Created todo 1: {json.dumps(todo1, indent=2)}")
     print(f"Created todo 2: {json.dumps(todo2, indent=2)}")
     
     # Test getting all todos
     print("\n2. Getting all todos...")
+    todos = store.list()
     print(f"All todos: {json.dumps(todos, indent=2)}")
     
     # Test updating todo
     print("\n3. Updating todo 1...")
-    for todo in todos:
-        if todo["id"] == 1:
-            todo["completed"] = True
-            break
+    todo = store.update(todo1["id"], completed=True)
     print(f"Updated todo 1: {json.dumps(todo, indent=2)}")
     
     # Test filtering completed todos
     print("\n4. Completed todos:")
+    todos = store.list()
     completed = [todo for todo in todos if todo["completed"]]
     print(f"Completed: {json.dumps(completed, indent=2)}")
     
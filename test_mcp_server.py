@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Tests for the MCP server through a real client session (in-memory transport)
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import time
+import warnings
+import httpx
+import pytest
+from mcp.shared.memory import create_connected_server_and_client_session
+from pydantic import AnyUrl
+from mcp_server import mcp_server, store
+
+logging.getLogger("mcp").setLevel(logging.WARNING)
+
+def run_session(scenario, **session_options):
+    """Run ``scenario(session)`` against a fresh, empty store"""
+    async def main():
+        async with create_connected_server_and_client_session(mcp_server, **session_options) as session:
+            return await scenario(session)
+    store.clear()
+    try:
+        return asyncio.run(main())
+    finally:
+        store.clear()
+
+def test_batch_tools():
+    """Test batch tools and their per-item results"""
+    async def scenario(session):
+        created = await session.call_tool("create_todos", {"items": [{"title": "One"}, {"title": "Two"}]})
+        assert [item["id"] for item in created.structuredContent["result"]] == [1, 2]
+        completed = await session.call_tool("complete_todos", {"todo_ids": [1, 3], "atomic": True})
+        assert [item["ok"] for item in completed.structuredContent["result"]] == [False, False]
+        deleted = await session.call_tool("delete_todos", {"todo_ids": [1, 3]})
+        assert [item["ok"] for item in deleted.structuredContent["result"]] == [True, False]
+        return (await session.call_tool("get_todos", {})).structuredContent["result"]
+    assert [todo["title"] for todo in run_session(scenario)] == ["Two"]
+
+def test_get_todos_filters():
+    """Test get_todos filter, order and paging arguments"""
+    async def scenario(session):
+        await session.call_tool("create_todos", {"items": [{"title": "Buy milk"}, {"title": "Call mom"},
+                                                          {"title": "Buy eggs", "completed": True}]})
+        filtered = await session.call_tool("get_todos", {"title_prefix": "Buy", "order": "desc"})
+        page = await session.call_tool("get_todos", {"completed": False, "limit": 1})
+        return filtered.structuredContent["result"], page.structuredContent["result"]
+    filtered, page = run_session(scenario)
+    assert [todo["id"] for todo in filtered] == [3, 1]
+    assert [todo["id"] for todo in page["todos"]] == [1] and page["next_cursor"]
+
+def test_field_projection():
+    """Test the fields argument of get_todos/get_todo and the todos://<view>/<fields> resources"""
+    async def scenario(session):
+        await session.call_tool("create_todos", {"items": [{"title": "One", "description": "x" * 100},
+                                                          {"title": "Two", "completed": True}]})
+        listed = await session.call_tool("get_todos", {"fields": "title"})
+        paged = await session.call_tool("get_todos", {"fields": "completed", "limit": 1})
+        single = await session.call_tool("get_todo", {"todo_id": 1, "fields": "id,title"})
+        resource = await session.read_resource(AnyUrl("todos://completed/title,completed"))
+        invalid = await session.call_tool("get_todos", {"fields": "secret"})
+        return (listed.structuredContent["result"], paged.structuredContent["result"]["todos"],
+                single.structuredContent["result"], json.loads(resource.contents[0].text), invalid.isError)
+    listed, paged, single, resource, invalid = run_session(scenario)
+    assert listed == [{"id": 1, "title": "One"}, {"id": 2, "title": "Two"}]
+    assert paged == [{"id": 1, "completed": False}]
+    assert single == {"id": 1, "title": "One"}
+    assert resource == [{"id": 2, "title": "Two", "completed": True}]
+    assert invalid
+
+def test_stats_tool_and_resource():
+    """Test get_stats and todos://stats against the store's counters"""
+    async def scenario(session):
+        await session.call_tool("create_todos", {"items": [{"title": "One"}, {"title": "Two", "completed": True}]})
+        stats = (await session.call_tool("get_stats", {})).structuredContent["result"]
+        resource = await session.read_resource(AnyUrl("todos://stats"))
+        return stats, json.loads(resource.contents[0].text)
+    stats, resource = run_session(scenario)
+    assert (stats["total"], stats["completed"], stats["pending"]) == (2, 1, 1)
+    assert resource == stats
+
+def test_tool_and_resource_metrics():
+    """Test that tool calls and resource reads show up in todos://metrics"""
+    async def scenario(session):
+        await session.call_tool("create_todo", {"title": "Measured"})
+        await session.call_tool("get_todo", {"todo_id": 42})
+        resource = await session.read_resource(AnyUrl("todos://metrics"))
+        return {(series["interface"], series["name"]): series for series in json.loads(resource.contents[0].text)}
+    series = run_session(scenario)
+    assert series[("tool", "create_todo")]["calls"] >= 1
+    assert series[("tool", "create_todo")]["payload_bytes"] > 0
+    assert series[("tool", "get_todo")]["errors"] >= 1
+
+def test_resource_subscriptions():
+    """Test coalesced resources/updated notifications for subscribed URIs"""
+    notifications = []
+
+    async def record(message):
+        params = getattr(getattr(message, "root", None), "params", None)
+        if params is not None and hasattr(params, "uri"):
+            notifications.append(str(params.uri))
+
+    async def scenario(session):
+        assert session.get_server_capabilities().resources.subscribe is True
+        await session.subscribe_resource(AnyUrl("todos://all"))
+        await session.subscribe_resource(AnyUrl("todos://completed"))
+        # Field projections are notified along with their view
+        await session.subscribe_resource(AnyUrl("todos://completed/id,title"))
+
+        # A burst of writes is coalesced into one notification per URI;
+        # pending todos don't touch todos://completed
+        for i in range(50):
+            store.create(f"Task {i}")
+        await asyncio.sleep(0.3)
+        assert notifications == ["todos://all"]
+
+        await session.call_tool("complete_todo", {"todo_id": 1})
+        await asyncio.sleep(0.3)
+        assert sorted(notifications[1:]) == ["todos://all", "todos://completed", "todos://completed/id,title"]
+
+        await session.unsubscribe_resource(AnyUrl("todos://all"))
+        await session.unsubscribe_resource(AnyUrl("todos://completed"))
+        await session.unsubscribe_resource(AnyUrl("todos://completed/id,title"))
+        store.create("After unsubscribe")
+        await asyncio.sleep(0.3)
+        assert len(notifications) == 4
+
+    run_session(scenario, message_handler=record)
+
+def test_stateless_http_workers(tmp_path):
+    """Test that stateless streamable-HTTP workers answer session-less requests from a shared store"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    env = {**os.environ, "TODO_MCP_STATELESS": "1", "TODO_STORE_BACKEND": "sqlite",
+           "TODO_SQLITE_PATH": str(tmp_path / "todos.db")}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "--factory", "mcp_server:http_app", "--port", str(port), "--workers", "2",
+         "--log-level", "warning"],
+        env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    def request(method, params):
+        # A new connection per request, so either worker may answer; the
+        # Host is the name a load balancer would forward, not localhost
+        response = httpx.post(f"http://127.0.0.1:{port}/mcp",
+                              headers={"Accept": "application/json, text/event-stream", "Host": "todos.example.com"},
+                              json={"jsonrpc": "2.0", "id": 1, "method": method, "params": params})
+        assert response.headers["content-type"] == "application/json"
+        return response.json()["result"]
+
+    def call(name, arguments):
+        return request("tools/call", {"name": name, "arguments": arguments})["structuredContent"]["result"]
+
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                created = [call("create_todo", {"title": f"Task {i}"})["id"] for i in range(5)]
+                break
+            except httpx.TransportError:
+                assert time.monotonic() < deadline and server.poll() is None
+                time.sleep(0.1)
+        assert created == [1, 2, 3, 4, 5]
+        # No session to send notifications/resources/updated on
+        initialized = request("initialize", {"protocolVersion": "2025-03-26", "capabilities": {},
+                                             "clientInfo": {"name": "test", "version": "1"}})
+        assert initialized["capabilities"]["resources"]["subscribe"] is False
+        for todo_id in created:
+            assert call("get_todo", {"todo_id": todo_id})["title"] == f"Task {todo_id - 1}"
+    finally:
+        server.terminate()
+        server.wait()
+
+def test_worker_with_private_store_warns(monkeypatch):
+    """Test that an MCP app built in a worker process warns unless the store is shared"""
+    import multiprocessing
+    from mcp_server import hosted_app
+    monkeypatch.setattr(multiprocessing, "parent_process", lambda: object())
+    monkeypatch.delenv("TODO_STORE_ADDRESS", raising=False)
+    monkeypatch.setenv("TODO_STORE_BACKEND", "memory")
+    with pytest.warns(RuntimeWarning, match="process-private store"):
+        hosted_app("sse")
+    monkeypatch.setenv("TODO_STORE_BACKEND", "sqlite")
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        hosted_app("sse")
+
+@pytest.mark.parametrize("transport,allowed_hosts", [("sse", ""), ("streamable-http", ""),
+                                                   ("streamable-http", "todos.example.com")])
+def test_mounted_mcp_host_header(transport, allowed_hosts):
+    """Test that mounted MCP answers requests for a non-localhost Host, unless TODO_MCP_ALLOWED_HOSTS excludes it"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    env = {**os.environ, "TODO_MCP_MODE": "mounted", "TODO_MCP_TRANSPORT": transport,
+           "TODO_MCP_ALLOWED_HOSTS": allowed_hosts}
+    env.pop("TODO_STORE_ADDRESS", None)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    def status(host):
+        # What a reverse proxy or a LAN client sends, rather than 127.0.0.1:port
+        headers = {"Host": host, "Accept": "application/json, text/event-stream"}
+        if transport == "sse":
+            with httpx.stream("GET", f"http://127.0.0.1:{port}/mcp/sse", headers=headers) as response:
+                return response.status_code
+        return httpx.post(f"http://127.0.0.1:{port}/mcp/", headers=headers,
+                          json={"jsonrpc": "2.0", "id": 1, "method": "initialize",
+                                "params": {"protocolVersion": "2025-03-26", "capabilities": {},
+                                           "clientInfo": {"name": "test", "version": "1"}}}).status_code
+
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                httpx.get(f"http://127.0.0.1:{port}/")
+                break
+            except httpx.TransportError:
+                assert time.monotonic() < deadline and server.poll() is None
+                time.sleep(0.1)
+        assert status("todos.example.com") == 200
+        assert status("other.example.com") == (421 if allowed_hosts else 200)
+    finally:
+        server.terminate()
+        server.wait()
+
+@pytest.mark.parametrize("transport,path", [("sse", "/sse"), ("streamable-http", "/mcp")])
+def test_mcp_client_pipelines_and_reconnects(transport, path):
+    """Test the persistent client over the wire: pipelined calls, tool errors, reconnecting after a restart"""
+    from mcp_client import McpSyncClient, McpToolError
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    env = {**os.environ, "TODO_MCP_PORT": str(port), "TODO_MCP_TRANSPORT": transport}
+    env.pop("TODO_STORE_ADDRESS", None)
+
+    def start():
+        server = subprocess.Popen([sys.executable, "mcp_server.py"], env=env,
+                                  cwd=os.path.dirname(os.path.abspath(__file__)),
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                return server
+            except OSError:
+                assert time.monotonic() < deadline and server.poll() is None
+                time.sleep(0.05)
+
+    server = start()
+    try:
+        with McpSyncClient(f"http://127.0.0.1:{port}{path}", timeout=10, retries=5) as client:
+            created = client.call_many([("create_todo", {"title": f"Task {i}"}) for i in range(20)])
+            assert sorted(todo["id"] for todo in created) == list(range(1, 21))
+            assert len(client.call_tool("get_todos")) == 20
+            assert json.loads(client.read_resource("todos://stats"))["total"] == 20
+            with pytest.raises(McpToolError):
+                client.call_tool("get_todo", {"todo_id": 999})
+
+            server.terminate()
+            server.wait()
+            server = start()
+            # A fresh server process with an empty store, on a new session
+            assert client.call_tool("get_stats")["total"] == 0
+            assert client.reconnects == 1
+            assert client.call_tool("create_todo", {"title": "After restart"})["id"] == 1
+    finally:
+        server.terminate()
+        server.wait()
+
+# Listens on argv[1]; the first run exits after 0.2s, later runs stay up
+FLAKY_SERVER = """
+import os, socket, sys, time
+sock = socket.create_server(("127.0.0.1", int(sys.argv[1])))
+print("listening", flush=True)
+if not os.path.exists(sys.argv[2]):
+    open(sys.argv[2], "w").close()
+    time.sleep(0.2)
+    sys.exit(1)
+time.sleep(60)
+"""
+
+def test_supervisor_restarts_crashed_server(tmp_path, monkeypatch, capsys):
+    """Test that the supervisor waits for readiness, restarts a crashed child and stops it"""
+    import mcp_supervisor
+    monkeypatch.setattr(mcp_supervisor, "RESTART_BACKOFF_INITIAL", 0.05)
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    async def scenario():
+        supervisor = mcp_supervisor.McpSupervisor(
+            [sys.executable, "-c", FLAKY_SERVER, str(port), str(tmp_path / "crashed")], env=dict(os.environ),
+            host="127.0.0.1", port=port, timeout=10
+        )
+        assert await supervisor.start()
+        first = supervisor.process
+        deadline = time.monotonic() + 10
+        while supervisor.restarts == 0 or supervisor.status != "ready":
+            assert time.monotonic() < deadline
+            await asyncio.sleep(0.05)
+        assert first.returncode == 1 and supervisor.process is not first
+        await supervisor.stop()
+        assert supervisor.status == "stopped" and supervisor.process.poll() is not None
+
+    asyncio.run(scenario())
+    # The child's output is streamed, not left in a pipe
+    assert capsys.readouterr().err.count("[mcp_server] listening") == 2
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Tests for the FastAPI REST endpoints (in-process, no server needed)
+"""
+import json
+import os
+import sys
+import pytest
+from fastapi.testclient import TestClient
+from main import app, store
+from todo_metrics import metrics
+
+@pytest.fixture
+def client():
+    """A client against an empty store; the MCP subprocess is not started"""
+    store.clear()
+    yield TestClient(app)
+    store.clear()
+
+def test_crud_endpoints(client):
+    """Test create, get, update and delete over HTTP"""
+    created = client.post("/todos/", json={"title": "Learn MCP", "description": "Study"}).json()
+    assert created == {"id": 1, "title": "Learn MCP", "description": "Study", "completed": False}
+    assert client.get("/todos/1").json() == created
+
+    updated = client.put("/todos/1", json={"id": 1, "title": "Learn MCP", "description": "Study", "completed": True})
+    assert updated.json()["completed"] is True
+    assert client.delete("/todos/1").json()["id"] == 1
+    assert client.get("/todos/1").status_code == 404
+    assert client.delete("/todos/1").status_code == 404
+
+def test_list_pagination(client):
+    """Test limit/cursor paging on GET /todos/"""
+    for i in range(5):
+        client.post("/todos/", json={"title": f"Task {i}"})
+    assert len(client.get("/todos/").json()) == 5
+
+    first = client.get("/todos/", params={"limit": 2}).json()
+    assert [todo["id"] for todo in first["todos"]] == [1, 2]
+    second = client.get("/todos/", params={"limit": 2, "cursor": first["next_cursor"]}).json()
+    assert [todo["id"] for todo in second["todos"]] == [3, 4]
+    last = client.get("/todos/", params={"limit": 2, "cursor": second["next_cursor"]}).json()
+    assert [todo["id"] for todo in last["todos"]] == [5]
+    assert last["next_cursor"] is None
+
+    assert client.get("/todos/", params={"cursor": "garbage"}).status_code == 400
+    assert client.get("/todos/", params={"limit": 0}).status_code == 422
+
+def test_list_filters(client):
+    """Test filter and order parameters on GET /todos/"""
+    client.post("/todos/bulk", json=[{"title": "Buy milk"}, {"title": "Call mom", "completed": True},
+                                     {"title": "Buy eggs", "completed": True}])
+    def ids(**params):
+        body = client.get("/todos/", params=params).json()
+        return [todo["id"] for todo in (body["todos"] if "todos" in body else body)]
+
+    assert ids(completed="true") == [2, 3]
+    assert ids(title_prefix="Buy", order="desc") == [3, 1]
+    assert ids(id_gte=2, id_lt=3) == [2]
+    assert ids(completed="false", limit=10) == [1]
+    assert client.get("/todos/", params={"order": "random"}).status_code == 422
+
+def test_field_projection(client):
+    """Test fields= on GET /todos/ (cached, filtered and paged) and GET /todos/{id}"""
+    client.post("/todos/bulk", json=[{"title": "Buy milk", "description": "long " * 50}, {"title": "Call mom"}])
+    assert client.get("/todos/", params={"fields": "title"}).json() == [{"id": 1, "title": "Buy milk"},
+                                                                       {"id": 2, "title": "Call mom"}]
+    assert client.get("/todos/", params={"fields": "completed", "order": "desc"}).json() == [
+        {"id": 2, "completed": False}, {"id": 1, "completed": False}]
+    assert client.get("/todos/", params={"fields": "id", "limit": 1}).json()["todos"] == [{"id": 1}]
+    full = client.get("/todos/1")
+    projected = client.get("/todos/1", params={"fields": "title,completed"})
+    assert projected.json() == {"id": 1, "title": "Buy milk", "completed": False}
+    assert projected.headers["ETag"] == full.headers["ETag"]
+    assert client.get("/todos/", params={"fields": "title,owner"}).status_code == 400
+    assert client.get("/todos/1", params={"fields": "owner"}).status_code == 400
+
+def test_bulk_create_from_array(client):
+    """Test POST /todos/bulk with a JSON array, including validation"""
+    response = client.post("/todos/bulk", json=[{"title": "One"}, {"title": "Two", "completed": True}])
+    assert response.json() == {"created": 2}
+    assert [todo["title"] for todo in client.get("/todos/").json()] == ["One", "Two"]
+
+    # One bad row rejects the whole request
+    response = client.post("/todos/bulk", json=[{"title": "Three"}, {"description": "no title"}])
+    assert response.status_code == 422
+    assert client.post("/todos/bulk", content=b"[not json").status_code == 422
+    assert len(client.get("/todos/").json()) == 2
+
+def test_bulk_ndjson_error_names_the_line(client):
+    """Test that a bad NDJSON row is reported with its line number and rejects the import"""
+    body = '{"title": "One"}\n\n{"title": "Two"}\n{"description": "no title"}\n{"title": "Four"}\n'
+    response = client.post("/todos/bulk", content=body, headers={"content-type": "application/x-ndjson"})
+    assert response.status_code == 422
+    assert [(error["line"], error["loc"]) for error in response.json()["detail"]] == [(4, ["title"])]
+    response = client.post("/todos/bulk", content='{"title": "One"}\nnot json\n',
+                           headers={"content-type": "application/x-ndjson"})
+    assert response.status_code == 422 and response.json()["detail"][0]["line"] == 2
+    assert client.get("/todos/").json() == []
+
+def test_search_endpoint(client):
+    """Test GET /todos/search ranking and limit validation"""
+    client.post("/todos/bulk", json=[{"title": "Fix login bug"}, {"title": "Write docs", "description": "Login page"},
+                                     {"title": "Plan sprint"}])
+    assert [todo["id"] for todo in client.get("/todos/search", params={"q": "login bug"}).json()] == [1, 2]
+    assert client.get("/todos/search", params={"q": "login", "limit": 1}).json()[0]["id"] in (1, 2)
+    assert client.get("/todos/search", params={"q": "login", "limit": 0}).status_code == 422
+
+def test_metrics_endpoint(client):
+    """Test that routes are counted per path template in /metrics"""
+    def calls(name):
+        return next(((series["calls"], series["errors"]) for series in metrics.snapshot()
+                     if series["interface"] == "rest" and series["name"] == name), (0, 0))
+
+    client.post("/todos/", json={"title": "Counted"})
+    before = calls("GET /todos/{todo_id}")
+    client.get("/todos/1")
+    client.get("/todos/999")
+    assert calls("GET /todos/{todo_id}") == (before[0] + 2, before[1] + 1)
+
+    response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'todo_requests_total{interface="rest",name="POST /todos/"}' in response.text
+    assert 'todo_request_duration_seconds_bucket{interface="rest",name="GET /todos/{todo_id}",le="+Inf"}' in response.text
+
+def test_metrics_skip_mounted_apps():
+    """Test that requests for a mounted app aren't recorded under the mounted app's route"""
+    from fastapi import FastAPI
+    from starlette.applications import Starlette
+    from starlette.responses import PlainTextResponse
+    from starlette.routing import Route
+    from todo_metrics import Metrics, MetricsMiddleware
+    registry = Metrics()
+    inner = Starlette(routes=[Route("/", lambda request: PlainTextResponse("mounted"), methods=["POST"])])
+    outer = FastAPI()
+    outer.get("/own")(lambda: "own")
+    outer.mount("/mcp", inner)
+    outer.add_middleware(MetricsMiddleware, registry=registry)
+    with TestClient(outer) as client:
+        assert client.post("/mcp/").text == "mounted"
+        client.get("/own")
+    assert [series["name"] for series in registry.snapshot() if series["interface"] == "rest"] == ["GET /own"]
+
+def test_conditional_requests(client):
+    """Test ETag revalidation (304) and If-Match lost-update protection (412)"""
+    client.post("/todos/", json={"title": "Cached"})
+    listing = client.get("/todos/")
+    assert client.get("/todos/", headers={"If-None-Match": listing.headers["etag"]}).status_code == 304
+    item = client.get("/todos/1")
+    etag = item.headers["etag"]
+    response = client.get("/todos/1", headers={"If-None-Match": f'"stale", W/{etag}'})
+    assert response.status_code == 304 and response.headers["etag"] == etag
+
+    body = {"id": 1, "title": "Cached", "description": "", "completed": True}
+    updated = client.put("/todos/1", json=body, headers={"If-Match": etag})
+    assert updated.status_code == 200 and updated.headers["etag"] != etag
+    # Any write changes the list ETag too
+    assert client.get("/todos/", headers={"If-None-Match": listing.headers["etag"]}).status_code == 200
+
+    assert client.put("/todos/1", json=dict(body, title="Lost"), headers={"If-Match": etag}).status_code == 412
+    assert client.delete("/todos/1", headers={"If-Match": etag}).status_code == 412
+    assert client.get("/todos/1").json()["title"] == "Cached"
+    assert client.delete("/todos/1", headers={"If-Match": updated.headers["etag"]}).status_code == 200
+
+def test_change_feed_resync(client):
+    """Test that GET /todos/changes tells a client with unknown history to resync"""
+    # TestClient buffers whole responses, so only a stream that ends can be read here
+    response = client.get("/todos/changes", params={"since": 10**9})
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert "event: resync" in response.text
+    # Versions are resumable only within the epoch of the list ETag
+    client.post("/todos/", json={"title": "Task"})
+    etag = client.get("/todos/").headers["etag"]
+    epoch, version = etag.strip('"').split(".")
+    response = client.get("/todos/changes", headers={"Last-Event-ID": f"{'0' * 8}.{version}"})
+    assert "event: resync" in response.text and f"id: {epoch}.{version}" in response.text
+    assert client.get("/todos/changes", params={"since": "v1"}).status_code == 400
+
+# Size of the NDJSON round trip; override with TODO_ROUNDTRIP_ROWS for a quicker run
+ROUNDTRIP_ROWS = int(os.environ.get("TODO_ROUNDTRIP_ROWS", 1_000_000))
+
+def test_ndjson_round_trip(client):
+    """Test importing and re-exporting ROUNDTRIP_ROWS todos as NDJSON"""
+    body = "".join(
+        json.dumps({"title": f"Task {i}", "description": f"Row {i}", "completed": i % 3 == 0}) + "\n"
+        for i in range(ROUNDTRIP_ROWS)
+    )
+    response = client.post("/todos/bulk", content=body, headers={"content-type": "application/x-ndjson"})
+    assert response.json() == {"created": ROUNDTRIP_ROWS}
+
+    count = 0
+    with client.stream("GET", "/todos/export") as response:
+        assert response.headers["content-type"] == "application/x-ndjson"
+        for line in response.iter_lines():
+            todo = json.loads(line)
+            assert todo == {"id": count + 1, "title": f"Task {count}", "description": f"Row {count}",
+                            "completed": count % 3 == 0}
+            count += 1
+    assert count == ROUNDTRIP_ROWS
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
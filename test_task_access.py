@@ -93,16 +93,15 @@ def create_test_tasks():
         {"title": "Test Integration", "description": "Verify MCP + FastAPI works", "completed": False},
     ]
     
-    for i, task in enumerate(test_tasks):
-        try:
-            response = requests.post(f"{base_url}/todos/", json=task)
-            if response.status_code == 200:
-                created = response.json()
-                print(f"✅ Created task {i+1}: {created['title']} (ID: {created['id']})")
-            else:
-                print(f"❌ Failed to create task {i+1}: {response.status_code}")
-        except Exception as e:
-            print(f"❌ Error creating task {i+1}: {e}")
+    # One request for all tasks instead of one POST per task
+    try:
+        response = requests.post(f"{base_url}/todos/bulk", json=test_tasks)
+        if response.status_code == 200:
+            print(f"✅ Created {response.json()['created']} tasks")
+        else:
+            print(f"❌ Failed to create tasks: {response.status_code}")
+    except Exception as e:
+        print(f"❌ Error creating tasks: {e}")
 
 if __name__ == "__main__":
     print("🚀 MCP Task Access Test")
@@ -0,0 +1,581 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared TodoStore
+"""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from todo_store import (
+    TodoStore, TodoNotFoundError, PreconditionFailedError, serve_store, store_env, paginate, list_todos,
+    todo_etag, list_etag
+)
+from todo_sqlite import SQLiteTodoStore
+from todo_changes import ChangeFeed
+from todo_shards import ShardedTodoStore, start_shards
+from todo_wal import WriteAheadLog
+
+@pytest.fixture(params=["memory", "sqlite", "sharded"])
+def store(request, tmp_path):
+    """Each store test runs against every backend"""
+    if request.param == "sqlite":
+        return SQLiteTodoStore(str(tmp_path / "todos.db"))
+    if request.param == "sharded":
+        # In-process shards; test_sharded_store_processes covers real ones
+        return ShardedTodoStore([TodoStore(first_id=index + 1, id_step=3) for index in range(3)])
+    return TodoStore()
+
+def test_crud_operations(store):
+    """Test create, get, update and delete by ID"""
+    todo = store.create("Learn MCP", "Study Model Context Protocol")
+    assert todo == {"id": 1, "title": "Learn MCP", "description": "Study Model Context Protocol", "completed": False}
+    assert store.get(1) == todo
+
+    updated = store.update(1, completed=True)
+    assert updated["completed"] is True
+    assert updated["title"] == "Learn MCP"
+
+    deleted = store.delete(1)
+    assert deleted["id"] == 1
+    assert len(store) == 0
+
+def test_missing_ids_raise(store):
+    """Test that unknown IDs raise TodoNotFoundError (a ValueError)"""
+    for operation in (store.get, store.delete, lambda todo_id: store.update(todo_id, title="x")):
+        with pytest.raises(ValueError, match="Todo with ID 42 not found"):
+            operation(42)
+    with pytest.raises(TodoNotFoundError):
+        store.get(42)
+
+def test_listing_keeps_insertion_order(store):
+    """Test that listing order survives deletes and updates"""
+    for i in range(5):
+        store.create(f"Task {i}")
+    store.delete(2)
+    store.update(4, title="Task three, renamed")
+    assert [todo["id"] for todo in store.list()] == [1, 3, 4, 5]
+    # IDs are never reused after a delete
+    assert store.create("Task 5")["id"] == 6
+
+def test_returned_records_are_copies(store):
+    """Test that callers cannot mutate the store through returned dicts"""
+    store.create("Immutable")
+    store.get(1)["title"] = "Changed"
+    store.list()[0]["completed"] = True
+    assert store.get(1) == {"id": 1, "title": "Immutable", "description": "", "completed": False}
+
+def test_titles_shared_until_unused():
+    """Test that equal titles share one string, dropped from the pool with the last todo using it"""
+    store = TodoStore()
+    # Decoded separately, like request bodies: equal but distinct strings
+    store.create_many([json.loads('{"title": "Buy milk", "description": "Two litres"}') for _ in range(3)])
+    records = list(store._todos.values())
+    assert records[0].title is records[1].title is records[2].title
+    assert records[0].description is not records[1].description
+    store.update(1, title="Buy bread")
+    store.delete(2)
+    assert len(store._title_pool) == 2
+    store.delete(3)
+    assert len(store._title_pool) == 1
+    store.clear()
+    assert len(store._title_pool) == 0
+
+def test_status_filter_and_batch_create(store):
+    """Test list(completed=...) and create_many"""
+    created = store.create_many([
+        {"title": "Done", "completed": True},
+        {"title": "Open", "description": "Still to do"},
+        {"title": "Also done", "completed": True},
+    ])
+    assert [todo["id"] for todo in created] == [1, 2, 3]
+    assert [todo["title"] for todo in store.list(completed=True)] == ["Done", "Also done"]
+    assert [todo["title"] for todo in store.list(completed=False)] == ["Open"]
+    assert len(store) == 3 and 2 in store and 4 not in store
+
+def test_serialized_views_track_version(store):
+    """Test that dumps() is cached per version and invalidated by mutations"""
+    store.create("First")
+    version = store.version()
+    payload = store.dumps()
+    assert payload == b'[{"id":1,"title":"First","description":"","completed":false}]'
+    assert store.dumps() is payload
+    assert store.dumps(completed=True) == b"[]"
+
+    store.update(1, completed=True)
+    assert store.version() > version
+    assert store.dumps(completed=True) == b'[{"id":1,"title":"First","description":"","completed":true}]'
+    assert store.dumps(completed=False) == b"[]"
+    store.delete(1)
+    assert store.dumps() == b"[]"
+
+def test_batches_bump_version_once(store):
+    """Test that a batch write, however many rows it touches, is one version step"""
+    version = store.version()
+    store.create_many([{"title": f"Task {i}"} for i in range(20)])
+    store.update_many([{"id": todo_id, "completed": True} for todo_id in range(1, 11)])
+    store.delete_many(range(11, 21))
+    store.clear()
+    assert store.version() == version + 4
+    store.create("Single")
+    assert store.version() == version + 5
+
+def test_cursor_pagination(store):
+    """Test that paging by cursor visits every todo once, in ID order"""
+    for i in range(1, 11):
+        store.create(f"Task {i}")
+    for todo_id in (2, 3, 7):
+        store.delete(todo_id)
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        page = paginate(store, limit=3, cursor=cursor)
+        seen += [todo["id"] for todo in page["todos"]]
+        pages += 1
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == [1, 4, 5, 6, 8, 9, 10]
+    assert pages == 3
+
+    with pytest.raises(ValueError):
+        paginate(store, limit=3, cursor="not-a-cursor")
+    with pytest.raises(ValueError):
+        paginate(store, limit=0)
+
+def test_filtered_and_sorted_listing(store):
+    """Test status, ID range and title prefix filters in both orders, paged and unpaged"""
+    store.create_many([{"title": title, "completed": i % 2 == 0}
+                       for i, title in enumerate(["Buy milk", "Buy eggs", "Call mom", "Buy bread", "Bake", "Buy"])])
+    store.update(3, title="Buy stamps")
+    store.delete(4)
+
+    def ids(**filters):
+        return [todo["id"] for todo in list_todos(store, **filters)]
+
+    assert ids(title_prefix="Buy") == [1, 2, 3, 6]
+    assert ids(title_prefix="Buy ", order="desc") == [3, 2, 1]
+    assert ids(title_prefix="buy") == []
+    assert ids(completed=True, id_gte=2) == [3, 5]
+    assert ids(id_gte=2, id_lt=5, order="desc") == [3, 2]
+    assert ids(completed=False, title_prefix="B") == [2, 6]
+    assert ids() == [1, 2, 3, 5, 6]
+
+    seen, cursor = [], None
+    while True:
+        page = paginate(store, limit=2, cursor=cursor, title_prefix="Bu", order="desc")
+        seen += [todo["id"] for todo in page["todos"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == [6, 3, 2, 1]
+    # A cursor only resumes a listing in the order it came from
+    with pytest.raises(ValueError):
+        paginate(store, limit=2, cursor=paginate(store, limit=2)["next_cursor"], order="desc")
+    with pytest.raises(ValueError):
+        paginate(store, limit=2, order="sideways")
+
+def test_paging_through_status_changes(store, monkeypatch):
+    """Test that status and prefix pages stay exact while todos change status back and forth"""
+    import todo_store
+    # Rebuild the per-status ID lists often enough to cover it
+    monkeypatch.setattr(todo_store, "STATUS_MOVES_PER_REBUILD", 20)
+    store.create_many([{"title": f"{'Rare' if i % 50 == 0 else 'Task'} {i}"} for i in range(300)])
+    store.update_many([{"id": todo_id, "completed": True} for todo_id in range(1, 301, 3)])
+    store.update_many([{"id": todo_id, "completed": False} for todo_id in range(1, 301, 9)])
+    store.update_many([{"id": todo_id, "completed": True} for todo_id in range(1, 301, 27)])
+    store.delete_many(range(100, 200, 7))
+
+    def paged(**filters):
+        seen, cursor = [], None
+        while True:
+            page = paginate(store, limit=7, cursor=cursor, **filters)
+            seen += [todo["id"] for todo in page["todos"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return seen
+
+    for completed in (True, False):
+        expected = [todo["id"] for todo in store.list(completed)]
+        assert paged(completed=completed) == expected
+        assert paged(completed=completed, order="desc") == expected[::-1]
+    # Few matches come from the title index, many from walking the IDs
+    for prefix in ("Rare", "Task"):
+        expected = [todo["id"] for todo in store.list() if todo["title"].startswith(prefix)]
+        assert paged(title_prefix=prefix) == expected
+        assert paged(title_prefix=prefix, completed=True) == [
+            todo["id"] for todo in store.list(True) if todo["title"].startswith(prefix)]
+
+def test_field_projection(store):
+    """Test that fields limits the keys of listed, paged, fetched and dumped todos"""
+    store.create_many([{"title": "Buy milk", "description": "x" * 100, "completed": True}, {"title": "Call mom"}])
+    assert list_todos(store, fields="title") == [{"id": 1, "title": "Buy milk"}, {"id": 2, "title": "Call mom"}]
+    assert list_todos(store, fields=["completed"], order="desc") == [{"id": 2, "completed": False},
+                                                                     {"id": 1, "completed": True}]
+    assert paginate(store, limit=1, fields="completed,title")["todos"] == [{"id": 1, "title": "Buy milk",
+                                                                            "completed": True}]
+    assert store.get(2, "description") == {"id": 2, "description": ""}
+    assert store.dumps(completed=True, fields="id") == b'[{"id":1}]'
+    # The full views are unaffected, also when cached
+    assert json.loads(store.dumps())[0]["description"] == "x" * 100
+    assert store.list(fields="id,title,description,completed") == store.list()
+    with pytest.raises(ValueError):
+        store.list(fields="title,secret")
+
+def test_batch_operations(store):
+    """Test per-item results and all-or-nothing semantics of batches"""
+    store.create_many([{"title": f"Task {i}"} for i in range(4)])
+    version = store.version()
+
+    aborted = store.update_many([{"id": 1, "completed": True}, {"id": 99, "title": "Missing"}], atomic=True)
+    assert [result["ok"] for result in aborted] == [False, False]
+    assert aborted[1]["error"] == "Todo with ID 99 not found"
+    assert store.version() == version and not store.get(1)["completed"]
+
+    partial = store.update_many([{"id": 1, "completed": True}, {"id": 99, "title": "Missing"},
+                                 {"id": 1, "title": "Renamed"}])
+    assert [result["ok"] for result in partial] == [True, False, True]
+    assert store.get(1) == {"id": 1, "title": "Renamed", "description": "", "completed": True}
+
+    assert [result["ok"] for result in store.delete_many([2, 3, 2], atomic=True)] == [False, False, False]
+    assert len(store) == 4
+    assert [result["ok"] for result in store.delete_many([2, 3, 2])] == [True, True, False]
+    assert [todo["id"] for todo in store.list()] == [1, 4]
+
+def test_search_ranks_and_tracks_changes(store):
+    """Test BM25-ranked search and that the index follows updates and deletes"""
+    store.create_many([
+        {"title": "Buy milk", "description": "From the corner store"},
+        {"title": "Write report", "description": "Quarterly report for the board"},
+        {"title": "Milk the cow", "description": "Milk, milk and more milk"},
+    ])
+    assert [todo["id"] for todo in store.search("milk")] == [3, 1]
+    assert [todo["id"] for todo in store.search("REPORT milk", limit=2)] == [2, 3]
+    assert store.search("nothing-matches") == [] and store.search("  ") == []
+
+    store.update(1, title="Buy bread")
+    store.update(2, completed=True)
+    store.delete(3)
+    assert store.search("milk") == []
+    assert store.search("bread") == [{"id": 1, "title": "Buy bread", "description": "From the corner store",
+                                      "completed": False}]
+    assert store.search("report")[0]["completed"] is True
+
+    # Case and diacritics are folded, as SQLite's unicode61 tokenizer does,
+    # whether the accent is one code point or a combining mark
+    store.create_many([{"title": "Café crème"}, {"title": unicodedata.normalize("NFD", "Déjà vu")}])
+    assert [todo["id"] for todo in store.search("CAFE")] == [4]
+    assert sorted(todo["id"] for todo in store.search("creme deja")) == [4, 5]
+    assert [todo["id"] for todo in store.search("déjà")] == [5]
+
+def test_stats_counters(store):
+    """Test that stats() counters follow every kind of mutation"""
+    store.create_many([{"title": "One"}, {"title": "Two", "completed": True}, {"title": "Three"}])
+    store.update(1, completed=True)
+    store.update(2, title="Renamed")
+    store.update_many([{"id": 3, "completed": True}, {"id": 3, "completed": False}])
+    store.delete(2)
+    stats = store.stats()
+    assert (stats["total"], stats["completed"], stats["pending"]) == (2, 1, 1)
+    assert stats["recent"]["created"][0] == 3 and stats["recent"]["deleted"][0] == 1
+
+    store.clear()
+    stats = store.stats()
+    assert (stats["total"], stats["completed"], stats["pending"]) == (0, 0, 0)
+    assert stats["recent"]["deleted"][0] == 3
+
+def test_conditional_update_and_delete(store):
+    """Test that if_match guards update/delete with the todo's current ETag"""
+    todo = store.create("Guarded")
+    etag = todo_etag(todo)
+    updated = store.update(1, completed=True, if_match=[etag])
+    assert todo_etag(updated) != etag
+    # The old ETag no longer matches, and nothing is written
+    with pytest.raises(PreconditionFailedError):
+        store.update(1, title="Lost update", if_match=[etag])
+    with pytest.raises(PreconditionFailedError):
+        store.delete(1, if_match=[etag, '"other"'])
+    assert store.get(1) == updated
+    with pytest.raises(TodoNotFoundError):
+        store.delete(2, if_match=[etag])
+    assert store.delete(1, if_match=[todo_etag(updated)])["id"] == 1
+
+def test_change_listeners(store):
+    """Test that listeners get one call per mutation with versioned events"""
+    calls = []
+    store.add_listener(calls.append)
+    store.create("One")
+    store.create_many([{"title": "Two"}, {"title": "Three"}])
+    store.update(1, completed=True)
+    store.delete(2)
+    store.remove_listener(calls.append)
+    store.delete(3)
+
+    assert [[event["op"] for event in events] for events in calls] == [
+        ["create"], ["create", "create"], ["update"], ["delete"]
+    ]
+    assert calls[2][0]["todo"]["completed"] is True
+    assert calls[3][0]["todo"]["id"] == 2
+    versions = [events[0]["version"] for events in calls]
+    assert versions == sorted(versions) and len(set(versions)) == 4
+
+def test_concurrent_mutations_keep_invariants(store):
+    """Test thousands of parallel creates, updates and deletes from a threadpool"""
+    threads, per_thread = 16, 200
+    versions = []
+    store.add_listener(lambda events: versions.append(events[0]["version"]))
+
+    def worker(n):
+        created = [store.create(f"Worker {n} task {i}")["id"] for i in range(per_thread)]
+        for todo_id in created[::2]:
+            store.update(todo_id, title=f"Worker {n} updated {todo_id}", completed=True)
+        for todo_id in created[1::4]:
+            store.delete(todo_id)
+        # Reads race with the other workers' writes and must not fail
+        store.list()
+        store.page(50, created[0])
+        return created
+
+    with ThreadPoolExecutor(threads) as pool:
+        created = [todo_id for ids in pool.map(worker, range(threads)) for todo_id in ids]
+
+    total = threads * per_thread
+    deleted = threads * len(range(1, per_thread, 4))
+    # IDs are unique and allocated without gaps
+    assert sorted(created) == list(range(1, total + 1))
+    assert len(store) == total - deleted
+    todos = store.list()
+    assert [todo["id"] for todo in todos] == sorted(todo["id"] for todo in todos)
+    paged, cursor = [], None
+    while True:
+        page = paginate(store, limit=97, cursor=cursor)
+        paged += page["todos"]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert paged == todos
+    for todo in todos:
+        # Every survivor is either untouched or carries its own update
+        assert todo["completed"] == ("updated" in todo["title"])
+        if todo["completed"]:
+            assert todo["title"].endswith(f" {todo['id']}")
+    # One listener call per mutation, delivered in commit order
+    assert len(versions) == total + threads * (per_thread // 2) + deleted
+    assert versions == sorted(set(versions))
+
+def test_change_feed_replays_and_streams(store):
+    """Test resuming the change feed from a version, live events and resyncs"""
+    feed = ChangeFeed(store, capacity=3, queue_size=2)
+    store.create("One")
+    store.create("Two")
+    store.update(1, completed=True)
+    assert [event["version"] for event in feed.since(1)] == [2, 3]
+
+    async def take(stream, count):
+        return [(event["op"], event["version"]) for event in [await stream.__anext__() for _ in range(count)]]
+
+    async def main():
+        # Buffered history, then live events from another thread
+        stream = feed.stream(since=1)
+        assert await take(stream, 2) == [("create", 2), ("update", 3)]
+        await asyncio.to_thread(store.delete, 2)
+        assert await take(stream, 1) == [("delete", 4)]
+        # Falling more than queue_size events behind ends the stream
+        await asyncio.to_thread(store.create_many, [{"title": "A"}, {"title": "B"}, {"title": "C"}])
+        assert await take(stream, 1) == [("resync", feed.latest())]
+        with pytest.raises(StopAsyncIteration):
+            await stream.__anext__()
+        # Versions older than the buffer, or from another store, can't resume
+        for version in (0, 99):
+            assert await take(feed.stream(since=version), 1) == [("resync", feed.latest())]
+        # Nor can one of another epoch, though it is in range
+        assert await take(feed.stream(since=4, epoch="0" * 8), 1) == [("resync", feed.latest())]
+
+    asyncio.run(main())
+    assert feed.since(1) is None
+    assert [event["op"] for event in feed.since(4)] == ["create"] * 3
+    assert feed.since(4, store.epoch()) == feed.since(4) and feed.since(4, "0" * 8) is None
+
+def test_change_feed_sees_other_writers(tmp_path):
+    """Test that changes written through another store object on the same SQLite file end the streams"""
+    path = str(tmp_path / "todos.db")
+    store, other = SQLiteTodoStore(path), SQLiteTodoStore(path)
+    feed = ChangeFeed(store)
+    store.create("Ours")
+    other.create("Theirs")
+    # A client of the other worker resumes here: it can't have missed anything
+    assert feed.since(2, other.epoch()) == []
+    other.create("Theirs again")
+
+    async def main():
+        stream = feed.stream(since=2)
+        # Our next write lands after theirs: the jump in versions ends the stream
+        await asyncio.to_thread(store.create, "Ours again")
+        assert await stream.__anext__() == {"op": "resync", "version": 4}
+        with pytest.raises(StopAsyncIteration):
+            await stream.__anext__()
+
+    asyncio.run(main())
+    # Resuming from before the jump would skip their change
+    assert feed.since(2) is None and feed.since(4) == []
+
+def test_sharded_store_processes(tmp_path):
+    """Test a store sharded across worker processes, with per-shard WALs"""
+    store = start_shards(2, str(tmp_path))
+    try:
+        todos = store.create_many([{"title": f"Task {i}"} for i in range(5)])
+        assert [todo["id"] for todo in todos] == [1, 2, 3, 4, 5]
+        # Creates alternate between shards and each shard allocates its own IDs
+        with ThreadPoolExecutor(4) as pool:
+            created = list(pool.map(lambda i: store.create(f"Parallel {i}")["id"], range(20)))
+        assert sorted(created) == list(range(6, 26))
+        store.update(2, completed=True)
+        store.delete(3)
+        assert [todo["id"] for todo in store.list(completed=True)] == [2]
+        assert [todo["id"] for todo in store.list()][:4] == [1, 2, 4, 5]
+        assert paginate(store, limit=2, order="desc", id_lt=6)["todos"][0]["id"] == 5
+        assert store.stats()["total"] == 24
+        assert [result["ok"] for result in store.delete_many([1, 99], atomic=True)] == [False, False]
+    finally:
+        store.close()
+    # Every shard replays its own log
+    reopened = start_shards(2, str(tmp_path))
+    try:
+        assert len(reopened) == 24 and reopened.get(2)["completed"] is True
+        # Round-robin resumes at the shard with the lowest next ID
+        assert [reopened.create(f"After restart {i}")["id"] for i in range(3)] == [26, 27, 28]
+    finally:
+        reopened.close()
+
+def test_sqlite_store_persists(tmp_path):
+    """Test that a reopened SQLite database keeps todos and never reuses IDs"""
+    path = str(tmp_path / "todos.db")
+    store = SQLiteTodoStore(path)
+    store.create("Persisted")
+    store.create("Deleted")
+    store.delete(2)
+    reopened = SQLiteTodoStore(path)
+    assert reopened.list() == [{"id": 1, "title": "Persisted", "description": "", "completed": False}]
+    assert reopened.create("New")["id"] == 3
+
+def test_sqlite_failed_clear_rolls_back(tmp_path):
+    """Test that a clear that fails midway leaves the connection usable and versions counting"""
+    import sqlite3
+    store = SQLiteTodoStore(str(tmp_path / "todos.db"))
+    store.create("Kept")
+    conn = store._connection()
+    conn.execute("CREATE TRIGGER refuse_delete BEFORE DELETE ON todos BEGIN SELECT RAISE(ABORT, 'refused'); END")
+    with pytest.raises(sqlite3.IntegrityError):
+        store.clear()
+    assert not conn.in_transaction and len(store) == 1
+    conn.execute("DROP TRIGGER refuse_delete")
+    version = store.version()
+    store.create("After")
+    assert store.version() == version + 1
+
+@pytest.mark.parametrize("module,backend_env,store_class", [
+    ("todo_sqlite", {"TODO_STORE_BACKEND": "sqlite"}, "SQLiteTodoStore"),
+    ("todo_shards", {"TODO_STORE_SHARDS": "2"}, "ShardedTodoStore"),
+])
+def test_backend_module_imported_first(tmp_path, module, backend_env, store_class):
+    """Test that importing a backend module before todo_store works when that backend is configured"""
+    env = {**os.environ, "TODO_SQLITE_PATH": str(tmp_path / "todos.db"), **backend_env}
+    env.pop("TODO_STORE_ADDRESS", None)
+    result = subprocess.run([sys.executable, "-c", f"import {module}\nfrom todo_store import store\n"
+                             f"assert isinstance(store, {module}.{store_class})"],
+                            env=env, capture_output=True, text=True, timeout=30)
+    assert result.returncode == 0, result.stderr
+
+@pytest.mark.filterwarnings("error::pytest.PytestUnhandledThreadExceptionWarning")
+def test_store_shared_across_processes():
+    """Test that a child process launched with store_env sees and mutates our store"""
+    store = TodoStore()
+    store.create("From parent")
+    server = serve_store(store)
+    child_code = (
+        "from todo_store import store, TodoNotFoundError\n"
+        "assert store.get(1)['title'] == 'From parent'\n"
+        f"assert store.epoch() == {store.epoch()!r}\n"
+        "store.create('From child')\n"
+        "store.update(1, completed=True)\n"
+        "try:\n"
+        "    store.get(99)\n"
+        "except TodoNotFoundError as e:\n"
+        "    assert e.todo_id == 99\n"
+        "else:\n"
+        "    raise SystemExit('missing todo did not raise')\n"
+    )
+    try:
+        result = subprocess.run([sys.executable, "-c", child_code], env={**os.environ, **store_env(server)},
+                                capture_output=True, text=True, timeout=30)
+    finally:
+        server.stop_event.set()
+    # The server thread must stop quietly: serve_forever() ends with sys.exit()
+    for thread in threading.enumerate():
+        if thread.name == "todo-store-server":
+            thread.join(5)
+    assert result.returncode == 0, result.stderr
+    assert [(todo["title"], todo["completed"]) for todo in store.list()] == [("From parent", True), ("From child", False)]
+
+def test_list_etag_survives_restarts(tmp_path):
+    """Test that list ETags from before a restart don't match after it, even at the same version"""
+    store = TodoStore(wal=WriteAheadLog(str(tmp_path)))
+    store.create("Before restart")
+    before = list_etag(store.epoch(), store.version())
+    store._wal.close()
+    replayed = TodoStore(wal=WriteAheadLog(str(tmp_path)))
+    replayed.create("After restart")
+    assert replayed.version() == 1 and list_etag(replayed.epoch(), replayed.version()) != before
+    replayed._wal.close()
+
+    # A SQLite database keeps its version and epoch; a recreated one starts a new epoch
+    path = str(tmp_path / "todos.db")
+    database = SQLiteTodoStore(path)
+    database.create("Persisted")
+    assert list_etag(SQLiteTodoStore(path).epoch(), SQLiteTodoStore(path).version()) == \
+        list_etag(database.epoch(), database.version())
+    assert SQLiteTodoStore(str(tmp_path / "other.db")).epoch() != database.epoch()
+
+@pytest.mark.parametrize("fsync", ["always", "batch", "never"])
+def test_wal_replay_restores_store(fsync, tmp_path):
+    """Test that a store rebuilt from snapshot + log tail matches the original"""
+    wal_dir = str(tmp_path)
+    store = TodoStore(wal=WriteAheadLog(wal_dir, fsync=fsync, snapshot_every=4))
+    for i in range(10):
+        store.create(f"Task {i}", f"Description {i}")
+    store.update(3, title="Renamed", completed=True)
+    store.delete(5)
+    store.delete(10)
+    store.create_many([{"title": "Batch 1"}, {"title": "Batch 2", "completed": True}])
+    store.update_many([{"id": 11, "description": "Batched"}, {"id": 4, "completed": True}])
+    store.delete_many([1, 12])
+    expected = store.list()
+    store._wal.close()
+
+    # Simulate a crash halfway through appending a record
+    with open(os.path.join(wal_dir, "todos.wal"), "ab") as f:
+        f.write(b'{"op":"create","todo":{"id":')
+
+    replayed = TodoStore(wal=WriteAheadLog(wal_dir, fsync=fsync))
+    assert replayed.list() == expected
+    # Deleted IDs are still never handed out again
+    assert replayed.create("After restart")["id"] == 13
+    replayed._wal.close()
+
+def test_concurrent_writers_share_wal_commits(tmp_path):
+    """Test that writers waiting on group commit outside the lock log every change"""
+    store = TodoStore(wal=WriteAheadLog(str(tmp_path), fsync="batch", snapshot_every=300))
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda i: store.update(store.create(f"Task {i}")["id"], completed=True), range(800)))
+    expected = store.list()
+    store._wal.close()
+    replayed = TodoStore(wal=WriteAheadLog(str(tmp_path), fsync="never"))
+    assert replayed.list() == expected and len(expected) == 800
+    replayed._wal.close()
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,168 @@
+# Change feed: recent store mutations, replayable by version
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+import asyncio
+import threading
+
+# Change events kept for reconnecting clients; older ones force a resync
+CHANGE_BUFFER_SIZE = 10000
+# Events a subscriber may fall behind by before it is cut off
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+
+class _Subscriber:
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.pending: Deque[Dict[str, Any]] = deque()
+        self.wakeup = asyncio.Event()
+        self.overflowed = False
+
+
+class ChangeFeed:
+    """Ring buffer of the store's change events plus live fan-out.
+
+    Listens to the store (see ChangeListeners), keeps the last ``capacity``
+    events and hands new ones to every open stream. A stream that starts
+    from a version the buffer no longer covers or of another epoch (the
+    store's version counter before a restart), or that falls more than
+    ``queue_size`` events behind, gets a single resync event and ends, so a
+    slow consumer costs bounded memory; the client then reloads the list
+    and reconnects from its version.
+
+    Only writes through this process's store object reach the feed. Where
+    other processes write to the same store (uvicorn workers sharing a
+    SQLite file), their changes show up as a jump in the versions of ours,
+    or as a client resuming from a version we never saw; either ends the
+    streams opened before it with a resync and restarts the buffer after
+    it, so a resume never skips a change.
+    """
+
+    def __init__(self, store, capacity: int = CHANGE_BUFFER_SIZE, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._events: Deque[Dict[str, Any]] = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._subscribers: List[_Subscriber] = []
+        self._store = store
+        self.epoch = store.epoch()
+        # Every event with a version above _floor is still in the buffer
+        self._floor = self._latest = store.version()
+        store.add_listener(self._on_store_change)
+
+    def latest(self) -> int:
+        return self._latest
+
+    def since(self, version: int, epoch: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+        """Buffered events after ``version`` (of ``epoch``, default ours), or None if some are gone"""
+        self._catch_up(version, epoch)
+        with self._lock:
+            return self._since(version, epoch)
+
+    def _since(self, version: int, epoch: Optional[str]) -> Optional[List[Dict[str, Any]]]:
+        # Another epoch's versions say nothing about ours, even where they
+        # overlap; a version ahead of ours is from before a restart too
+        if (epoch is not None and epoch != self.epoch) or version < self._floor or version > self._latest:
+            return None
+        return [event for event in self._events if event["version"] > version]
+
+    async def stream(self, since: Optional[int] = None, epoch: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Yield events after ``since`` of ``epoch`` (default: from now on) as they happen.
+
+        Ends after yielding {"op": "resync", "version": latest} when the
+        requested history is gone or the consumer fell too far behind.
+        """
+        subscriber = _Subscriber(asyncio.get_running_loop())
+        if since is not None:
+            self._catch_up(since, epoch)
+        with self._lock:
+            backlog = [] if since is None else self._since(since, epoch)
+            if backlog is not None:
+                self._subscribers.append(subscriber)
+        try:
+            if backlog is None:
+                yield self._resync()
+                return
+            for event in backlog:
+                yield event
+            while True:
+                await subscriber.wakeup.wait()
+                subscriber.wakeup.clear()
+                if subscriber.overflowed:
+                    yield self._resync()
+                    return
+                while subscriber.pending:
+                    yield subscriber.pending.popleft()
+        finally:
+            with self._lock:
+                if subscriber in self._subscribers:
+                    self._subscribers.remove(subscriber)
+
+    def _resync(self) -> Dict[str, Any]:
+        return {"op": "resync", "version": self._latest}
+
+    def _catch_up(self, version: int, epoch: Optional[str]) -> None:
+        # A client of another process sharing the store may resume from a
+        # version past our latest; skip to the store's, if it is there too
+        if (epoch is not None and epoch != self.epoch) or version <= self._latest:
+            return
+        current = self._store.version()
+        with self._lock:
+            stale = self._skip_to(current) if current > self._latest else []
+        self._cut_off(stale)
+
+    def _skip_to(self, version: int) -> List[_Subscriber]:
+        # Changes up to ``version`` were made elsewhere and have no events:
+        # the buffer restarts after it and open streams must resync
+        self._events.clear()
+        self._floor = self._latest = version
+        stale, self._subscribers = self._subscribers, []
+        return stale
+
+    def _cut_off(self, subscribers: List[_Subscriber]) -> None:
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(self._overflow, subscriber)
+            except RuntimeError:
+                # That stream's event loop has shut down
+                pass
+
+    def _overflow(self, subscriber: _Subscriber) -> None:
+        subscriber.overflowed = True
+        subscriber.pending.clear()
+        subscriber.wakeup.set()
+
+    def _on_store_change(self, events: List[Dict[str, Any]]) -> None:
+        # Runs on the mutating thread, in commit order
+        version = events[0]["version"]
+        with self._lock:
+            if version <= self._latest:
+                # A catch-up already skipped past it
+                return
+            if version != self._latest + 1:
+                # The versions in between were written by another process.
+                # These events are skipped too: a backend that reads the
+                # version after committing may have labelled them with the
+                # other process's
+                self._cut_off(self._skip_to(version))
+                return
+            for event in events:
+                if len(self._events) == self._events.maxlen:
+                    self._floor = self._events[0]["version"]
+                self._events.append(event)
+            self._latest = version
+            # Only streams open now get these; later ones find them in the buffer
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(self._deliver, subscriber, events)
+            except RuntimeError:
+                # That stream's event loop has shut down
+                pass
+
+    def _deliver(self, subscriber: _Subscriber, events: List[Dict[str, Any]]) -> None:
+        if subscriber.overflowed:
+            return
+        if len(subscriber.pending) + len(events) > self.queue_size:
+            self._overflow(subscriber)
+        else:
+            subscriber.pending.extend(events)
+            subscriber.wakeup.set()
@@ -0,0 +1,184 @@
+# Request metrics for the REST routes and MCP tools/resources
+from typing import Any, Dict, List, Tuple
+import bisect
+import threading
+import time
+
+# Upper bounds (seconds) of the latency histogram buckets; a final +Inf
+# bucket catches everything slower
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Per-series counter layout: calls, errors, payload bytes, latency sum,
+# then one (non-cumulative) count per histogram bucket
+_CALLS, _ERRORS, _BYTES, _SECONDS, _BUCKETS = range(5)
+
+
+class Metrics:
+    """Call counts, error counts, payload sizes and latency histograms.
+
+    Series are keyed by (interface, name), e.g. ("rest", "GET /todos/"),
+    ("tool", "create_todo") or ("resource", "todos://all"). Each thread
+    records into its own shard, so ``observe`` takes no lock and threads
+    never contend. Readers sum the shards; a read racing a write may see
+    it half-applied, which is fine for monitoring.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards: List[Dict[Tuple[str, str], List[float]]] = []
+        self._shards_lock = threading.Lock()
+
+    def observe(self, interface: str, name: str, seconds: float, error: bool = False, size: int = 0) -> None:
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+        series = shard.get((interface, name))
+        if series is None:
+            series = shard[(interface, name)] = [0] * (_BUCKETS + len(LATENCY_BUCKETS) + 1)
+        series[_CALLS] += 1
+        series[_ERRORS] += error
+        series[_BYTES] += size
+        series[_SECONDS] += seconds
+        series[_BUCKETS + bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def _totals(self) -> Dict[Tuple[str, str], List[float]]:
+        totals: Dict[Tuple[str, str], List[float]] = {}
+        with self._shards_lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for key, series in list(shard.items()):
+                total = totals.get(key)
+                if total is None:
+                    totals[key] = list(series)
+                else:
+                    for i, value in enumerate(series):
+                        total[i] += value
+        return dict(sorted(totals.items()))
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """One summary per series, for JSON consumers"""
+        summaries = []
+        for (interface, name), series in self._totals().items():
+            calls = series[_CALLS]
+            summaries.append({
+                "interface": interface, "name": name, "calls": calls, "errors": series[_ERRORS],
+                "payload_bytes": series[_BYTES], "mean_ms": round(series[_SECONDS] / calls * 1000, 3) if calls else 0,
+                "latency_buckets": {str(bound): count for bound, count in
+                                    zip(LATENCY_BUCKETS + ("+Inf",), series[_BUCKETS:])},
+            })
+        return summaries
+
+    def render_prometheus(self) -> str:
+        """All series in the Prometheus text exposition format"""
+        totals = [(f'interface="{interface}",name="{_escape(name)}"', series)
+                  for (interface, name), series in self._totals().items()]
+        lines = []
+        for metric, index, kind, help_text in (
+            ("todo_requests_total", _CALLS, "counter", "Calls per REST route, MCP tool and MCP resource."),
+            ("todo_request_errors_total", _ERRORS, "counter",
+             "Failed calls (HTTP status >= 400, tool errors, exceptions)."),
+            ("todo_payload_bytes_total", _BYTES, "counter", "Bytes of response bodies and tool/resource results."),
+        ):
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}"]
+            lines += [f"{metric}{{{labels}}} {series[index]}" for labels, series in totals]
+        lines += ["# HELP todo_request_duration_seconds Call latency.",
+                  "# TYPE todo_request_duration_seconds histogram"]
+        for labels, series in totals:
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), series[_BUCKETS:]):
+                cumulative += count
+                lines.append(f'todo_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"todo_request_duration_seconds_sum{{{labels}}} {series[_SECONDS]:.6f}")
+            lines.append(f"todo_request_duration_seconds_count{{{labels}}} {series[_CALLS]}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _text_size(text: str) -> int:
+    # isascii() is O(1) on CPython, so only non-ASCII text pays for encoding
+    return len(text) if text.isascii() else len(text.encode())
+
+
+# Registry shared by the REST app and the MCP server of this process
+metrics = Metrics()
+
+
+# ---- REST ----
+class MetricsMiddleware:
+    """ASGI middleware recording every request that matched a FastAPI route.
+
+    Series are named "<METHOD> <route path template>", so /todos/1 and
+    /todos/2 share "GET /todos/{todo_id}". Requests for mounted apps (the
+    MCP endpoints) are left to the MCP instrumentation.
+    """
+
+    def __init__(self, app, registry: Metrics = metrics):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status, size = 500, 0
+
+        async def send_and_measure(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        root_path = scope.get("root_path", "")
+        try:
+            await self.app(scope, receive, send_and_measure)
+        finally:
+            # The router stores the matched route in the (shared) scope. A
+            # Mount extends root_path, and the mounted app's own router then
+            # overwrites the route with one of its paths (e.g. "POST /")
+            route = scope.get("route")
+            if route is not None and scope.get("root_path", "") == root_path:
+                self.registry.observe("rest", f"{scope['method']} {route.path}", time.perf_counter() - started,
+                                      status >= 400, size)
+
+
+# ---- MCP ----
+def instrument_mcp_server(server, registry: Metrics = metrics) -> None:
+    """Record every tools/call and resources/read handled by a low-level MCP server.
+
+    Wraps the request handlers rather than each function, so tools and
+    resources added later are covered too, and payload sizes come from the
+    already-serialized result text.
+    """
+    from mcp import types
+
+    def wrap(request_type, interface, name_of, is_error, contents_of):
+        handler = server.request_handlers[request_type]
+
+        async def timed(request):
+            started = time.perf_counter()
+            try:
+                result = await handler(request)
+            except Exception:
+                registry.observe(interface, name_of(request), time.perf_counter() - started, True)
+                raise
+            root = result.root
+            size = sum(_text_size(item.text) for item in contents_of(root) if getattr(item, "text", None))
+            registry.observe(interface, name_of(request), time.perf_counter() - started, is_error(root), size)
+            return result
+
+        server.request_handlers[request_type] = timed
+
+    wrap(types.CallToolRequest, "tool", lambda request: request.params.name,
+         lambda result: bool(getattr(result, "isError", False)), lambda result: getattr(result, "content", ()))
+    wrap(types.ReadResourceRequest, "resource", lambda request: str(request.params.uri),
+         lambda result: False, lambda result: getattr(result, "contents", ()))
@@ -0,0 +1,162 @@
+# Incremental indexes over todo text: full-text search and title prefixes
+from typing import Dict, List, Optional, Set, Tuple
+import bisect
+import heapq
+import math
+import re
+import unicodedata
+
+# Runs of letters and digits, after fold(); matches how SQLite's FTS5
+# unicode61 tokenizer splits and folds text (case and, by default,
+# diacritics), so both backends find the same todos
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+# BM25 parameters: term frequency saturation and length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def fold(text: str) -> str:
+    """Lowercase ``text`` and strip diacritics, so that "Café" and "CAFE" both fold to cafe"""
+    text = text.lower()
+    if text.isascii():
+        return text
+    # NFKD splits "é" into "e" and a combining accent, which is dropped
+    return "".join(char for char in unicodedata.normalize("NFKD", text) if not unicodedata.combining(char))
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(fold(text))
+
+
+class SearchIndex:
+    """Inverted index: token -> {todo id: term frequency}.
+
+    Updated on every create/update/delete, so a query only visits the
+    posting lists of its own terms. Results are ranked by BM25 over the
+    title and description; a todo matches if it contains any query term.
+    Not thread-safe on its own: the store calls it under its lock.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._lengths: Dict[int, int] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def add(self, todo_id: int, title: str, description: str) -> None:
+        tokens = tokenize(title) + tokenize(description)
+        for token in tokens:
+            postings = self._postings.setdefault(token, {})
+            postings[todo_id] = postings.get(todo_id, 0) + 1
+        self._lengths[todo_id] = len(tokens)
+        self._total_length += len(tokens)
+
+    def remove(self, todo_id: int, title: str, description: str) -> None:
+        # Needs the text as it was indexed to find its postings
+        for token in set(tokenize(title) + tokenize(description)):
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(todo_id, None)
+                if not postings:
+                    del self._postings[token]
+        self._total_length -= self._lengths.pop(todo_id, 0)
+
+    def stats(self, query: str) -> Tuple[int, int, Dict[str, int]]:
+        """What BM25 needs to know about the corpus for ``query``: document
+        count, total length and each query term's document frequency"""
+        return (len(self._lengths), self._total_length,
+                {token: len(self._postings.get(token, ())) for token in set(tokenize(query))})
+
+    def search(self, query: str, limit: int,
+               stats: Optional[Tuple[int, int, Dict[str, int]]] = None) -> List[Tuple[int, float]]:
+        """Return up to ``limit`` (todo id, score) pairs, best first.
+
+        ``stats`` (see stats(), summed over several indexes) replaces this
+        index's own, so shards of one corpus score exactly as a single index.
+        """
+        count, total_length, frequencies = stats or self.stats(query)
+        if not count:
+            return []
+        average_length = total_length / count or 1
+        scores: Dict[int, float] = {}
+        for token, frequency_in_corpus in frequencies.items():
+            postings = self._postings.get(token)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - frequency_in_corpus + 0.5) / (frequency_in_corpus + 0.5))
+            for todo_id, frequency in postings.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[todo_id] / average_length)
+                scores[todo_id] = scores.get(todo_id, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        # Ties go to the older todo
+        return heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+# Pending PrefixIndex changes applied one at a time; more trigger a rebuild
+PREFIX_MERGE_THRESHOLD = 64
+# Highest code point, the upper bound of a prefix range
+MAX_CHAR = "\U0010ffff"
+
+
+class PrefixIndex:
+    """Sorted (title, todo id) pairs for case-sensitive title prefix queries.
+
+    Adds and removes are buffered and merged on the next query: a few are
+    bisected into place, many (a bulk import) cost one sort, so writes
+    never pay for an O(n) list insert each. Not thread-safe on its own:
+    the store calls it under its lock.
+    """
+
+    def __init__(self):
+        self._sorted: List[Tuple[str, int]] = []
+        self._added: Set[Tuple[str, int]] = set()
+        self._removed: Set[Tuple[str, int]] = set()
+
+    def add(self, todo_id: int, title: str) -> None:
+        entry = (title, todo_id)
+        if entry in self._removed:
+            self._removed.discard(entry)
+        else:
+            self._added.add(entry)
+
+    def remove(self, todo_id: int, title: str) -> None:
+        entry = (title, todo_id)
+        if entry in self._added:
+            self._added.discard(entry)
+        else:
+            self._removed.add(entry)
+
+    def ids(self, prefix: str) -> List[int]:
+        """IDs of todos whose title starts with ``prefix``, in title order"""
+        return [todo_id for _, todo_id in self.entries(prefix)]
+
+    def entries(self, prefix: str) -> List[Tuple[str, int]]:
+        """(title, id) of todos whose title starts with ``prefix``, in title order"""
+        start, stop = self._bounds(prefix)
+        return self._sorted[start:stop]
+
+    def count(self, prefix: str) -> int:
+        """Number of todos whose title starts with ``prefix``, in O(log n)"""
+        start, stop = self._bounds(prefix)
+        return stop - start
+
+    def _bounds(self, prefix: str) -> Tuple[int, int]:
+        self._merge()
+        # Titles with the prefix sort from the prefix itself up to it plus
+        # the highest code point
+        return (bisect.bisect_left(self._sorted, (prefix,)),
+                bisect.bisect_left(self._sorted, (prefix + MAX_CHAR,)))
+
+    def _merge(self) -> None:
+        if len(self._added) + len(self._removed) > PREFIX_MERGE_THRESHOLD:
+            removed = self._removed
+            self._sorted = sorted([entry for entry in self._sorted if entry not in removed] + list(self._added))
+        else:
+            for entry in self._removed:
+                del self._sorted[bisect.bisect_left(self._sorted, entry)]
+            for entry in self._added:
+                bisect.insort(self._sorted, entry)
+        self._added.clear()
+        self._removed.clear()
@@ -0,0 +1,361 @@
+# Todo store sharded by ID across worker processes
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.managers import BaseManager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import heapq
+import os
+import subprocess
+import sys
+import threading
+
+from todo_store import (
+    TodoStore, TodoNotFoundError, ChangeListeners, SerializationCache, STORE_METHODS, STORE_ADDRESS_ENV,
+    STORE_AUTHKEY_ENV, STORE_BACKEND_ENV, STORE_SHARDS_ENV, WAL_DIR_ENV, serve_store, format_address,
+    parse_address, dumps_bytes, batch_error, abort_batch, parse_fields, new_epoch
+)
+from todo_wal import WriteAheadLog
+
+# Shards also answer the two phases of a sharded search
+SHARD_METHODS = STORE_METHODS + ("search_stats", "search_ranked", "next_id")
+
+
+class _ShardClientManager(BaseManager):
+    pass
+
+
+_ShardClientManager.register("get_store", exposed=SHARD_METHODS)
+
+
+class ShardedTodoStore(ChangeListeners):
+    """Todos partitioned by ID across N shard stores.
+
+    Shard k allocates IDs k+1, k+1+N, k+1+2N, ..., so the owner of a todo
+    is (id - 1) % N and creates, handed to the shards round-robin, need
+    no coordination between them. By-ID operations go to the owning shard
+    only; listings, filters, search and stats ask every shard in parallel
+    and merge the answers in ID order (or by score for search). A merged
+    listing is not a snapshot across shards: it may include a write to one
+    shard and miss a concurrent write to another.
+
+    Shards are normally TodoStores in worker processes (see start_shards),
+    each with its own lock, GIL and core. The version counter and change
+    events live here, so all writes must go through one ShardedTodoStore;
+    other processes attach to it with serve_store. Writes to the same shard
+    are serialized here so their events follow commit order.
+    """
+
+    def __init__(self, shards: Sequence[Any], processes: Sequence[subprocess.Popen] = ()):
+        super().__init__()
+        self._shards = list(shards)
+        self._processes = list(processes)
+        self._locks = [threading.Lock() for _ in self._shards]
+        # Guards the version, the round-robin position and event emission
+        self._lock = threading.Lock()
+        self._version = 0
+        self._epoch = new_epoch()
+        self._cache = SerializationCache()
+        self._pool = ThreadPoolExecutor(max_workers=len(self._shards), thread_name_prefix="todo-shard")
+        # Resume the round-robin where it stopped (e.g. before a restart with
+        # WALs): the shard with the lowest next ID, so new IDs keep growing
+        next_ids = self._gather(lambda shard: shard.next_id())
+        self._next_shard = next_ids.index(min(next_ids))
+
+    def shard_of(self, todo_id: int) -> int:
+        return (todo_id - 1) % len(self._shards)
+
+    def _gather(self, call: Callable[[Any], Any]) -> List[Any]:
+        # Proxies open one connection per thread, so shards answer in parallel
+        return list(self._pool.map(call, self._shards))
+
+    # ---- Reads ----
+    def __len__(self) -> int:
+        return sum(self._gather(len))
+
+    def __contains__(self, todo_id: int) -> bool:
+        return todo_id in self._shards[self.shard_of(todo_id)]
+
+    def list(self, completed: Optional[bool] = None, fields: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """Return todos in ID order, optionally only (un)completed ones and only some ``fields``"""
+        fields = parse_fields(fields)
+        return list(heapq.merge(*self._gather(lambda shard: shard.list(completed, fields)), key=_todo_id))
+
+    def get(self, todo_id: int, fields: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Return a todo by ID"""
+        return self._shards[self.shard_of(todo_id)].get(todo_id, parse_fields(fields))
+
+    def page(self, limit: Optional[int], after_id: Optional[int] = None, completed: Optional[bool] = None,
+             id_gte: Optional[int] = None, id_lt: Optional[int] = None, title_prefix: Optional[str] = None,
+             descending: bool = False, fields: Optional[Iterable[str]] = None
+             ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Return up to ``limit`` matching todos after ``after_id`` (see TodoStore.page)"""
+        fields = parse_fields(fields)
+        pages = self._gather(lambda shard: shard.page(limit, after_id, completed=completed, id_gte=id_gte,
+                                                      id_lt=id_lt, title_prefix=title_prefix,
+                                                      descending=descending, fields=fields))
+        # Each shard's page holds its first ``limit`` matches, so the first
+        # ``limit`` of the merge are the first ``limit`` overall
+        merged = list(heapq.merge(*(todos for todos, _ in pages), key=_todo_id, reverse=descending))
+        if limit is None:
+            return merged, None
+        more = len(merged) > limit or any(last_id is not None for _, last_id in pages)
+        todos = merged[:limit]
+        return todos, (todos[-1]["id"] if more else None)
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Return up to ``limit`` todos matching any word of ``query``, best match first.
+
+        Two rounds: the shards' corpus statistics are summed first, then
+        every shard scores with the totals, so the ranking is the one a
+        single store would give.
+        """
+        shard_stats = self._gather(lambda shard: shard.search_stats(query))
+        frequencies: Dict[str, int] = {}
+        for _, _, shard_frequencies in shard_stats:
+            for token, frequency in shard_frequencies.items():
+                frequencies[token] = frequencies.get(token, 0) + frequency
+        stats = (sum(count for count, _, _ in shard_stats), sum(length for _, length, _ in shard_stats), frequencies)
+        ranked = [result for results in self._gather(lambda shard: shard.search_ranked(query, limit, stats))
+                  for result in results]
+        return [todo for _, todo in heapq.nsmallest(limit, ranked, key=lambda result: (-result[0], result[1]["id"]))]
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the shards' counts and recent activity, summed"""
+        shard_stats = self._gather(lambda shard: shard.stats())
+        recent = shard_stats[0]["recent"]
+        return {
+            "total": sum(stats["total"] for stats in shard_stats),
+            "completed": sum(stats["completed"] for stats in shard_stats),
+            "pending": sum(stats["pending"] for stats in shard_stats),
+            # Intervals are aligned to the clock, so the shards' buckets line up
+            "recent": {
+                "interval_seconds": recent["interval_seconds"],
+                "created": [sum(counts) for counts in zip(*(stats["recent"]["created"] for stats in shard_stats))],
+                "deleted": [sum(counts) for counts in zip(*(stats["recent"]["deleted"] for stats in shard_stats))],
+            },
+        }
+
+    def version(self) -> int:
+        """Return the store version, bumped by every mutation"""
+        return self._version
+
+    def epoch(self) -> str:
+        """Return the ID of this store object's version counter, new in every process"""
+        return self._epoch
+
+    def dumps(self, completed: Optional[bool] = None, fields: Optional[Iterable[str]] = None) -> bytes:
+        """Return list(completed, fields) as compact JSON bytes, cached until the next mutation"""
+        fields = parse_fields(fields)
+        return self._cache.get((completed, fields), self._version,
+                               lambda: dumps_bytes(self.list(completed, fields)))
+
+    # ---- Writes ----
+    def create(self, title: str, description: str = "", completed: bool = False) -> Dict[str, Any]:
+        """Create a todo on the next shard in turn and return it"""
+        index = self._take_shards(1)
+        with self._locks[index]:
+            todo = self._shards[index].create(title, description, completed)
+            self._changed([{"op": "create", "todo": todo}])
+        return todo
+
+    def create_many(self, items: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Create several todos, spread round-robin, and return them in input order"""
+        items = list(items)
+        if not items:
+            return []
+        start = self._take_shards(len(items))
+        groups = self._group(range(len(items)), lambda position: (start + position) % len(self._shards))
+        with self._locked(groups):
+            created = self._run(groups, lambda shard, positions: shard.create_many([items[p] for p in positions]))
+            todos = [None] * len(items)
+            for positions, results in created:
+                for position, todo in zip(positions, results):
+                    todos[position] = todo
+            self._changed([{"op": "create", "todo": todo} for todo in todos])
+        return todos
+
+    def update(self, todo_id: int, title: Optional[str] = None, description: Optional[str] = None,
+               completed: Optional[bool] = None, if_match: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Update the given fields of a todo and return it (see TodoStore.update)"""
+        index = self.shard_of(todo_id)
+        with self._locks[index]:
+            todo = self._shards[index].update(todo_id, title=title, description=description, completed=completed,
+                                              if_match=if_match)
+            self._changed([{"op": "update", "todo": todo}])
+        return todo
+
+    def update_many(self, updates: Iterable[Dict[str, Any]], atomic: bool = False) -> List[Dict[str, Any]]:
+        """Apply several updates, returning one result per update (see TodoStore.update_many)"""
+        updates = list(updates)
+        groups = self._group(range(len(updates)), lambda position: self.shard_of(updates[position]["id"]))
+        with self._locked(groups):
+            if atomic:
+                missing = self._missing(groups, [update["id"] for update in updates], unique=False)
+                if missing:
+                    return abort_batch([batch_error(update["id"], TodoNotFoundError(update["id"]))
+                                        if position in missing else {"id": update["id"], "ok": True}
+                                        for position, update in enumerate(updates)])
+            results = self._scatter(groups, len(updates),
+                                    lambda shard, positions: shard.update_many([updates[p] for p in positions]))
+            self._changed([{"op": "update", "todo": result["todo"]} for result in results if result["ok"]])
+        return results
+
+    def delete(self, todo_id: int, if_match: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Delete a todo and return it (``if_match`` as for update)"""
+        index = self.shard_of(todo_id)
+        with self._locks[index]:
+            todo = self._shards[index].delete(todo_id, if_match=if_match)
+            self._changed([{"op": "delete", "todo": todo}])
+        return todo
+
+    def delete_many(self, todo_ids: Iterable[int], atomic: bool = False) -> List[Dict[str, Any]]:
+        """Delete several todos, returning one result per ID (see TodoStore.update_many)"""
+        todo_ids = list(todo_ids)
+        groups = self._group(range(len(todo_ids)), lambda position: self.shard_of(todo_ids[position]))
+        with self._locked(groups):
+            if atomic:
+                missing = self._missing(groups, todo_ids, unique=True)
+                if missing:
+                    return abort_batch([batch_error(todo_id, TodoNotFoundError(todo_id))
+                                        if position in missing else {"id": todo_id, "ok": True}
+                                        for position, todo_id in enumerate(todo_ids)])
+            results = self._scatter(groups, len(todo_ids),
+                                    lambda shard, positions: shard.delete_many([todo_ids[p] for p in positions]))
+            self._changed([{"op": "delete", "todo": result["todo"]} for result in results if result["ok"]])
+        return results
+
+    def clear(self) -> None:
+        """Remove all todos and reset every shard's ID counter"""
+        with self._locked({index: [] for index in range(len(self._shards))}):
+            self._gather(lambda shard: shard.clear())
+            with self._lock:
+                self._next_shard = 0
+            self._changed([{"op": "clear"}])
+
+    def close(self) -> None:
+        """Stop the shard processes started by start_shards"""
+        self._pool.shutdown()
+        for process in self._processes:
+            process.stdin.close()
+            process.wait()
+
+    # ---- Helpers ----
+    def _take_shards(self, count: int) -> int:
+        # Reserves ``count`` consecutive round-robin turns, returning the first
+        with self._lock:
+            start = self._next_shard
+            self._next_shard = (start + count) % len(self._shards)
+        return start
+
+    def _changed(self, events: List[Dict[str, Any]]) -> None:
+        # Called with the written shards' locks held; events are emitted
+        # under our lock so listeners see versions in increasing order
+        if not events:
+            return
+        with self._lock:
+            self._version += 1
+            if self._listeners:
+                self._emit(self._version, events)
+
+    @staticmethod
+    def _group(positions: Iterable[int], shard_of: Callable[[int], int]) -> Dict[int, List[int]]:
+        groups: Dict[int, List[int]] = {}
+        for position in positions:
+            groups.setdefault(shard_of(position), []).append(position)
+        return groups
+
+    def _locked(self, groups: Dict[int, List[int]]):
+        # Always locks shards in index order, so batches never deadlock
+        return _Locks([self._locks[index] for index in sorted(groups)])
+
+    def _run(self, groups: Dict[int, List[int]], call: Callable[[Any, List[int]], Any]) -> List[Tuple[List[int], Any]]:
+        futures = [(positions, self._pool.submit(call, self._shards[index], positions))
+                   for index, positions in groups.items()]
+        return [(positions, future.result()) for positions, future in futures]
+
+    def _scatter(self, groups: Dict[int, List[int]], count: int,
+                 call: Callable[[Any, List[int]], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        # Runs each shard's part of a batch and puts the results back in input order
+        results = [None] * count
+        for positions, shard_results in self._run(groups, call):
+            for position, result in zip(positions, shard_results):
+                results[position] = result
+        return results
+
+    def _missing(self, groups: Dict[int, List[int]], todo_ids: List[int], unique: bool) -> set:
+        """Positions of IDs an atomic batch can't apply (absent, or repeated when ``unique``)"""
+        missing, seen = set(), set()
+        for positions, present in self._run(groups, lambda shard, positions: [todo_ids[p] in shard for p in positions]):
+            for position, exists in zip(positions, present):
+                if not exists:
+                    missing.add(position)
+        if unique:
+            for position, todo_id in enumerate(todo_ids):
+                if todo_id in seen:
+                    missing.add(position)
+                seen.add(todo_id)
+        return missing
+
+
+class _Locks:
+    """Context manager holding several locks"""
+
+    def __init__(self, locks: List[threading.Lock]):
+        self.locks = locks
+
+    def __enter__(self):
+        for lock in self.locks:
+            lock.acquire()
+
+    def __exit__(self, *exc_info):
+        for lock in reversed(self.locks):
+            lock.release()
+
+
+def _todo_id(todo: Dict[str, Any]) -> int:
+    return todo["id"]
+
+
+# ---- Shard processes ----
+def start_shards(count: int, wal_dir: Optional[str] = None, fsync: str = "batch") -> ShardedTodoStore:
+    """Start ``count`` shard processes and return the store routing to them.
+
+    Each shard is a TodoStore served over local IPC (a Unix socket on
+    POSIX), with its own write-ahead log under ``wal_dir`` when given. The
+    shards exit when this process does.
+    """
+    authkey = os.urandom(16)
+    # Keep shards from attaching to a store or sharding themselves on import
+    env = {key: value for key, value in os.environ.items()
+           if key not in (STORE_ADDRESS_ENV, STORE_AUTHKEY_ENV, STORE_SHARDS_ENV, WAL_DIR_ENV)}
+    env[STORE_BACKEND_ENV] = "memory"
+    processes, shards = [], []
+    for index in range(count):
+        command = [sys.executable, os.path.abspath(__file__), str(index), str(count), fsync]
+        if wal_dir:
+            command.append(os.path.join(wal_dir, f"shard-{index}"))
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env, text=True)
+        # The key goes over the pipe rather than the command line or environment
+        process.stdin.write(authkey.hex() + "\n")
+        process.stdin.flush()
+        address = process.stdout.readline().strip()
+        if not address:
+            raise RuntimeError(f"Shard {index} failed to start (exit code {process.wait()})")
+        manager = _ShardClientManager(address=parse_address(address), authkey=authkey)
+        manager.connect()
+        processes.append(process)
+        shards.append(manager.get_store())
+    return ShardedTodoStore(shards, processes)
+
+
+def run_shard(index: int, count: int, fsync: str = "batch", wal_dir: Optional[str] = None) -> None:
+    """Serve one shard until the parent closes our stdin (or exits)"""
+    authkey = bytes.fromhex(sys.stdin.readline().strip())
+    wal = WriteAheadLog(wal_dir, fsync=fsync) if wal_dir else None
+    store = TodoStore(wal=wal, first_id=index + 1, id_step=count)
+    server = serve_store(store, authkey=authkey, exposed=SHARD_METHODS)
+    print(format_address(server.address), flush=True)
+    sys.stdin.read()
+
+
+if __name__ == "__main__":
+    run_shard(int(sys.argv[1]), int(sys.argv[2]), sys.argv[3], sys.argv[4] if len(sys.argv) > 4 else None)
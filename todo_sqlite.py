@@ -0,0 +1,410 @@
+# SQLite storage backend for the todo store
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+import sqlite3
+import threading
+
+from todo_search import tokenize
+from todo_store import (
+    TodoNotFoundError, PreconditionFailedError, ChangeListeners, SerializationCache, ActivityCounter,
+    dumps_bytes, make_stats, todo_etag, batch_result, batch_error, abort_batch, parse_fields
+)
+
+# Run as one transaction, so a process opening the database never sees
+# another's trigger halfway replaced
+SCHEMA = """
+BEGIN IMMEDIATE;
+CREATE TABLE IF NOT EXISTS todos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL,
+    description TEXT NOT NULL DEFAULT '',
+    completed INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS todos_completed ON todos (completed, id);
+-- Serves title_prefix listings as a range scan
+CREATE INDEX IF NOT EXISTS todos_title ON todos (title, id);
+
+-- Store version, bumped in the same transaction as every change so that
+-- all processes using the database agree on it
+CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO store_meta (key, value) VALUES ('version', 0);
+-- Set by batch writes while they run: the row triggers below then leave
+-- the version alone and the batch bumps it once before committing
+INSERT OR IGNORE INTO store_meta (key, value) VALUES ('batch', 0);
+-- Random ID of the database, so versions of a deleted and recreated
+-- database are not mistaken for this one's
+INSERT OR IGNORE INTO store_meta (key, value) VALUES ('epoch', abs(random() % 4294967296));
+DROP TRIGGER IF EXISTS todos_version_insert;
+DROP TRIGGER IF EXISTS todos_version_update;
+DROP TRIGGER IF EXISTS todos_version_delete;
+CREATE TRIGGER todos_version_insert AFTER INSERT ON todos
+WHEN (SELECT value FROM store_meta WHERE key = 'batch') = 0
+BEGIN UPDATE store_meta SET value = value + 1 WHERE key = 'version'; END;
+CREATE TRIGGER todos_version_update AFTER UPDATE ON todos
+WHEN (SELECT value FROM store_meta WHERE key = 'batch') = 0
+BEGIN UPDATE store_meta SET value = value + 1 WHERE key = 'version'; END;
+CREATE TRIGGER todos_version_delete AFTER DELETE ON todos
+WHEN (SELECT value FROM store_meta WHERE key = 'batch') = 0
+BEGIN UPDATE store_meta SET value = value + 1 WHERE key = 'version'; END;
+
+-- Row counts for stats(), maintained by triggers so reading them is O(1);
+-- seeded from the table for databases created before they existed
+INSERT OR IGNORE INTO store_meta (key, value) VALUES ('total', (SELECT count(*) FROM todos));
+INSERT OR IGNORE INTO store_meta (key, value) VALUES ('completed', (SELECT count(*) FROM todos WHERE completed));
+CREATE TRIGGER IF NOT EXISTS todos_stats_insert AFTER INSERT ON todos BEGIN
+    UPDATE store_meta SET value = value + 1 WHERE key = 'total';
+    UPDATE store_meta SET value = value + new.completed WHERE key = 'completed';
+END;
+CREATE TRIGGER IF NOT EXISTS todos_stats_delete AFTER DELETE ON todos BEGIN
+    UPDATE store_meta SET value = value - 1 WHERE key = 'total';
+    UPDATE store_meta SET value = value - old.completed WHERE key = 'completed';
+END;
+CREATE TRIGGER IF NOT EXISTS todos_stats_update AFTER UPDATE OF completed ON todos
+WHEN old.completed IS NOT new.completed BEGIN
+    UPDATE store_meta SET value = value - old.completed + new.completed WHERE key = 'completed';
+END;
+
+-- Full-text index over title and description, kept in sync by triggers;
+-- it stores only the index and reads the text back from todos
+CREATE VIRTUAL TABLE IF NOT EXISTS todos_fts USING fts5(
+    title, description, content='todos', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS todos_fts_insert AFTER INSERT ON todos BEGIN
+    INSERT INTO todos_fts (rowid, title, description) VALUES (new.id, new.title, new.description);
+END;
+CREATE TRIGGER IF NOT EXISTS todos_fts_delete AFTER DELETE ON todos BEGIN
+    INSERT INTO todos_fts (todos_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+END;
+CREATE TRIGGER IF NOT EXISTS todos_fts_update AFTER UPDATE ON todos
+WHEN old.title IS NOT new.title OR old.description IS NOT new.description BEGIN
+    INSERT INTO todos_fts (todos_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+    INSERT INTO todos_fts (rowid, title, description) VALUES (new.id, new.title, new.description);
+END;
+COMMIT;
+"""
+
+# Constant SQL text lets sqlite3's per-connection statement cache reuse
+# the prepared statements instead of re-parsing on every call
+SELECT_COLUMNS = "SELECT id, title, description, completed FROM todos"
+SQL_GET = SELECT_COLUMNS + " WHERE id = ?"
+# Highest code point; title >= prefix AND title < prefix || it selects a prefix
+# with an index range scan (UTF-8 byte order is code point order)
+MAX_CHAR = "\U0010ffff"
+SQL_SEARCH = ("SELECT todos.id, todos.title, todos.description, todos.completed FROM todos_fts "
+              "JOIN todos ON todos.id = todos_fts.rowid WHERE todos_fts MATCH ? "
+              "ORDER BY bm25(todos_fts), todos.id LIMIT ?")
+SQL_VERSION = "SELECT value FROM store_meta WHERE key = 'version'"
+SQL_EPOCH = "SELECT value FROM store_meta WHERE key = 'epoch'"
+SQL_BATCH_BEGIN = "UPDATE store_meta SET value = 1 WHERE key = 'batch'"
+# Clears the flag and adds ? (1 if the batch changed anything) to the version
+SQL_BATCH_END = ("UPDATE store_meta SET value = CASE key WHEN 'version' THEN value + ? ELSE 0 END "
+                 "WHERE key IN ('version', 'batch')")
+SQL_COUNTS = ("SELECT (SELECT value FROM store_meta WHERE key = 'total'), "
+              "(SELECT value FROM store_meta WHERE key = 'completed')")
+SQL_INSERT = "INSERT INTO todos (title, description, completed) VALUES (?, ?, ?) RETURNING id, title, description, completed"
+SQL_UPDATE = ("UPDATE todos SET title = coalesce(?, title), description = coalesce(?, description), "
+              "completed = coalesce(?, completed) WHERE id = ? RETURNING id, title, description, completed")
+SQL_DELETE = "DELETE FROM todos WHERE id = ? RETURNING id, title, description, completed"
+
+
+def _row_to_todo(cursor: sqlite3.Cursor, row: tuple) -> Dict[str, Any]:
+    return {"id": row[0], "title": row[1], "description": row[2], "completed": bool(row[3])}
+
+
+def _select(fields: Optional[Tuple[str, ...]]) -> str:
+    # Only validated names from parse_fields reach the SQL text
+    return SELECT_COLUMNS if fields is None else f"SELECT {', '.join(fields)} FROM todos"
+
+
+_ROW_FACTORIES: Dict[Tuple[str, ...], Any] = {}
+
+
+def _row_factory(fields: Optional[Tuple[str, ...]]):
+    """Row factory for ``_select(fields)`` rows"""
+    if fields is None:
+        return _row_to_todo
+    factory = _ROW_FACTORIES.get(fields)
+    if factory is None:
+        if "completed" in fields:
+            position = fields.index("completed")
+
+            def factory(cursor, row):
+                todo = dict(zip(fields, row))
+                todo["completed"] = bool(row[position])
+                return todo
+        else:
+            def factory(cursor, row):
+                return dict(zip(fields, row))
+        _ROW_FACTORIES[fields] = factory
+    return factory
+
+
+class SQLiteTodoStore(ChangeListeners):
+    """Todo storage in a SQLite database, API-compatible with TodoStore.
+
+    The database runs in WAL mode so readers never block the writer, and
+    ``completed`` is indexed so the completed/pending views are index range
+    scans. Each thread gets its own connection (FastAPI runs sync routes on
+    a threadpool); batch inserts share a single transaction. ``search()``
+    runs on an FTS5 index ranked with its built-in BM25.
+
+    Change listeners only see changes made through this object, and update
+    events carry no "previous" record. Likewise the recent create/delete
+    activity in ``stats()``; its totals come from the database.
+
+    SQLite already serializes writers and hands out AUTOINCREMENT IDs
+    atomically. Writes through this object additionally take a writer lock,
+    so a change and the version read for its events are never interleaved
+    with another thread's write and listeners see versions in commit order.
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._local = threading.local()
+        self._cache = SerializationCache()
+        self._write_lock = threading.Lock()
+        self._activity = ActivityCounter()
+        conn = self._connection()
+        indexed = self._scalar("SELECT count(*) FROM sqlite_master WHERE name = 'todos_fts'") > 0
+        conn.executescript(SCHEMA)
+        if not indexed:
+            # Databases created before the search index existed
+            conn.execute("INSERT INTO todos_fts (todos_fts) VALUES ('rebuild')")
+        self._epoch = self._scalar(SQL_EPOCH)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit; batches open explicit transactions
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.row_factory = _row_to_todo
+            self._local.conn = conn
+        return conn
+
+    def _scalar(self, sql: str) -> Any:
+        cursor = self._connection().cursor()
+        cursor.row_factory = None
+        return cursor.execute(sql).fetchone()[0]
+
+    def __len__(self) -> int:
+        return self._scalar("SELECT count(*) FROM todos")
+
+    def __contains__(self, todo_id: int) -> bool:
+        return self._connection().execute(SQL_GET, (todo_id,)).fetchone() is not None
+
+    def list(self, completed: Optional[bool] = None, fields: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """Return todos in ID (= insertion) order, optionally only (un)completed ones
+        and only the columns of some ``fields``"""
+        fields = parse_fields(fields)
+        if completed is None:
+            return self._query(_select(fields) + " ORDER BY id", (), fields)
+        return self._query(_select(fields) + " WHERE completed = ? ORDER BY id", (int(completed),), fields)
+
+    def get(self, todo_id: int, fields: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Return a todo by ID"""
+        fields = parse_fields(fields)
+        if fields is None:
+            return self._one(SQL_GET, (todo_id,), todo_id)
+        rows = self._query(_select(fields) + " WHERE id = ?", (todo_id,), fields)
+        if not rows:
+            raise TodoNotFoundError(todo_id)
+        return rows[0]
+
+    def page(self, limit: Optional[int], after_id: Optional[int] = None, completed: Optional[bool] = None,
+             id_gte: Optional[int] = None, id_lt: Optional[int] = None, title_prefix: Optional[str] = None,
+             descending: bool = False, fields: Optional[Iterable[str]] = None
+             ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Return up to ``limit`` (None: all) matching todos after ``after_id``, in ID order
+        (see TodoStore.page)"""
+        fields = parse_fields(fields)
+        conditions, params = [], []
+        for condition, value in (("id > ?", None if descending else after_id),
+                                 ("id < ?", after_id if descending else None),
+                                 ("id >= ?", id_gte), ("id < ?", id_lt),
+                                 ("completed = ?", None if completed is None else int(completed)),
+                                 ("title >= ?", title_prefix or None), ("title < ?", title_prefix + MAX_CHAR if title_prefix else None)):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+        sql = _select(fields) + (" WHERE " + " AND ".join(conditions) if conditions else "")
+        sql += " ORDER BY id DESC" if descending else " ORDER BY id"
+        if limit is None:
+            return self._query(sql, params, fields), None
+        # One extra row tells us whether another page follows
+        todos = self._query(sql + " LIMIT ?", params + [limit + 1], fields)
+        if len(todos) > limit:
+            return todos[:limit], todos[limit - 1]["id"]
+        return todos, None
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Return up to ``limit`` todos matching any word of ``query``, best match first"""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        # Quoted tokens can't be misread as FTS5 query syntax
+        match = " OR ".join(f'"{token}"' for token in dict.fromkeys(tokens))
+        return self._connection().execute(SQL_SEARCH, (match, limit)).fetchall()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return total/completed/pending counts and recent creates/deletes in O(1)"""
+        cursor = self._connection().cursor()
+        cursor.row_factory = None
+        total, completed = cursor.execute(SQL_COUNTS).fetchone()
+        return make_stats(total, completed, self._activity)
+
+    def version(self) -> int:
+        """Return the database's store version, bumped by every change"""
+        return self._scalar(SQL_VERSION)
+
+    def epoch(self) -> str:
+        """Return the database's ID, the same in every process using it"""
+        return "%08x" % self._epoch
+
+    def dumps(self, completed: Optional[bool] = None, fields: Optional[Iterable[str]] = None) -> bytes:
+        """Return list(completed, fields) as compact JSON bytes, cached until the next change"""
+        fields = parse_fields(fields)
+        return self._cache.get((completed, fields), self.version(),
+                               lambda: dumps_bytes(self.list(completed, fields)))
+
+    def create(self, title: str, description: str = "", completed: bool = False) -> Dict[str, Any]:
+        """Create a todo and return it"""
+        with self._write_lock:
+            todo = self._connection().execute(SQL_INSERT, (title, description, int(completed))).fetchall()[0]
+            self._changed("create", [todo])
+        return todo
+
+    def create_many(self, items: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Create several todos in one transaction"""
+        conn = self._connection()
+        with self._write_lock:
+            self._begin_batch(conn)
+            try:
+                created = [
+                    conn.execute(SQL_INSERT, (item["title"], item.get("description", ""),
+                                              int(item.get("completed", False)))).fetchall()[0]
+                    for item in items
+                ]
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            self._commit_batch(conn, bool(created))
+            self._changed("create", created)
+        return created
+
+    def update(self, todo_id: int, title: Optional[str] = None, description: Optional[str] = None,
+               completed: Optional[bool] = None, if_match: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Update the given fields of a todo and return it (see TodoStore.update)"""
+        if completed is not None:
+            completed = int(completed)
+        with self._write_lock:
+            todo = self._conditional(SQL_UPDATE, (title, description, completed, todo_id), todo_id, if_match)
+            self._changed("update", [todo])
+        return todo
+
+    def update_many(self, updates: Iterable[Dict[str, Any]], atomic: bool = False) -> List[Dict[str, Any]]:
+        """Apply several updates in one transaction (see TodoStore.update_many)"""
+        return self._batch(
+            "update", atomic,
+            ((update["id"], SQL_UPDATE, (update.get("title"), update.get("description"),
+                                         None if update.get("completed") is None else int(update["completed"]),
+                                         update["id"]))
+             for update in updates)
+        )
+
+    def delete(self, todo_id: int, if_match: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Delete a todo and return it (see TodoStore.update for ``if_match``)"""
+        with self._write_lock:
+            todo = self._conditional(SQL_DELETE, (todo_id,), todo_id, if_match)
+            self._changed("delete", [todo])
+        return todo
+
+    def delete_many(self, todo_ids: Iterable[int], atomic: bool = False) -> List[Dict[str, Any]]:
+        """Delete several todos in one transaction (see TodoStore.update_many)"""
+        return self._batch("delete", atomic, ((todo_id, SQL_DELETE, (todo_id,)) for todo_id in todo_ids))
+
+    def _batch(self, op: str, atomic: bool, statements: Iterable[tuple]) -> List[Dict[str, Any]]:
+        conn = self._connection()
+        with self._write_lock:
+            self._begin_batch(conn)
+            try:
+                results = []
+                for todo_id, sql, params in statements:
+                    rows = conn.execute(sql, params).fetchall()
+                    results.append(batch_result(rows[0]) if rows else batch_error(todo_id, TodoNotFoundError(todo_id)))
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            if atomic and not all(result["ok"] for result in results):
+                conn.execute("ROLLBACK")
+                return abort_batch(results)
+            changed = [result["todo"] for result in results if result["ok"]]
+            self._commit_batch(conn, bool(changed))
+            self._changed(op, changed)
+        return results
+
+    def clear(self) -> None:
+        """Remove all todos and reset the ID counter"""
+        conn = self._connection()
+        with self._write_lock:
+            self._begin_batch(conn)
+            try:
+                deleted = self._scalar("SELECT value FROM store_meta WHERE key = 'total'")
+                conn.execute("DELETE FROM todos")
+                conn.execute("DELETE FROM sqlite_sequence WHERE name = 'todos'")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            self._commit_batch(conn, True)
+            self._activity.record(deleted=deleted)
+            if self._listeners:
+                self._emit(self.version(), [{"op": "clear"}])
+
+    def _begin_batch(self, conn: sqlite3.Connection) -> None:
+        # One version bump for the whole transaction instead of one per row
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(SQL_BATCH_BEGIN)
+
+    def _commit_batch(self, conn: sqlite3.Connection, changed: bool) -> None:
+        conn.execute(SQL_BATCH_END, (int(changed),))
+        conn.execute("COMMIT")
+
+    def _changed(self, op: str, todos: List[Dict[str, Any]]) -> None:
+        if op == "create":
+            self._activity.record(created=len(todos))
+        elif op == "delete":
+            self._activity.record(deleted=len(todos))
+        if self._listeners and todos:
+            self._emit(self.version(), [{"op": op, "todo": dict(todo)} for todo in todos])
+
+    def _conditional(self, sql: str, params: tuple, todo_id: int, if_match: Optional[List[str]]) -> Dict[str, Any]:
+        # Checks the current row's ETag and writes in one transaction, so
+        # another process can't change the row in between
+        if if_match is None:
+            return self._one(sql, params, todo_id)
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if todo_etag(self._one(SQL_GET, (todo_id,), todo_id)) not in if_match:
+                raise PreconditionFailedError(todo_id)
+            todo = self._one(sql, params, todo_id)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return todo
+
+    def _query(self, sql: str, params, fields: Optional[Tuple[str, ...]]) -> List[Dict[str, Any]]:
+        cursor = self._connection().cursor()
+        cursor.row_factory = _row_factory(fields)
+        return cursor.execute(sql, params).fetchall()
+
+    def _one(self, sql: str, params: tuple, todo_id: int) -> Dict[str, Any]:
+        # fetchall() runs the statement to completion so a RETURNING write
+        # is committed before we hand the row back
+        rows = self._connection().execute(sql, params).fetchall()
+        if not rows:
+            raise TodoNotFoundError(todo_id)
+        return rows[0]
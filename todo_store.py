@@ -0,0 +1,995 @@
+# Todo Store shared by the MCP server and the FastAPI app
+from multiprocessing.managers import BaseManager
+from typing import List, Dict, Any, Callable, Hashable, Iterable, Optional, Tuple, Union
+import base64
+import bisect
+import hashlib
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+
+from todo_search import SearchIndex, PrefixIndex
+from todo_wal import WriteAheadLog
+
+try:
+    # Optional: several times faster than the json module for big views
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Address and auth key of a store served by another process (see serve_store)
+STORE_ADDRESS_ENV = "TODO_STORE_ADDRESS"
+STORE_AUTHKEY_ENV = "TODO_STORE_AUTHKEY"
+# Storage backend: "memory" (default) or "sqlite"
+STORE_BACKEND_ENV = "TODO_STORE_BACKEND"
+SQLITE_PATH_ENV = "TODO_SQLITE_PATH"
+# Directory of the write-ahead log; unset keeps the memory store volatile
+WAL_DIR_ENV = "TODO_WAL_DIR"
+WAL_FSYNC_ENV = "TODO_WAL_FSYNC"
+# Number of worker processes to shard the memory store across (see todo_shards)
+STORE_SHARDS_ENV = "TODO_STORE_SHARDS"
+
+
+class TodoNotFoundError(ValueError):
+    """Raised when a todo ID is not present in the store"""
+
+    def __init__(self, todo_id: int):
+        super().__init__(f"Todo with ID {todo_id} not found")
+        self.todo_id = todo_id
+
+    def __reduce__(self):
+        # Keep the ID (not the message) when pickled across processes
+        return (TodoNotFoundError, (self.todo_id,))
+
+
+class PreconditionFailedError(ValueError):
+    """Raised when a conditional update/delete finds the todo has changed"""
+
+    def __init__(self, todo_id: int):
+        super().__init__(f"Todo with ID {todo_id} has been modified")
+        self.todo_id = todo_id
+
+    def __reduce__(self):
+        return (PreconditionFailedError, (self.todo_id,))
+
+
+def todo_etag(todo: Dict[str, Any]) -> str:
+    """Strong HTTP entity tag of one todo, derived from its content.
+
+    Acts as the record's version: it changes whenever a field does, is the
+    same in every process and backend, and needs nothing stored.
+    """
+    content = json.dumps([todo["id"], todo["title"], todo["description"], todo["completed"]])
+    return '"%s"' % hashlib.blake2b(content.encode(), digest_size=8).hexdigest()
+
+
+def new_epoch() -> str:
+    """Random ID for one lifetime of a store's version counter"""
+    return os.urandom(4).hex()
+
+
+def version_tag(epoch: str, version: int) -> str:
+    """"<epoch>.<version>": a store version that can't be taken for one of another epoch"""
+    return "%s.%d" % (epoch, version)
+
+
+def parse_version_tag(tag: str) -> Tuple[Optional[str], int]:
+    """Return (epoch, version) of a version_tag (or list ETag), or (None, version) of a bare version.
+
+    Raises ValueError for anything else.
+    """
+    epoch, _, version = tag.strip('"').rpartition(".")
+    if not version.isdigit():
+        raise ValueError(f"Invalid store version: {tag!r}")
+    return epoch or None, int(version)
+
+
+def list_etag(epoch: str, version: int) -> str:
+    """Strong HTTP entity tag of any listing read at store ``version``.
+
+    Versions count from 0 again whenever an in-memory store starts, so the
+    tag carries the store's epoch too: a tag from before a restart never
+    matches one issued after it, even at the same version.
+    """
+    return '"%s"' % version_tag(epoch, version)
+
+
+def _check_etag(todo_id: int, todo: Dict[str, Any], if_match: Optional[List[str]]) -> None:
+    if if_match is not None and todo_etag(todo) not in if_match:
+        raise PreconditionFailedError(todo_id)
+
+
+class SerializationCache:
+    """Serialized views of a store, reused until the store version changes.
+
+    Each entry is tagged with the store version it was built at, so a
+    mutation invalidates every entry without the store having to know
+    which views exist. Payloads are the encoded bytes, which HTTP responses
+    send as they are.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Hashable, Tuple[int, bytes]] = {}
+
+    def get(self, key: Hashable, version: int, build: Callable[[], bytes]) -> bytes:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        # `version` was read before building, so the payload is never older
+        # than the version it is stored under
+        payload = build()
+        self._entries[key] = (version, payload)
+        return payload
+
+
+def dumps_compact(value: Any) -> str:
+    """JSON encoding used on the wire: no indentation or spaces.
+
+    Uses orjson when it is installed, which writes non-ASCII text as UTF-8
+    rather than \\u escapes; both decode to the same values.
+    """
+    if orjson is not None:
+        return orjson.dumps(value).decode()
+    return json.dumps(value, separators=(",", ":"))
+
+
+def dumps_bytes(value: Any) -> bytes:
+    """dumps_compact as UTF-8, the form HTTP bodies take (orjson writes it directly)"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+def _changes(title: Optional[str], description: Optional[str], completed: Optional[bool]) -> Dict[str, Any]:
+    changes = {}
+    if title is not None:
+        changes["title"] = title
+    if description is not None:
+        changes["description"] = description
+    if completed is not None:
+        changes["completed"] = completed
+    return changes
+
+
+# ---- Field projection ----
+TODO_FIELDS = ("id", "title", "description", "completed")
+
+
+def parse_fields(fields: Union[None, str, Iterable[str]]) -> Optional[Tuple[str, ...]]:
+    """Validated field projection: "title,completed" -> ("id", "title", "completed").
+
+    Accepts a comma-separated string or a list of names. "id" is always
+    included and the names come back in TODO_FIELDS order; None (also for
+    an empty or complete selection) means every field. Raises ValueError
+    for unknown names.
+    """
+    if fields is None:
+        return None
+    names = {name.strip() for name in (fields.split(",") if isinstance(fields, str) else fields)}
+    names.discard("")
+    unknown = names.difference(TODO_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))} (expected {', '.join(TODO_FIELDS)})")
+    if not names:
+        return None
+    projection = tuple(name for name in TODO_FIELDS if name == "id" or name in names)
+    return None if projection == TODO_FIELDS else projection
+
+
+def project(todo: Dict[str, Any], fields: Optional[Tuple[str, ...]]) -> Dict[str, Any]:
+    """Only ``fields`` (from parse_fields) of a todo dict"""
+    return todo if fields is None else {name: todo[name] for name in fields}
+
+
+# ---- Batch results ----
+def batch_result(todo: Dict[str, Any]) -> Dict[str, Any]:
+    """Per-item result of a batch operation that succeeded"""
+    return {"id": todo["id"], "ok": True, "todo": todo}
+
+
+def batch_error(todo_id: int, error: Union[Exception, str]) -> Dict[str, Any]:
+    """Per-item result of a batch operation that failed"""
+    return {"id": todo_id, "ok": False, "error": str(error)}
+
+
+def abort_batch(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Results of an atomic batch that was rolled back because an item failed"""
+    return [
+        result if not result["ok"] else batch_error(result["id"], "Not applied: another item in the batch failed")
+        for result in results
+    ]
+
+
+# ---- Statistics ----
+# Creates and deletes are counted per interval for the most recent intervals
+STATS_INTERVAL_SECONDS = 60
+STATS_INTERVALS = 10
+
+
+class ActivityCounter:
+    """Created/deleted counts for the last few fixed-length time intervals.
+
+    A ring of ``intervals`` buckets, reused as time moves on, so recording
+    and reading are O(1) and memory never grows. Callers serialize access
+    (the stores record under their writer lock).
+    """
+
+    def __init__(self, interval: int = STATS_INTERVAL_SECONDS, intervals: int = STATS_INTERVALS):
+        self.interval = interval
+        # Per bucket: [interval number, created, deleted]
+        self._buckets = [[-1, 0, 0] for _ in range(intervals)]
+
+    def record(self, created: int = 0, deleted: int = 0) -> None:
+        number = int(time.time() // self.interval)
+        bucket = self._buckets[number % len(self._buckets)]
+        if bucket[0] != number:
+            bucket[:] = [number, 0, 0]
+        bucket[1] += created
+        bucket[2] += deleted
+
+    def recent(self) -> Dict[str, Any]:
+        """Counts per interval, the current (partial) interval first"""
+        now = int(time.time() // self.interval)
+        counts = []
+        for number in range(now, now - len(self._buckets), -1):
+            bucket = self._buckets[number % len(self._buckets)]
+            counts.append((bucket[1], bucket[2]) if bucket[0] == number else (0, 0))
+        return {
+            "interval_seconds": self.interval,
+            "created": [created for created, _ in counts],
+            "deleted": [deleted for _, deleted in counts],
+        }
+
+
+def make_stats(total: int, completed: int, activity: ActivityCounter) -> Dict[str, Any]:
+    """The stats() result shared by the store backends"""
+    return {"total": total, "completed": completed, "pending": total - completed, "recent": activity.recent()}
+
+
+class ChangeListeners:
+    """Callbacks run after every mutation of a store.
+
+    A listener receives the change events of one mutation (several for a
+    batch), each {"version", "op", "todo"} where op is create, update or
+    delete; updates also carry "previous" when the backend knows it, and
+    clear is a single {"version", "op": "clear"} event. Listeners run on
+    the mutating thread, in commit order, so they must be quick and must not
+    block (hand work off to a queue or event loop instead).
+    """
+
+    def __init__(self):
+        self._listeners: List[Callable[[List[Dict[str, Any]]], None]] = []
+
+    def add_listener(self, listener: Callable[[List[Dict[str, Any]]], None]) -> None:
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[List[Dict[str, Any]]], None]) -> None:
+        self._listeners.remove(listener)
+
+    def _emit(self, version: int, events: List[Dict[str, Any]]) -> None:
+        for event in events:
+            event["version"] = version
+        for listener in list(self._listeners):
+            try:
+                listener(events)
+            except Exception:
+                # The change is already applied; a broken listener must not
+                # turn it into an error for the caller
+                logger.exception("Store change listener failed")
+
+
+class TextPool:
+    """Equal strings shared between a store's records, like sys.intern.
+
+    Unlike interned strings, an entry counts the records holding it and
+    goes away with the last one, so text of deleted or renamed todos is
+    freed.
+    """
+
+    __slots__ = ("_entries",)
+
+    def __init__(self):
+        # text -> [shared string, records holding it]
+        self._entries: Dict[str, List[Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def share(self, text: str) -> str:
+        """Return the pooled string equal to ``text``, counting one more holder"""
+        entry = self._entries.get(text)
+        if entry is None:
+            self._entries[text] = [text, 1]
+            return text
+        entry[1] += 1
+        return entry[0]
+
+    def release(self, text: str) -> None:
+        entry = self._entries[text]
+        entry[1] -= 1
+        if not entry[1]:
+            del self._entries[text]
+
+
+class TodoRecord:
+    """Compact storage form of one todo; callers only ever see dicts.
+
+    A slotted object is about a third of the size of the equivalent dict.
+    The store shares repeated titles through its TextPool; descriptions are
+    nearly always unique, so they are kept as they come. Records are never
+    modified after they are stored: ``replace`` returns a new one, so
+    readers can use them without holding the store lock.
+    """
+
+    __slots__ = ("id", "title", "description", "completed")
+
+    def __init__(self, id: int, title: str, description: str, completed: bool):
+        self.id = id
+        self.title = title
+        self.description = description
+        self.completed = bool(completed)
+
+    @classmethod
+    def from_dict(cls, todo: Dict[str, Any]) -> "TodoRecord":
+        return cls(todo["id"], todo["title"], todo["description"], todo["completed"])
+
+    def to_dict(self, fields: Optional[Tuple[str, ...]] = None) -> Dict[str, Any]:
+        if fields is None:
+            return {"id": self.id, "title": self.title, "description": self.description, "completed": self.completed}
+        return {name: getattr(self, name) for name in fields}
+
+    def replace(self, changes: Dict[str, Any]) -> "TodoRecord":
+        return TodoRecord(self.id, changes.get("title", self.title), changes.get("description", self.description),
+                          changes.get("completed", self.completed))
+
+
+# Status changes between rebuilds of the per-status ID lists (at least;
+# large stores allow one per 16 todos)
+STATUS_MOVES_PER_REBUILD = 1024
+
+
+def _scan(ids: List[int], length: int, low: Optional[int], high: Optional[int],
+          descending: bool) -> Iterable[int]:
+    # IDs among the first ``length`` of sorted ``ids`` in [low, high)
+    start = 0 if low is None else bisect.bisect_left(ids, low, 0, length)
+    stop = length if high is None else bisect.bisect_left(ids, high, 0, length)
+    positions = range(stop - 1, start - 1, -1) if descending else range(start, stop)
+    return (ids[position] for position in positions)
+
+
+class TodoStore(ChangeListeners):
+    """In-memory todo storage with an id -> TodoRecord hash index.
+
+    Python dicts keep insertion order, so the index doubles as the
+    insertion-ordered view used for listing: lookups, updates and deletes
+    are O(1) and ``list()`` returns todos in the order they were created.
+
+    IDs only ever grow, so an append-only ``_order`` list of IDs is sorted
+    and ``page()`` can bisect to a cursor or ID range and read just one
+    page. Deleted IDs stay in it as tombstones until they outnumber the
+    live ones. Sorted per-status ID lists serve ``completed`` pages the
+    same way, however few todos have that status, and a PrefixIndex of
+    titles serves ``title_prefix`` pages whose matches are too few to be
+    found quickly by walking the ID list.
+
+    A SearchIndex over titles and descriptions is kept up to date by every
+    mutation, so ``search()`` costs the size of the query's posting lists,
+    and so are the counters behind ``stats()``.
+
+    Every mutation bumps a monotonic version, which keys the cache of
+    serialized views behind ``dumps()``. With a ``wal`` the store is rebuilt
+    from it on construction and every mutation is logged before it is
+    applied. ``first_id`` and ``id_step`` make it allocate IDs first_id,
+    first_id + id_step, ... (used by shards, which each own one residue).
+
+    Thread safety: mutations are serialized by one writer lock, which also
+    covers ID allocation, so IDs are unique and follow commit order. Stored
+    records are never modified in place (an update swaps in a new record),
+    so readers only hold the lock long enough to grab references and
+    convert them to dicts outside it. The ID lists are only appended to or
+    replaced, so ``page()`` notes their lengths under the lock and scans
+    them after releasing it. A writer waits for its WAL record to become durable after
+    releasing the lock, letting concurrent writers share one fsync.
+    """
+
+    def __init__(self, wal: Optional[WriteAheadLog] = None, first_id: int = 1, id_step: int = 1):
+        super().__init__()
+        self._todos: Dict[int, TodoRecord] = {}
+        self._first_id = first_id
+        self._id_step = id_step
+        self._next_id = first_id
+        self._version = 0
+        self._epoch = new_epoch()
+        self._cache = SerializationCache()
+        # Held by every mutation, so a batch is applied as one unit; readers
+        # take it only to snapshot references
+        self._lock = threading.RLock()
+        self._wal = wal
+        if wal is not None:
+            todos, next_id = wal.load()
+            # The log records one past the highest ID; round up to one of ours
+            self._next_id = first_id + max(0, -(-(next_id - first_id) // id_step)) * id_step
+            self._todos = {todo_id: TodoRecord.from_dict(todo) for todo_id, todo in todos.items()}
+        self._order: List[int] = sorted(self._todos)
+        self._tombstones = 0
+        self._index = SearchIndex()
+        self._titles = PrefixIndex()
+        self._completed = 0
+        self._title_pool = TextPool()
+        for todo in self._todos.values():
+            todo.title = self._title_pool.share(todo.title)
+            self._index.add(todo.id, todo.title, todo.description)
+            self._titles.add(todo.id, todo.title)
+            self._completed += todo.completed
+        self._status_ids: Dict[bool, List[int]] = {}
+        self._moved: Dict[bool, List[int]] = {}
+        self._rebuild_status_ids()
+        self._activity = ActivityCounter()
+
+    def __len__(self) -> int:
+        return len(self._todos)
+
+    def __contains__(self, todo_id: int) -> bool:
+        return todo_id in self._todos
+
+    def list(self, completed: Optional[bool] = None, fields: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """Return todos in insertion order, optionally only (un)completed ones
+        and only some ``fields`` of each (see parse_fields)"""
+        fields = parse_fields(fields)
+        with self._lock:
+            todos = list(self._todos.values())
+        if completed is None:
+            return [todo.to_dict(fields) for todo in todos]
+        return [todo.to_dict(fields) for todo in todos if todo.completed == completed]
+
+    def get(self, todo_id: int, fields: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Return a todo by ID"""
+        return self._lookup(todo_id).to_dict(parse_fields(fields))
+
+    def page(self, limit: Optional[int], after_id: Optional[int] = None, completed: Optional[bool] = None,
+             id_gte: Optional[int] = None, id_lt: Optional[int] = None, title_prefix: Optional[str] = None,
+             descending: bool = False, fields: Optional[Iterable[str]] = None
+             ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Return up to ``limit`` (None: all) matching todos after ``after_id``, in ID order.
+
+        Filters: status, ID range [id_gte, id_lt) and a case-sensitive title
+        prefix. With ``descending`` the order is newest first and the page
+        starts below ``after_id``. The second item is the ID to resume
+        after, or None on the last page. ``fields`` projects each todo.
+        """
+        fields = parse_fields(fields)
+        low = id_gte
+        high = id_lt
+        if after_id is not None:
+            if descending:
+                high = after_id if high is None else min(high, after_id)
+            else:
+                low = after_id + 1 if low is None else max(low, after_id + 1)
+        with self._lock:
+            # Only snapshots here: the scan below runs without the lock
+            todos = self._todos
+            if completed is None:
+                sources = [(self._order, len(self._order))]
+            else:
+                moved = list(self._moved[completed])
+                sources = [(self._status_ids[completed], len(self._status_ids[completed])), (moved, len(moved))]
+            matches = None
+            if title_prefix is not None:
+                count = self._titles.count(title_prefix)
+                candidates = sum(length for _, length in sources)
+                # Walking the ID list finds ``limit`` matches among about
+                # limit * candidates / count entries; fewer matches than that
+                # are cheaper to fetch from the title index and sort by ID
+                if limit is None or count * count < limit * candidates:
+                    matches = self._titles.entries(title_prefix)
+        if matches is not None:
+            ids = sorted(todo_id for _, todo_id in matches)
+            sources = [(ids, len(ids))]
+        scans = [_scan(ids, length, low, high, descending) for ids, length in sources if length]
+        found = []
+        more = False
+        for todo_id in (scans[0] if len(scans) == 1 else heapq.merge(*scans, reverse=descending)):
+            todo = todos.get(todo_id)
+            # Stale entries are skipped, as are todos changed since the snapshot
+            if (todo is None or (completed is not None and todo.completed != completed)
+                    or (title_prefix is not None and not todo.title.startswith(title_prefix))):
+                continue
+            if len(found) == limit:
+                more = True
+                break
+            found.append(todo)
+        return [todo.to_dict(fields) for todo in found], (found[-1].id if more else None)
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Return up to ``limit`` todos matching any word of ``query``, best match first"""
+        return [todo for _, todo in self.search_ranked(query, limit)]
+
+    def search_stats(self, query: str) -> Tuple[int, int, Dict[str, int]]:
+        """Corpus statistics for ``query`` (see SearchIndex.stats), for sharded search"""
+        with self._lock:
+            return self._index.stats(query)
+
+    def search_ranked(self, query: str, limit: int = 10,
+                      stats: Optional[Tuple[int, int, Dict[str, int]]] = None) -> List[Tuple[float, Dict[str, Any]]]:
+        """search() results paired with their BM25 scores, optionally computed
+        from corpus-wide ``stats``, for merging results across shards"""
+        with self._lock:
+            ranked = [(score, self._todos[todo_id]) for todo_id, score in self._index.search(query, limit, stats)]
+        return [(score, todo.to_dict()) for score, todo in ranked]
+
+    def stats(self) -> Dict[str, Any]:
+        """Return total/completed/pending counts and recent creates/deletes in O(1)"""
+        with self._lock:
+            return make_stats(len(self._todos), self._completed, self._activity)
+
+    def version(self) -> int:
+        """Return the store version, bumped by every mutation"""
+        return self._version
+
+    def epoch(self) -> str:
+        """Return the ID of this store object's version counter, new in every process"""
+        return self._epoch
+
+    def next_id(self) -> int:
+        """Return the ID the next create will get"""
+        return self._next_id
+
+    def dumps(self, completed: Optional[bool] = None, fields: Optional[Iterable[str]] = None) -> bytes:
+        """Return list(completed, fields) as compact JSON bytes, cached until the next mutation"""
+        fields = parse_fields(fields)
+        return self._cache.get((completed, fields), self._version,
+                               lambda: dumps_bytes(self.list(completed, fields)))
+
+    def create(self, title: str, description: str = "", completed: bool = False) -> Dict[str, Any]:
+        """Create a todo and return it"""
+        with self._lock:
+            todo = self._new_todo(title, description, completed)
+            sequence = self._log({"op": "create", "todo": todo.to_dict()})
+            self._insert(todo)
+            self._activity.record(created=1)
+            self._version += 1
+            if self._listeners:
+                self._emit(self._version, [{"op": "create", "todo": todo.to_dict()}])
+        self._sync(sequence)
+        return todo.to_dict()
+
+    def create_many(self, items: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Create several todos from dicts with title/description/completed.
+
+        The batch is logged as one record and bumps the version once.
+        """
+        with self._lock:
+            todos = [
+                self._new_todo(item["title"], item.get("description", ""), item.get("completed", False))
+                for item in items
+            ]
+            if not todos:
+                return []
+            sequence = self._log({"op": "batch", "records": [
+                {"op": "create", "todo": todo.to_dict()} for todo in todos
+            ]})
+            for todo in todos:
+                self._insert(todo)
+            self._activity.record(created=len(todos))
+            self._version += 1
+            if self._listeners:
+                self._emit(self._version, [{"op": "create", "todo": todo.to_dict()} for todo in todos])
+        self._sync(sequence)
+        return [todo.to_dict() for todo in todos]
+
+    def update(self, todo_id: int, title: Optional[str] = None, description: Optional[str] = None,
+               completed: Optional[bool] = None, if_match: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Update the given fields of a todo and return it.
+
+        With ``if_match``, only applies if the todo's current todo_etag is
+        one of those given, and raises PreconditionFailedError otherwise.
+        """
+        with self._lock:
+            previous = self._lookup(todo_id)
+            _check_etag(todo_id, previous.to_dict(), if_match)
+            updated = previous.replace(_changes(title, description, completed))
+            sequence = self._log({"op": "update", "todo": updated.to_dict()})
+            self._replace(updated)
+            self._version += 1
+            if self._listeners:
+                self._emit(self._version, [{"op": "update", "todo": updated.to_dict(), "previous": previous.to_dict()}])
+        self._sync(sequence)
+        return updated.to_dict()
+
+    def update_many(self, updates: Iterable[Dict[str, Any]], atomic: bool = False) -> List[Dict[str, Any]]:
+        """Apply several updates, each a dict with "id" and the fields to change.
+
+        Returns one result per update (see batch_result). IDs that don't
+        exist fail individually, or abort the whole batch when ``atomic``.
+        """
+        sequence = None
+        with self._lock:
+            results, staged = [], {}
+            for update in updates:
+                todo_id = update["id"]
+                current = staged.get(todo_id) or self._todos.get(todo_id)
+                if current is None:
+                    results.append(batch_error(todo_id, TodoNotFoundError(todo_id)))
+                    continue
+                staged[todo_id] = current.replace(_changes(update.get("title"), update.get("description"),
+                                                           update.get("completed")))
+                # Holds the record until the results leave the store
+                results.append({"id": todo_id, "ok": True, "todo": staged[todo_id]})
+            if atomic and not all(result["ok"] for result in results):
+                return abort_batch(results)
+            applied = [result["todo"] for result in results if result["ok"]]
+            if applied:
+                sequence = self._log({"op": "batch", "records": [
+                    {"op": "update", "todo": todo.to_dict()} for todo in applied
+                ]})
+                events = []
+                for todo in applied:
+                    if self._listeners:
+                        events.append({"op": "update", "todo": todo.to_dict(),
+                                       "previous": self._todos[todo.id].to_dict()})
+                    self._replace(todo)
+                self._version += 1
+                if events:
+                    self._emit(self._version, events)
+        self._sync(sequence)
+        return [dict(result, todo=result["todo"].to_dict()) if result["ok"] else result for result in results]
+
+    def delete(self, todo_id: int, if_match: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Delete a todo and return it (``if_match`` as for update)"""
+        with self._lock:
+            _check_etag(todo_id, self._lookup(todo_id).to_dict(), if_match)
+            sequence = self._log({"op": "delete", "id": todo_id})
+            todo = self._remove(todo_id)
+            self._activity.record(deleted=1)
+            self._version += 1
+            if self._listeners:
+                self._emit(self._version, [{"op": "delete", "todo": todo.to_dict()}])
+        self._sync(sequence)
+        return todo.to_dict()
+
+    def delete_many(self, todo_ids: Iterable[int], atomic: bool = False) -> List[Dict[str, Any]]:
+        """Delete several todos, returning one result per ID (see update_many)"""
+        sequence = None
+        with self._lock:
+            results, deleting = [], set()
+            for todo_id in todo_ids:
+                if todo_id in deleting or todo_id not in self._todos:
+                    results.append(batch_error(todo_id, TodoNotFoundError(todo_id)))
+                    continue
+                deleting.add(todo_id)
+                results.append(batch_result(self._todos[todo_id].to_dict()))
+            if atomic and not all(result["ok"] for result in results):
+                return abort_batch(results)
+            if deleting:
+                sequence = self._log({"op": "batch", "records": [
+                    {"op": "delete", "id": result["id"]} for result in results if result["ok"]
+                ]})
+                for todo_id in deleting:
+                    self._remove(todo_id)
+                self._activity.record(deleted=len(deleting))
+                self._version += 1
+                if self._listeners:
+                    self._emit(self._version, [
+                        {"op": "delete", "todo": dict(result["todo"])} for result in results if result["ok"]
+                    ])
+        self._sync(sequence)
+        return results
+
+    def clear(self) -> None:
+        """Remove all todos and reset the ID counter"""
+        with self._lock:
+            sequence = self._log({"op": "clear"})
+            self._activity.record(deleted=len(self._todos))
+            self._todos = {}
+            self._index = SearchIndex()
+            self._titles = PrefixIndex()
+            self._completed = 0
+            self._title_pool = TextPool()
+            self._order = []
+            self._tombstones = 0
+            self._rebuild_status_ids()
+            self._next_id = self._first_id
+            self._version += 1
+            if self._listeners:
+                self._emit(self._version, [{"op": "clear"}])
+        self._sync(sequence)
+
+    def _new_todo(self, title: str, description: str, completed: bool) -> TodoRecord:
+        # Only called with the lock held, which makes ID allocation atomic
+        todo = TodoRecord(self._next_id, title, description, completed)
+        self._next_id += self._id_step
+        return todo
+
+    def _insert(self, todo: TodoRecord) -> None:
+        todo.title = self._title_pool.share(todo.title)
+        self._todos[todo.id] = todo
+        self._order.append(todo.id)
+        self._status_ids[todo.completed].append(todo.id)
+        self._index.add(todo.id, todo.title, todo.description)
+        self._titles.add(todo.id, todo.title)
+        self._completed += todo.completed
+
+    def _replace(self, updated: TodoRecord) -> None:
+        previous = self._todos[updated.id]
+        updated.title = self._title_pool.share(updated.title)
+        self._title_pool.release(previous.title)
+        self._todos[updated.id] = updated
+        if previous.title != updated.title or previous.description != updated.description:
+            self._index.remove(previous.id, previous.title, previous.description)
+            self._index.add(updated.id, updated.title, updated.description)
+        if previous.title != updated.title:
+            self._titles.remove(previous.id, previous.title)
+            self._titles.add(updated.id, updated.title)
+        self._completed += updated.completed - previous.completed
+        if previous.completed != updated.completed:
+            self._move(updated.id, updated.completed)
+
+    def _remove(self, todo_id: int) -> TodoRecord:
+        todo = self._todos.pop(todo_id)
+        self._title_pool.release(todo.title)
+        self._index.remove(todo.id, todo.title, todo.description)
+        self._titles.remove(todo.id, todo.title)
+        self._completed -= todo.completed
+        self._tombstones += 1
+        if self._tombstones > len(self._todos):
+            self._order = list(self._todos)
+            self._tombstones = 0
+            self._rebuild_status_ids()
+        return todo
+
+    def _move(self, todo_id: int, completed: bool) -> None:
+        # Its entry under the old status goes stale. The new status gets one
+        # in its short _moved list, unless an entry from before is still
+        # there (it changed back), which is live again
+        ids, moved = self._status_ids[completed], self._moved[completed]
+        position = bisect.bisect_left(ids, todo_id)
+        if position == len(ids) or ids[position] != todo_id:
+            position = bisect.bisect_left(moved, todo_id)
+            if position == len(moved) or moved[position] != todo_id:
+                moved.insert(position, todo_id)
+        self._moves += 1
+        if self._moves > max(STATUS_MOVES_PER_REBUILD, len(self._todos) // 16):
+            self._rebuild_status_ids()
+
+    def _rebuild_status_ids(self) -> None:
+        # New lists rather than edits in place, as readers may be scanning the old ones
+        status_ids: Dict[bool, List[int]] = {False: [], True: []}
+        todos = self._todos
+        for todo_id in self._order:
+            todo = todos.get(todo_id)
+            if todo is not None:
+                status_ids[todo.completed].append(todo_id)
+        self._status_ids = status_ids
+        self._moved = {False: [], True: []}
+        self._moves = 0
+
+    def _log(self, record: Dict[str, Any]) -> Optional[int]:
+        # Writes the record in commit order; the caller waits for it to be
+        # durable with _sync once it has released the lock
+        if self._wal is None:
+            return None
+        if self._wal.needs_snapshot():
+            # Every logged change so far has been applied and this one has
+            # not, so the snapshot replaces exactly the current log
+            self._wal.snapshot((todo.to_dict() for todo in self._todos.values()), self._next_id)
+        return self._wal.write(record)
+
+    def _sync(self, sequence: Optional[int]) -> None:
+        if sequence is not None:
+            self._wal.sync(sequence)
+
+    def _lookup(self, todo_id: int) -> TodoRecord:
+        try:
+            return self._todos[todo_id]
+        except KeyError:
+            raise TodoNotFoundError(todo_id) from None
+
+
+# ---- Pagination ----
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+# Listing orders: by ID, oldest or newest first
+TODO_ORDERS = ("asc", "desc")
+
+
+def encode_cursor(after_id: int, descending: bool = False) -> str:
+    """Opaque cursor for resuming a listing after ``after_id``"""
+    prefix = "before" if descending else "after"
+    return base64.urlsafe_b64encode(f"{prefix}:{after_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, descending: bool = False) -> int:
+    """Inverse of encode_cursor; raises ValueError for malformed cursors
+    and for cursors of a listing in the other order"""
+    try:
+        text = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        prefix, _, after_id = text.partition(":")
+        if prefix == ("before" if descending else "after"):
+            return int(after_id)
+    except (ValueError, UnicodeDecodeError):
+        pass
+    raise ValueError(f"Invalid cursor: {cursor!r}")
+
+
+def list_filters(completed: Optional[bool] = None, id_gte: Optional[int] = None, id_lt: Optional[int] = None,
+                 title_prefix: Optional[str] = None, order: str = "asc") -> Dict[str, Any]:
+    """Validated filter keyword arguments for store.page()"""
+    if order not in TODO_ORDERS:
+        raise ValueError(f"order must be one of {', '.join(TODO_ORDERS)}")
+    return {"completed": completed, "id_gte": id_gte, "id_lt": id_lt, "title_prefix": title_prefix or None,
+            "descending": order == "desc"}
+
+
+def paginate(store, limit: Optional[int] = None, cursor: Optional[str] = None,
+             fields: Optional[Iterable[str]] = None, **filters) -> Dict[str, Any]:
+    """One page of matching todos (see list_filters) plus the cursor of the next page.
+
+    The cursor only records a position: pass the same filters with it.
+    ``fields`` projects each todo (see parse_fields).
+    """
+    limit = DEFAULT_PAGE_SIZE if limit is None else limit
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    filters = list_filters(**filters)
+    descending = filters["descending"]
+    todos, last_id = store.page(limit, decode_cursor(cursor, descending) if cursor else None,
+                                fields=parse_fields(fields), **filters)
+    return {"todos": todos, "next_cursor": encode_cursor(last_id, descending) if last_id is not None else None}
+
+
+def list_todos(store, fields: Optional[Iterable[str]] = None, **filters) -> List[Dict[str, Any]]:
+    """Every todo matching the filters (see list_filters), unpaginated, with only ``fields``"""
+    filters = list_filters(**filters)
+    fields = parse_fields(fields)
+    if (filters["id_gte"], filters["id_lt"], filters["title_prefix"], filters["descending"]) == (None, None, None, False):
+        # Status alone is what list() serves
+        return store.list(filters["completed"], fields)
+    return store.page(None, fields=fields, **filters)[0]
+
+
+# ---- Search ----
+DEFAULT_SEARCH_LIMIT = 10
+MAX_SEARCH_LIMIT = 100
+
+
+def search(store, query: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Best-ranked todos for a free-text query"""
+    limit = DEFAULT_SEARCH_LIMIT if limit is None else limit
+    if not 1 <= limit <= MAX_SEARCH_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_SEARCH_LIMIT}")
+    return store.search(query, limit)
+
+
+# ---- Cross-process sharing ----
+# Methods callable through a store proxy; every call ships only its own
+# arguments and result over the socket, never the whole todo list.
+STORE_METHODS = ("__len__", "__contains__", "list", "page", "get", "search", "stats", "version", "epoch",
+                 "dumps", "create", "create_many", "update", "update_many", "delete", "delete_many", "clear")
+
+
+class _StoreClientManager(BaseManager):
+    pass
+
+
+_StoreClientManager.register("get_store", exposed=STORE_METHODS)
+
+
+def format_address(address: Union[str, Tuple[str, int]]) -> str:
+    """Encode a listener address for an environment variable"""
+    if isinstance(address, tuple):
+        return f"{address[0]}:{address[1]}"
+    return address
+
+
+def parse_address(value: str) -> Union[str, Tuple[str, int]]:
+    """Decode an address produced by format_address"""
+    host, sep, port = value.rpartition(":")
+    if sep and port.isdigit() and not value.startswith(("/", "\\")):
+        return (host, int(port))
+    return value
+
+
+def serve_store(store: TodoStore, address=None, authkey: Optional[bytes] = None,
+                exposed: Tuple[str, ...] = STORE_METHODS):
+    """Serve a store to other processes from a daemon thread.
+
+    The default address is a Unix domain socket on POSIX. Returns the
+    manager server; ``server.address`` is what clients pass to
+    connect_store and ``server.stop_event.set()`` stops it.
+    """
+    class _StoreServerManager(BaseManager):
+        pass
+
+    _StoreServerManager.register("get_store", callable=lambda: store, exposed=exposed)
+    manager = _StoreServerManager(address=address, authkey=authkey or os.urandom(16))
+    server = manager.get_server()
+
+    def run():
+        # serve_forever() ends with sys.exit(), which is meant for a
+        # dedicated manager process rather than a thread
+        try:
+            server.serve_forever()
+        except SystemExit:
+            pass
+
+    threading.Thread(target=run, name="todo-store-server", daemon=True).start()
+    return server
+
+
+def connect_store(address, authkey: bytes):
+    """Attach to a store served by another process with serve_store"""
+    if isinstance(address, str):
+        address = parse_address(address)
+    manager = _StoreClientManager(address=address, authkey=authkey)
+    manager.connect()
+    return manager.get_store()
+
+
+def store_env(server) -> Dict[str, str]:
+    """Environment variables that make a child process attach to ``server``"""
+    return {
+        STORE_ADDRESS_ENV: format_address(server.address),
+        STORE_AUTHKEY_ENV: server.authkey.hex()
+    }
+
+
+def store_is_shared() -> bool:
+    """True if every process that calls open_store() gets the same todos.
+
+    That is a SQLite database or a store attached to with store_env; the
+    in-memory backend, sharded or not, is private to the process opening it.
+    """
+    return bool(os.environ.get(STORE_ADDRESS_ENV)) or os.environ.get(STORE_BACKEND_ENV, "memory") == "sqlite"
+
+
+def open_store():
+    """Return the store for this process.
+
+    Processes launched with the variables from store_env attach to the
+    parent's store. Otherwise TODO_STORE_BACKEND picks the backend: a
+    SQLiteTodoStore at TODO_SQLITE_PATH, or the in-memory TodoStore (made
+    durable by TODO_WAL_DIR), sharded across TODO_STORE_SHARDS worker
+    processes when that is above 1.
+    """
+    address = os.environ.get(STORE_ADDRESS_ENV)
+    if address:
+        return connect_store(address, bytes.fromhex(os.environ[STORE_AUTHKEY_ENV]))
+    backend = os.environ.get(STORE_BACKEND_ENV, "memory")
+    if backend == "sqlite":
+        from todo_sqlite import SQLiteTodoStore
+        return SQLiteTodoStore(os.environ.get(SQLITE_PATH_ENV, "todos.db"))
+    if backend != "memory":
+        raise ValueError(f"Unknown {STORE_BACKEND_ENV}: {backend}")
+    wal_dir = os.environ.get(WAL_DIR_ENV)
+    shards = int(os.environ.get(STORE_SHARDS_ENV) or 1)
+    if shards > 1:
+        from todo_shards import start_shards
+        return start_shards(shards, wal_dir, os.environ.get(WAL_FSYNC_ENV, "batch"))
+    if wal_dir:
+        return TodoStore(wal=WriteAheadLog(wal_dir, fsync=os.environ.get(WAL_FSYNC_ENV, "batch")))
+    return TodoStore()
+
+
+# Process-wide store shared by mcp_server.py and main.py, opened on first
+# access (`from todo_store import store`) rather than at import: the
+# backends import this module, so opening one here while it is still
+# initializing would be a circular import
+_store = None
+_store_lock = threading.Lock()
+
+
+def __getattr__(name: str):
+    global _store
+    if name != "store":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _store_lock:
+        if _store is None:
+            _store = open_store()
+    return _store